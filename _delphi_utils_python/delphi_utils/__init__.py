@@ -4,14 +4,18 @@
 from __future__ import absolute_import
 
 from .archive import ArchiveDiffer, GitArchiveDiffer, S3ArchiveDiffer
+from .dtypes import apply_dtype_policy
 from .export import create_export_csv
 from .utils import read_params
 
 from .slack_notifier import SlackNotifier
-from .logger import get_structured_logger
+from .logger import LogListener, get_structured_logger, init_worker_logging
 from .geomap import GeoMapper
+from .instrumentation import PipelineProfiler, profile_stage
+from .panel import SignalPanel
 from .smooth import Smoother
 from .signal import add_prefix
 from .nancodes import Nans
+from .scheduler import FetchScheduler, TokenBucket
 
 __version__ = "0.1.1"
@@ -183,13 +183,20 @@ class ArchiveDiffer:
         """
         raise NotImplementedError
 
-    def diff_exports(self) -> Tuple[Files, FileDiffMap, Files]:
+    def diff_exports(self, filenames: Optional[Files] = None) -> Tuple[Files, FileDiffMap, Files]:
         """
         Find diffs across and within CSV files, from cache_dir to export_dir.
 
         Should be called after update_cache() succeeds. Only works on *.csv files,
         ignores every other file.
 
+        Parameters
+        ----------
+        filenames: Optional[Files]
+            Base names of the exported files to diff, for example a batch of files that has just
+            been written, or None to diff all exported files.  Deleted files are always found
+            across the whole export_dir.
+
         Returns
         -------
         (deleted_files, common_diffs, new_files): Tuple[Files, FileDiffMap, Files]
@@ -210,6 +217,8 @@ class ArchiveDiffer:
 
         deleted_files = sorted(join(self.cache_dir, f)
                                for f in previous_files - exported_files)
+        if filenames is not None:
+            exported_files &= set(filenames)
         common_filenames = sorted(exported_files & previous_files)
         new_files = sorted(join(self.export_dir, f)
                            for f in exported_files - previous_files)
@@ -292,12 +301,21 @@ class ArchiveDiffer:
             else:
                 replace(diff_file, exported_file)
 
-    def run(self):
-        """Run the differ and archive the changed and new files."""
-        self.update_cache()
+    def run(self, changes: Optional[Tuple[Files, FileDiffMap, Files]] = None):
+        """Run the differ and archive the changed and new files.
+
+        Parameters
+        ----------
+        changes: Optional[Tuple[Files, FileDiffMap, Files]]
+            Result of an earlier call to update_cache() and diff_exports(), for example one whose
+            changes have already been validated, or None to update the cache and diff here.
+        """
+        if changes is None:
+            self.update_cache()
 
-        # Diff exports, and make incremental versions
-        _, common_diffs, new_files = self.diff_exports()
+            # Diff exports, and make incremental versions
+            changes = self.diff_exports()
+        _, common_diffs, new_files = changes
 
         # Archive changed and new files only
         to_archive = [f for f, diff in common_diffs.items()
@@ -522,14 +540,14 @@ class GitArchiveDiffer(ArchiveDiffer):
 
         self._cache_updated = True
 
-    def diff_exports(self) -> Tuple[Files, FileDiffMap, Files]:
+    def diff_exports(self, filenames: Optional[Files] = None) -> Tuple[Files, FileDiffMap, Files]:
         """
         Find diffs across and within CSV files, from cache_dir to export_dir.
 
         Same as base class diff_exports, but in context of specified branch.
         """
         with self.archiving_branch():
-            return super().diff_exports()
+            return super().diff_exports(filenames)
 
     def archive_exports(self, exported_files: Files) -> Tuple[Files, Files]:
         """
@@ -0,0 +1,111 @@
+"""Memory-lean column dtypes for indicator inputs.
+
+`pd.read_csv` gives every count column 64 bits and every code column Python string objects.
+On multi-year drops with one row per location, date and age group, these input frames dominate
+the peak memory of a pipeline.  `apply_dtype_policy` recasts each column to the smallest dtype
+that holds its values exactly:
+
+    data = apply_dtype_policy(data, {"Denominator": "count", "PatCountyFIPS": "category",
+                                     "ServiceDate": "date"}, logger=logger)
+
+Policies:
+- "count": int32 if the values are whole numbers within the int32 range, and otherwise left as
+  they are. Columns with nans become float32 instead, but only if the sum of all their values is
+  at most 2**24, so that any sum of them is exact in float32. pandas and numpy accumulate sums of
+  int32 columns in int64, so aggregating int32 counts cannot overflow.
+- "category": categorical, for geographic codes and other labels with few distinct values.
+  Group by such columns with `observed=True` to avoid a group for every unused category.
+- "date": datetime64.
+- "float": float32 if every value survives the round trip to float32 unchanged, and otherwise
+  left as float64. Intended for values that are stored rather than summed.
+"""
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+
+POLICIES = ("count", "category", "date", "float")
+
+INT32_MAX = np.iinfo(np.int32).max
+INT32_MIN = np.iinfo(np.int32).min
+# Largest integer up to which every integer is exactly representable in float32.
+FLOAT32_EXACT_MAX = 2 ** 24
+
+
+def memory_usage(df: pd.DataFrame) -> int:
+    """Return the memory used by a data frame in bytes, including the objects it refers to."""
+    return int(df.memory_usage(deep=True).sum())
+
+
+def _lean_count(values: pd.Series) -> pd.Series:
+    if not pd.api.types.is_numeric_dtype(values):
+        raise ValueError(f"Count column {values.name} is not numeric.")
+    array = values.to_numpy(dtype=float)
+    missing = np.isnan(array)
+    present = array[~missing]
+    if not np.array_equal(present, np.round(present)):
+        return values
+    if not missing.any():
+        if present.size == 0 or (present.min() >= INT32_MIN and present.max() <= INT32_MAX):
+            return values.astype(np.int32)
+        return values
+    if np.abs(present).sum() <= FLOAT32_EXACT_MAX:
+        return values.astype(np.float32)
+    return values
+
+
+def _lean_float(values: pd.Series) -> pd.Series:
+    array = values.to_numpy(dtype=float)
+    with np.errstate(over="ignore"):
+        lean = array.astype(np.float32)
+    if np.array_equal(lean.astype(float), array, equal_nan=True):
+        return values.astype(np.float32)
+    return values
+
+
+def apply_dtype_policy(df: pd.DataFrame, policy: Dict[str, str], logger=None) -> pd.DataFrame:
+    """Recast the columns of a data frame to memory-lean dtypes.
+
+    Columns whose values would not be held exactly by the lean dtype keep their dtype; columns
+    not in the policy are left unchanged.
+
+    Parameters
+    ----------
+    df: pd.DataFrame
+        Data frame to recast.
+    policy: Dict[str, str]
+        Policy of each column, one of POLICIES; see the module docstring.
+    logger: Optional[logging.Logger]
+        Logger to which to report the memory used by the data frame before and after.
+
+    Returns
+    -------
+    pd.DataFrame
+        A data frame with the recast columns, sharing the others with df.
+    """
+    invalid = set(policy.values()) - set(POLICIES)
+    if invalid:
+        raise ValueError(f"Invalid dtype policies {sorted(invalid)}; should be in {POLICIES}.")
+    bytes_before = memory_usage(df) if logger is not None else None
+
+    recast = {}
+    for column, kind in policy.items():
+        values = df[column]
+        if kind == "count":
+            recast[column] = _lean_count(values)
+        elif kind == "category":
+            recast[column] = values.astype("category")
+        elif kind == "date":
+            recast[column] = pd.to_datetime(values)
+        else:
+            recast[column] = _lean_float(values)
+    df = df.assign(**recast)
+
+    if logger is not None:
+        bytes_after = memory_usage(df)
+        logger.info("Applied dtype policy",
+                    rows=len(df),
+                    bytes_before=bytes_before,
+                    bytes_after=bytes_after,
+                    dtypes={column: str(df[column].dtype) for column in policy})
+    return df
@@ -1,12 +1,38 @@
 """Export data in the format expected by the Delphi API."""
 # -*- coding: utf-8 -*-
+from contextlib import contextmanager
 from datetime import datetime
 from os.path import join
-from typing import Optional
+from typing import Callable, Iterable, List, Optional, Tuple
 
 import numpy as np
 import pandas as pd
 
+# Functions called with the export directory and the names of the files written by each call of
+# create_export_csv in this process.
+_export_listeners: List[Callable[[str, List[str]], None]] = []
+
+
+@contextmanager
+def export_listener(listener: Callable[[str, List[str]], None]):
+    """Notify `listener` of every batch of files written by `create_export_csv`.
+
+    Each call of `create_export_csv` in this process, from any thread, calls
+    `listener(export_dir, filenames)` once all of its files are written, where `filenames` are
+    the base names of the files.  Files written in other processes are not reported.
+
+    Parameters
+    ----------
+    listener: Callable[[str, List[str]], None]
+        function to call after each batch of files is written
+    """
+    _export_listeners.append(listener)
+    try:
+        yield
+    finally:
+        _export_listeners.remove(listener)
+
+
 def create_export_csv(
     df: pd.DataFrame,
     export_dir: str,
@@ -64,15 +90,61 @@ def create_export_csv(
     else:
         dates = pd.date_range(start_date, end_date)
 
-    for date in dates:
+    export_frames = (
+        (date, df[df["timestamp"] == date][["geo_id", "val", "se", "sample_size",]])
+        for date in dates
+    )
+    write_export_frames(export_frames, export_dir, geo_res, sensor, metric, remove_null_samples)
+    return dates
+
+
+def write_export_frames(
+    export_frames: Iterable[Tuple[datetime, pd.DataFrame]],
+    export_dir: str,
+    geo_res: str,
+    sensor: str,
+    metric: Optional[str] = None,
+    remove_null_samples: Optional[bool] = False
+) -> List[str]:
+    """Write one CSV file per date in the format expected by the Delphi API.
+
+    This is the writing step of `create_export_csv`, for callers that already have the rows of
+    each date, e.g. `SignalPanel.export_csv`. Signal and standard error values are rounded to 7
+    decimal places, and export listeners are notified once all files are written.
+
+    Parameters
+    ----------
+    export_frames: Iterable[Tuple[datetime, pd.DataFrame]]
+        Pairs of a date and its rows, with columns geo_id, val, se, sample_size
+    export_dir: str
+        Export directory
+    geo_res: str
+        Geographic resolution to which the data has been aggregated
+    sensor: str
+        Sensor that has been calculated (cumulative_counts vs new_counts)
+    metric: Optional[str]
+        Metric we are considering, if any.
+    remove_null_samples: Optional[bool]
+        Whether to remove entries whose sample sizes are null.
+
+    Returns
+    ---------
+    export_filenames: List[str]
+        Base names of the files written.
+    """
+    export_filenames = []
+    for date, export_df in export_frames:
         if metric is None:
             export_filename = f"{date.strftime('%Y%m%d')}_{geo_res}_{sensor}.csv"
         else:
             export_filename = f"{date.strftime('%Y%m%d')}_{geo_res}_{metric}_{sensor}.csv"
         export_file = join(export_dir, export_filename)
-        export_df = df[df["timestamp"] == date][["geo_id", "val", "se", "sample_size",]]
         if remove_null_samples:
             export_df = export_df[export_df["sample_size"].notnull()]
         export_df = export_df.round({"val": 7, "se": 7})
         export_df.to_csv(export_file, index=False, na_rep="NA")
-    return dates
+        export_filenames.append(export_filename)
+
+    for listener in list(_export_listeners):
+        listener(export_dir, export_filenames)
+    return export_filenames
@@ -9,6 +9,7 @@ TODO:
 """
 # pylint: disable=too-many-lines
 from os.path import join
+from typing import Dict, List, Optional, Tuple
 
 import pandas as pd
 import pkg_resources
@@ -48,6 +49,10 @@ CROSSWALK_FILEPATHS = {
     "nation": {"pop": join(DATA_PATH, "nation_pop.csv"),},
 }
 
+# Crosswalk tables loaded by `GeoMapper.warm_cache`, shared by every GeoMapper created afterwards
+# in this process and in processes forked from it.  Crosswalks are never modified in place.
+_SHARED_CROSSWALKS: Dict[Tuple[str, str], pd.DataFrame] = {}
+
 
 class GeoMapper:  # pylint: disable=too-many-public-methods
     """Geo mapping tools commonly used in Delphi.
@@ -134,6 +139,29 @@ class GeoMapper:  # pylint: disable=too-many-public-methods
                                   "state_name", "hhs", "msa"]
         }
         self.geo_lists["nation"] = {"us"}
+        for (from_code, to_code), crosswalk in _SHARED_CROSSWALKS.items():
+            self.crosswalks[from_code][to_code] = crosswalk
+
+    @staticmethod
+    def warm_cache(crosswalks: Optional[List[Tuple[str, str]]] = None):
+        """Load crosswalk tables once for all GeoMapper instances created afterwards.
+
+        Useful before running several indicators in one process, or before forking worker
+        processes, so that the tables are parsed only once.
+
+        Parameters
+        ---------
+        crosswalks: Optional[List[Tuple[str, str]]]
+            (from_code, to_code) pairs of the tables to load, or None to load all tables
+        """
+        if crosswalks is None:
+            crosswalks = [(from_code, to_code)
+                          for from_code, to_codes in CROSSWALK_FILEPATHS.items()
+                          for to_code in to_codes]
+        mapper = GeoMapper()
+        for from_code, to_code in crosswalks:
+            crosswalk = mapper._load_crosswalk(from_code, to_code)  # pylint: disable=protected-access
+            _SHARED_CROSSWALKS[(from_code, to_code)] = crosswalk
 
     # Utility functions
     def _load_crosswalk(self, from_code, to_code):
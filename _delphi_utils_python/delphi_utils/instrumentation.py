@@ -0,0 +1,220 @@
+"""Stage-level timing and resource instrumentation for indicator pipelines.
+
+`run_indicator_pipeline` records the indicator, validation, and archive stages of every run in a
+`PipelineProfiler`.  Indicators can time their own sub-stages with `profile_stage`, which records
+into the profiler of the enclosing stage, if there is one, e.g.
+
+    from delphi_utils import profile_stage
+
+    def run_module(params):
+        with profile_stage("pull"):
+            df = pull_data(...)
+        with profile_stage("export"):
+            create_export_csv(df, ...)
+
+Outside of a profiled pipeline `profile_stage` does nothing.
+"""
+import json
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import asdict, dataclass
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# Profiler and name of the stage enclosing the current code, if any.
+_active_stage: ContextVar = ContextVar("active_stage", default=(None, None))
+# Interval in seconds at which the resident set size is sampled during a stage.
+RSS_SAMPLE_SECONDS = 0.05
+
+
+@dataclass
+class StageMetrics:  # pylint: disable=too-many-instance-attributes
+    """Resources used by one stage of a pipeline run."""
+
+    # Name of the stage, prefixed by the names of enclosing stages, e.g. "indicator/pull"
+    name: str
+    # Name of the enclosing stage, or None for top-level stages
+    parent: Optional[str] = None
+    wall_time_seconds: float = 0.0
+    # CPU time of this process and of child processes that finished during the stage
+    cpu_time_seconds: float = 0.0
+    # Peak resident set size of this process during the stage, as sampled every
+    # RSS_SAMPLE_SECONDS, and its change from the start to the end of the stage; 0 where the
+    # resident set size cannot be read
+    peak_rss_bytes: int = 0
+    rss_change_bytes: int = 0
+    # Peak resident set size of this process (or of its largest finished child) since it started
+    process_peak_rss_bytes: int = 0
+    # Files created or modified in the watched directories, and their total size
+    files_written: int = 0
+    bytes_written: int = 0
+    # Whether the stage raised an exception
+    failed: bool = False
+
+
+def _cpu_time():
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def _current_rss_bytes():
+    """Return the resident set size of this process, or 0 where it cannot be read."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class _RSSSampler:
+    """Track the peak resident set size of this process in a background thread."""
+
+    def __init__(self):
+        self.start_bytes = _current_rss_bytes()
+        self.peak_bytes = self.start_bytes
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(RSS_SAMPLE_SECONDS):
+            self.peak_bytes = max(self.peak_bytes, _current_rss_bytes())
+
+    def stop(self):
+        """Stop sampling; return the peak and the change of the resident set size."""
+        self._stopped.set()
+        self._thread.join()
+        end_bytes = _current_rss_bytes()
+        return max(self.peak_bytes, end_bytes), end_bytes - self.start_bytes
+
+
+def _peak_rss_bytes():
+    # ru_maxrss is in kilobytes on Linux but in bytes on macOS.
+    scale = 1 if sys.platform == "darwin" else 1024
+    return scale * max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                       resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+
+def _snapshot(directories: Iterable[str]) -> Dict[str, Tuple[int, int]]:
+    """Map each file in `directories` to its modification time and size."""
+    files = {}
+    for directory in directories:
+        if not os.path.isdir(directory):
+            continue
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_file():
+                    stat = entry.stat()
+                    files[entry.path] = (stat.st_mtime_ns, stat.st_size)
+    return files
+
+
+class PipelineProfiler:
+    """Collect `StageMetrics` for the stages of a pipeline run."""
+
+    def __init__(self, watch_dirs: Iterable[str] = ()):
+        """Initialize an empty profile.
+
+        Parameters
+        ----------
+        watch_dirs: Iterable[str]
+            directories in which written files are counted, e.g. the export and cache directories
+        """
+        self.watch_dirs = [d for d in watch_dirs if d]
+        self.start_time = datetime.now()
+        self.stages: List[StageMetrics] = []
+
+    @contextmanager
+    def stage(self, name: str):
+        """Record the resources used by the enclosed block as a stage named `name`.
+
+        Stages may be nested, directly or through `profile_stage`; nested stage names are
+        prefixed by the names of the stages enclosing them.
+
+        Parameters
+        ----------
+        name: str
+            name of the stage
+        """
+        _, parent = _active_stage.get()
+        metrics = StageMetrics(name if parent is None else f"{parent}/{name}", parent)
+        self.stages.append(metrics)
+        token = _active_stage.set((self, metrics.name))
+        files_before = _snapshot(self.watch_dirs)
+        wall_start = time.perf_counter()
+        cpu_start = _cpu_time()
+        rss_sampler = _RSSSampler()
+        try:
+            yield metrics
+        except BaseException:
+            metrics.failed = True
+            raise
+        finally:
+            metrics.wall_time_seconds = time.perf_counter() - wall_start
+            metrics.cpu_time_seconds = _cpu_time() - cpu_start
+            metrics.peak_rss_bytes, metrics.rss_change_bytes = rss_sampler.stop()
+            metrics.process_peak_rss_bytes = _peak_rss_bytes()
+            written = [size for path, (mtime, size) in _snapshot(self.watch_dirs).items()
+                       if files_before.get(path) != (mtime, size)]
+            metrics.files_written = len(written)
+            metrics.bytes_written = sum(written)
+            _active_stage.reset(token)
+
+    def to_dict(self) -> dict:
+        """Return the profile as a JSON-serializable dict."""
+        return {
+            "start_time": self.start_time.isoformat(),
+            "stages": [asdict(metrics) for metrics in self.stages]
+        }
+
+    def log(self, logger):
+        """Log the metrics of every stage.
+
+        Parameters
+        ----------
+        logger: logging.Logger
+            structured logger to which to write one line per stage
+        """
+        for metrics in self.stages:
+            logger.info("Pipeline stage profile", **asdict(metrics))
+
+    def write_json(self, output_dir: str) -> str:
+        """Write the profile to a JSON file named after the start time of the run.
+
+        Parameters
+        ----------
+        output_dir: str
+            directory in which to write the file; created if it does not exist
+
+        Returns
+        -------
+        Path of the written file.
+        """
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir,
+                            f"profile_{self.start_time.strftime('%Y%m%d_%H%M%S_%f')}.json")
+        with open(path, "w") as profile_file:
+            json.dump(self.to_dict(), profile_file, indent=2)
+        return path
+
+
+@contextmanager
+def profile_stage(name: str):
+    """Record the enclosed block as a sub-stage of the active pipeline stage, if any.
+
+    Parameters
+    ----------
+    name: str
+        name of the sub-stage, e.g. "pull", "geo_map", "smooth", or "export"
+    """
+    profiler, _ = _active_stage.get()
+    if profiler is None:
+        yield None
+        return
+    with profiler.stage(name) as metrics:
+        yield metrics
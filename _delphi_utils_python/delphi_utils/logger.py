@@ -1,9 +1,34 @@
-"""Structured logger utility for creating JSON logs in Delphi pipelines."""
+"""Structured logger utility for creating JSON logs in Delphi pipelines.
+
+By default, loggers write each event synchronously to stderr and an optional file.  To log from
+`multiprocessing` workers, or to keep logging I/O out of hot loops, run a `LogListener` in the
+parent process and send events from all processes through its queue:
+
+    with LogListener(filename) as listener:
+        logger = get_structured_logger(__name__, log_queue=listener.queue)
+        with Pool(n, initializer=init_worker_logging, initargs=(listener.queue,)) as pool:
+            ...  # get_structured_logger() in the workers now also logs through the queue
+            pool.close()
+            pool.join()
+
+The listener writes the queued events to stderr and the file in batches from a single thread.
+Close and join a pool before the listener stops: leaving the `with` block of a pool terminates
+its workers, and a worker terminated while sending an event to the queue keeps it locked, so
+that the listener then waits forever.
+"""
 import logging
+from logging.handlers import QueueHandler
+import multiprocessing
+import queue as queue_module
+import random
 import sys
 import threading
+from typing import Optional
 import structlog
 
+# Defaults for loggers created in this process; set in pool workers by `init_worker_logging`.
+_WORKER_LOGGING = {"log_queue": None, "debug_sample_rate": None}
+
 
 def handle_exceptions(logger):
     """Handle exceptions using the provided logger."""
@@ -18,9 +43,124 @@ def handle_exceptions(logger):
     threading.excepthook = multithread_exception_handler
 
 
+class LogListener:
+    """Write log events queued by any process to stderr and an optional file, in batches.
+
+    Events are collected by a background thread, which writes all events available at once (up
+    to `batch_size`) with a single write per stream, and flushes at least every
+    `flush_interval` seconds.  Use as a context manager, or call `start` and `stop`.
+    """
+
+    def __init__(self, filename: Optional[str] = None, batch_size: int = 100,
+                 flush_interval: float = 1.0, log_queue=None):
+        """Initialize a LogListener.
+
+        Parameters
+        ---------
+        filename: An (optional) file to write log output, in addition to stderr.
+        batch_size: Maximum number of events written at once.
+        flush_interval: Maximum time in seconds that events are held before being written.
+        log_queue: Queue from which to read events; defaults to a new `multiprocessing.Queue`.
+        """
+        self.filename = filename
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = multiprocessing.Queue() if log_queue is None else log_queue
+        self._thread = None
+
+    def start(self):
+        """Start writing queued events in a background thread."""
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """Write all events queued so far and stop the background thread."""
+        self.queue.put(None)
+        self._thread.join()
+        self._thread = None
+
+    def __enter__(self):
+        """Start the listener."""
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        """Stop the listener once all queued events are written."""
+        self.stop()
+
+    def _run(self):
+        streams = [sys.stderr]
+        if self.filename:
+            streams.append(open(self.filename, "a"))  # pylint: disable=consider-using-with
+        try:
+            stopped = False
+            while not stopped:
+                try:
+                    records = [self.queue.get(timeout=self.flush_interval)]
+                except queue_module.Empty:
+                    continue
+                while records[-1] is not None and len(records) < self.batch_size:
+                    try:
+                        records.append(self.queue.get_nowait())
+                    except queue_module.Empty:
+                        break
+                if records[-1] is None:
+                    records.pop()
+                    stopped = True
+                if records:
+                    lines = "".join(record.getMessage() + "\n" for record in records)
+                    for stream in streams:
+                        stream.write(lines)
+                        stream.flush()
+        finally:
+            for stream in streams[1:]:
+                stream.close()
+
+
+def init_worker_logging(log_queue, debug_sample_rate: Optional[float] = None):
+    """Send events of all loggers later created in this process to `log_queue`.
+
+    Events logged through the root logger of the `logging` module, as by `logging.info`, are sent
+    to the queue too.  Intended as the `initializer` of a `multiprocessing.Pool`, with the queue of
+    a `LogListener` in the parent process as its argument.
+
+    Parameters
+    ---------
+    log_queue: Queue of the `LogListener` that writes the events.
+    debug_sample_rate: Default `debug_sample_rate` of loggers created in this process.
+    """
+    _WORKER_LOGGING["log_queue"] = log_queue
+    _WORKER_LOGGING["debug_sample_rate"] = debug_sample_rate
+    # Events logged with the `logging` module directly go to the queue instead of stderr too.
+    root_logger = logging.getLogger()
+    _remove_handlers(root_logger, QueueHandler)
+    if log_queue is not None:
+        _remove_handlers(root_logger, logging.StreamHandler)
+        root_logger.addHandler(QueueHandler(log_queue))
+
+
+def _remove_handlers(system_logger, handler_types):
+    """Remove and close the handlers of `system_logger` of the given types."""
+    for handler in system_logger.handlers[:]:
+        if isinstance(handler, handler_types):
+            system_logger.removeHandler(handler)
+            handler.close()
+
+
+def _debug_sampler(rate):
+    """Create a structlog processor keeping a fraction `rate` of debug events."""
+    def sample_debug(_, method_name, event_dict):
+        if method_name == "debug" and random.random() >= rate:
+            raise structlog.DropEvent
+        return event_dict
+    return sample_debug
+
+
 def get_structured_logger(name=__name__,
                           filename=None,
-                          log_exceptions=True):
+                          log_exceptions=True,
+                          log_queue=None,
+                          debug_sample_rate=None):
     """Create a new structlog logger.
 
     Use the logger returned from this in indicator code using the standard
@@ -39,7 +179,18 @@ def get_structured_logger(name=__name__,
     name: Name to use for logger (included in log lines), __name__ from caller
     is a good choice.
     filename: An (optional) file to write log output.
+    log_exceptions: Whether to log uncaught exceptions with this logger.
+    log_queue: An (optional) queue of a `LogListener` to which to send log output instead of
+    writing it directly; defaults to the queue set by `init_worker_logging`, if any.  `filename`
+    is ignored when logging to a queue, as the listener writes the output.
+    debug_sample_rate: An (optional) fraction of debug events to keep.  Debug events are
+    dropped entirely by default.
     """
+    if log_queue is None:
+        log_queue = _WORKER_LOGGING["log_queue"]
+    if debug_sample_rate is None:
+        debug_sample_rate = _WORKER_LOGGING["debug_sample_rate"]
+
     # Configure the basic underlying logging configuration
     logging.basicConfig(
         format="%(message)s",
@@ -82,10 +233,25 @@ def get_structured_logger(name=__name__,
 
     # Create the underlying python logger and wrap it with structlog
     system_logger = logging.getLogger(name)
-    if filename:
-        system_logger.addHandler(logging.FileHandler(filename))
-    system_logger.setLevel(logging.INFO)
-    logger = structlog.wrap_logger(system_logger)
+    if log_queue is not None:
+        # The listener writes to stderr and the file itself, so replace any handlers writing
+        # directly set by earlier calls, and do not also propagate to the root handler.
+        _remove_handlers(system_logger, (QueueHandler, logging.FileHandler))
+        system_logger.addHandler(QueueHandler(log_queue))
+        system_logger.propagate = False
+    else:
+        # Undo logging to a queue set by earlier calls.
+        _remove_handlers(system_logger, QueueHandler)
+        system_logger.propagate = True
+        if filename:
+            system_logger.addHandler(logging.FileHandler(filename))
+    system_logger.setLevel(logging.INFO if debug_sample_rate is None else logging.DEBUG)
+    if debug_sample_rate is None:
+        logger = structlog.wrap_logger(system_logger)
+    else:
+        logger = structlog.wrap_logger(
+            system_logger,
+            processors=[_debug_sampler(debug_sample_rate)] + structlog.get_config()["processors"])
 
     if log_exceptions:
         handle_exceptions(logger)
@@ -0,0 +1,147 @@
+"""Run the pipelines of several indicators from one process.
+
+Each indicator is given as the name of its package, optionally followed by `=` and the directory
+holding its `params.json` (by default the current directory), e.g.
+
+    python -m delphi_utils.orchestrator delphi_changehc=changehc delphi_quidel=quidel \
+        --max-workers 2 --profile-file profile.json
+
+Indicators are run by `run_indicator_module` on a single pool of worker processes, so that at
+most `max_workers` run at once and every worker imports pandas and delphi_utils only once.
+GeoMapper crosswalk tables are loaded before the workers start and shared by all of them.
+"""
+import argparse as ap
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+import json
+import multiprocessing
+import os
+from os.path import abspath
+import resource
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from .geomap import GeoMapper
+from .logger import get_structured_logger
+from .runner import run_indicator_module
+
+
+def parse_indicator(spec: str) -> Tuple[str, str]:
+    """Split an indicator given as "package" or "package=directory" into its two parts."""
+    package, _, directory = spec.partition("=")
+    return package, directory or "."
+
+
+def _init_worker():
+    """Make sure crosswalks are loaded in workers that were not forked from a warmed parent."""
+    GeoMapper.warm_cache()
+
+
+def _run_indicator(package: str, directory: str) -> Dict[str, Any]:
+    """Run one indicator in its directory and summarize the run."""
+    summary: Dict[str, Any] = {
+        "indicator": package,
+        "directory": abspath(directory),
+        "worker_pid": os.getpid(),
+        "stages": []
+    }
+    original_dir = os.getcwd()
+    start = time.perf_counter()
+    try:
+        os.chdir(directory)
+        profiler = run_indicator_module(package)
+        summary["status"] = "success"
+        summary["stages"] = profiler.to_dict()["stages"]
+    except Exception as e:  # pylint: disable=broad-except
+        summary["status"] = "failed"
+        summary["error"] = repr(e)
+    finally:
+        os.chdir(original_dir)
+    summary["wall_time_seconds"] = time.perf_counter() - start
+    # ru_maxrss is in kilobytes on Linux but in bytes on macOS.
+    summary["worker_peak_rss_bytes"] = (1 if sys.platform == "darwin" else 1024) * \
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return summary
+
+
+def run_indicators(indicators: List[Tuple[str, str]],
+                   max_workers: Optional[int] = None,
+                   profile_file: Optional[str] = None,
+                   logger=None) -> Dict[str, Any]:
+    """Run the pipelines of several indicators with bounded concurrency.
+
+    Parameters
+    ----------
+    indicators: List[Tuple[str, str]]
+        (package name, directory with params.json) pairs of the indicators to run
+    max_workers: Optional[int]
+        maximum number of indicators to run at once; defaults to the number of CPUs
+    profile_file: Optional[str]
+        file to which to write the combined profile as JSON, if any
+    logger: Optional[logging.Logger]
+        structured logger for the profile; defaults to a new one
+
+    Returns
+    -------
+    Combined profile with the wall time of the whole run and a summary of every indicator run,
+    including the stages recorded by `run_indicator_pipeline`, in the order given.
+    """
+    if logger is None:
+        logger = get_structured_logger(__name__)
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    max_workers = max(1, min(max_workers, len(indicators)))
+
+    start_time = datetime.now()
+    start = time.perf_counter()
+    # Load crosswalks once here; forked workers inherit them.
+    GeoMapper.warm_cache()
+    context = multiprocessing.get_context(
+        "fork" if "fork" in multiprocessing.get_all_start_methods() else None)
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=context,
+                             initializer=_init_worker) as executor:
+        futures = [executor.submit(_run_indicator, package, directory)
+                   for package, directory in indicators]
+        summaries = [future.result() for future in futures]
+
+    profile = {
+        "start_time": start_time.isoformat(),
+        "max_workers": max_workers,
+        "wall_time_seconds": time.perf_counter() - start,
+        "indicator_time_seconds": sum(s["wall_time_seconds"] for s in summaries),
+        "indicators": summaries
+    }
+    for summary in summaries:
+        logger.info("Indicator run profile",
+                    **{key: value for key, value in summary.items() if key != "stages"})
+    logger.info("Orchestrator run profile",
+                **{key: value for key, value in profile.items() if key != "indicators"})
+    if profile_file:
+        with open(profile_file, "w") as f:
+            json.dump(profile, f, indent=2)
+    return profile
+
+
+def main():
+    """Run the indicators named on the command line."""
+    parser = ap.ArgumentParser()
+    parser.add_argument("indicators", nargs="+",
+                        help="Indicators to run, each given as the name of a Python package "
+                             "exporting a `run.run_module(params)` function, optionally followed "
+                             "by `=` and the directory containing its params.json.")
+    parser.add_argument("--max-workers", type=int, default=None,
+                        help="Maximum number of indicators to run at once.")
+    parser.add_argument("--profile-file", default=None,
+                        help="File to which to write the combined timing profile as JSON.")
+    parser.add_argument("--log-file", default=None,
+                        help="File to which to write log output.")
+    args = parser.parse_args()
+    profile = run_indicators([parse_indicator(spec) for spec in args.indicators],
+                             args.max_workers, args.profile_file,
+                             get_structured_logger(__name__, args.log_file))
+    sys.exit(int(any(s["status"] != "success" for s in profile["indicators"])))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,291 @@
+"""Dense geo x date container for the values of a signal.
+
+Indicators usually carry their values in long data frames, with one row per location and date,
+and aggregate, smooth and export them with a groupby or a filter per location or date.  A
+`SignalPanel` instead holds every field (num, den, val, se, sample_size) as a dense float array
+with one row per location and one column per day of a contiguous date range, so that these steps
+become array operations:
+
+    panel = SignalPanel.from_frame(df)
+    panel = panel.aggregate_geo(geo_mapper, "fips", "state_id")
+    panel = panel.with_fields(val=panel["num"] / panel["den"] * 100)
+    panel = panel.smooth(Smoother("savgol"), "val")
+    panel.window(start_date, end_date).export_csv(export_dir, "state", "smoothed_cli")
+
+Missing values are nans; a location has a row on a date in `to_frame` and `export_csv` only if
+any of its fields is not nan there.
+"""
+from datetime import datetime
+from typing import Dict, Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from .export import write_export_frames
+
+FIELDS = ("num", "den", "val", "se", "sample_size")
+# Fields that can be summed when aggregating locations.
+ADDITIVE_FIELDS = ("num", "den", "sample_size")
+EXPORT_FIELDS = ("val", "se", "sample_size")
+
+
+def _present(shape, arrays):
+    """Return where any of the arrays is not nan."""
+    present = np.zeros(shape, dtype=bool)
+    for values in arrays:
+        present |= ~np.isnan(values)
+    return present
+
+
+class SignalPanel:
+    """Values of a signal for a set of locations over a contiguous range of days.
+
+    Parameters
+    ----------
+    geo_ids: Sequence
+        Unique ids of the locations; the row of each location in the arrays of the fields.
+    dates: pd.DatetimeIndex
+        Consecutive days; the column of each date in the arrays of the fields.
+    fields: Dict[str, np.ndarray]
+        Arrays of shape (len(geo_ids), len(dates)) keyed by field name, one of FIELDS.
+    """
+
+    def __init__(self, geo_ids: Sequence, dates: pd.DatetimeIndex, fields: Dict[str, np.ndarray]):
+        """See class docstring."""
+        self.geo_ids = np.asarray(geo_ids)
+        self.dates = pd.DatetimeIndex(dates)
+        if len(pd.unique(self.geo_ids)) != len(self.geo_ids):
+            raise ValueError("The geo ids of a panel should be unique.")
+        if len(self.dates) > 0 and \
+                not self.dates.equals(pd.date_range(self.dates[0], periods=len(self.dates))):
+            raise ValueError("The dates of a panel should be consecutive days.")
+        self.fields = {}
+        for name, values in fields.items():
+            if name not in FIELDS:
+                raise ValueError(f"Invalid field {name}; should be one of {FIELDS}.")
+            values = np.asarray(values, dtype=float)
+            if values.shape != self.shape:
+                raise ValueError(f"Field {name} has shape {values.shape}, expected {self.shape}.")
+            self.fields[name] = values
+
+    @property
+    def shape(self):
+        """Number of locations and of dates."""
+        return len(self.geo_ids), len(self.dates)
+
+    def __getitem__(self, field: str) -> np.ndarray:
+        """Return the array of a field."""
+        return self.fields[field]
+
+    @classmethod
+    def from_frame(cls,
+                   df: pd.DataFrame,
+                   geo_col: str = "geo_id",
+                   date_col: str = "timestamp",
+                   fields: Optional[Sequence[str]] = None,
+                   dates: Optional[pd.DatetimeIndex] = None) -> "SignalPanel":
+        """Create a panel from a long data frame with at most one row per location and date.
+
+        Parameters
+        ----------
+        df: pd.DataFrame
+            Columns: geo_col, date_col and the fields
+        geo_col: str
+            Column with the location ids, which become the sorted geo ids of the panel.
+        date_col: str
+            Column with the dates.
+        fields: Optional[Sequence[str]]
+            Columns to hold in the panel; by default, all columns of df named in FIELDS.
+        dates: Optional[pd.DatetimeIndex]
+            Consecutive days of the panel; by default, all days from the earliest to the latest
+            date in df. Rows of df on other dates are dropped.
+
+        Returns
+        ---------
+        panel: SignalPanel
+        """
+        if fields is None:
+            fields = [field for field in FIELDS if field in df.columns]
+        timestamps = pd.to_datetime(df[date_col])
+        if dates is None:
+            dates = pd.date_range(timestamps.min(), timestamps.max()) if len(df) > 0 \
+                else pd.DatetimeIndex([])
+        dates = pd.DatetimeIndex(dates)
+        geo_codes, geo_ids = pd.factorize(df[geo_col], sort=True)
+        if len(dates) > 0:
+            date_codes = ((timestamps - dates[0]) // pd.Timedelta(days=1)).to_numpy()
+        else:
+            date_codes = np.zeros(len(df), dtype=int)
+        keep = (date_codes >= 0) & (date_codes < len(dates))
+        geo_codes, date_codes = geo_codes[keep], date_codes[keep]
+        if pd.Index(geo_codes * len(dates) + date_codes).has_duplicates:
+            raise ValueError("The data frame has more than one row for a location and date.")
+
+        arrays = {}
+        for field in fields:
+            values = np.full((len(geo_ids), len(dates)), np.nan)
+            values[geo_codes, date_codes] = df[field].to_numpy(dtype=float)[keep]
+            arrays[field] = values
+        return cls(np.asarray(geo_ids), dates, arrays)
+
+    def to_frame(self, geo_col: str = "geo_id", date_col: str = "timestamp") -> pd.DataFrame:
+        """Return the values as a long data frame, with a row for every location and date with data.
+
+        Rows are sorted by location, then date.
+        """
+        present = _present(self.shape, self.fields.values())
+        geo_rows, date_columns = np.nonzero(present)
+        return pd.DataFrame({
+            geo_col: self.geo_ids[geo_rows],
+            date_col: self.dates[date_columns],
+            **{name: values[present] for name, values in self.fields.items()}
+        })
+
+    def window(self,
+               start_date: Optional[datetime] = None,
+               end_date: Optional[datetime] = None) -> "SignalPanel":
+        """Return the panel restricted to the dates between start_date and end_date, inclusive.
+
+        The arrays of the returned panel are views on the arrays of this panel, so no values
+        are copied.
+        """
+        start = 0 if start_date is None else self.dates.searchsorted(start_date, side="left")
+        end = len(self.dates) if end_date is None \
+            else self.dates.searchsorted(end_date, side="right")
+        return SignalPanel(
+            self.geo_ids, self.dates[start:end],
+            {name: values[:, start:end] for name, values in self.fields.items()})
+
+    def with_fields(self, **fields: np.ndarray) -> "SignalPanel":
+        """Return a panel with the given fields added or replaced, sharing all other arrays."""
+        return SignalPanel(self.geo_ids, self.dates, {**self.fields, **fields})
+
+    def aggregate_geo(self,
+                      geo_mapper,
+                      from_code: str,
+                      new_code: str,
+                      fields: Optional[Sequence[str]] = None) -> "SignalPanel":
+        """Aggregate the locations to another geographic resolution.
+
+        Equivalent to `GeoMapper.replace_geocode` on the long data frame: values are multiplied
+        by the crosswalk weights, if any, and summed per new location, with nans counting as
+        zero. A new location is nan on a date where none of its locations has data.
+
+        Parameters
+        ----------
+        geo_mapper: GeoMapper
+            Mapper providing the crosswalk between the resolutions.
+        from_code: str
+            Geocode type of the geo ids of this panel, as in `GeoMapper.add_geocode`.
+        new_code: str
+            Geocode type to aggregate to.
+        fields: Optional[Sequence[str]]
+            Fields to aggregate; by default, all fields in ADDITIVE_FIELDS. The other fields
+            cannot be summed and are not in the returned panel.
+
+        Returns
+        ---------
+        panel: SignalPanel
+            A panel with the new locations as geo ids, in sorted order.
+        """
+        if fields is None:
+            fields = [field for field in ADDITIVE_FIELDS if field in self.fields]
+        # Only the crosswalk of the locations is needed, not a merge of every row of the data.
+        crosswalk = geo_mapper.add_geocode(
+            pd.DataFrame({from_code: self.geo_ids, "_row": np.arange(len(self.geo_ids))}),
+            from_code, new_code)
+        new_codes, new_ids = pd.factorize(crosswalk[new_code], sort=True)
+        rows = crosswalk["_row"].to_numpy()
+        weights = crosswalk["weight"].to_numpy(dtype=float)[:, None] \
+            if "weight" in crosswalk.columns else 1
+
+        present = _present(self.shape, self.fields.values())
+        counts = np.zeros((len(new_ids), len(self.dates)))
+        np.add.at(counts, new_codes, present[rows])
+
+        arrays = {}
+        for field in fields:
+            aggregated = np.zeros((len(new_ids), len(self.dates)))
+            np.add.at(aggregated, new_codes, np.nan_to_num(self.fields[field][rows]) * weights)
+            aggregated[counts == 0] = np.nan
+            arrays[field] = aggregated
+        return SignalPanel(np.asarray(new_ids), self.dates, arrays)
+
+    def smooth(self,
+               smoother,
+               field: str = "val",
+               out_field: Optional[str] = None,
+               impute_order: int = 2) -> "SignalPanel":
+        """Smooth a field of every location along time with `Smoother.smooth_batch`.
+
+        Parameters
+        ----------
+        smoother: Smoother
+            Smoother to apply.
+        field: str
+            Field to smooth.
+        out_field: Optional[str]
+            Field in which to store the smoothed values; by default, field is replaced.
+        impute_order: int
+            The polynomial order of the fit used for imputation.
+
+        Returns
+        ---------
+        panel: SignalPanel
+            A panel with the smoothed field, sharing all other arrays with this panel.
+        """
+        smoothed = smoother.smooth_batch(self.fields[field], impute_order=impute_order)
+        return self.with_fields(**{field if out_field is None else out_field: smoothed})
+
+    def export_csv(self,
+                   export_dir: str,
+                   geo_res: str,
+                   sensor: str,
+                   metric: Optional[str] = None,
+                   start_date: Optional[datetime] = None,
+                   end_date: Optional[datetime] = None,
+                   remove_null_samples: Optional[bool] = False,
+                   write_empty_days: Optional[bool] = False):
+        """Export the val, se and sample_size fields in the format expected by the Delphi API.
+
+        Writes the same files as `create_export_csv` on `to_frame()`, taking the rows of each
+        date straight from the columns of the arrays. Missing se and sample_size fields are
+        written as NA. See `create_export_csv` for the parameters.
+
+        Returns
+        ---------
+        dates: pd.Series[datetime]
+            Series of dates for which CSV files were exported.
+        """
+        if "val" not in self.fields:
+            raise ValueError("The panel has no val field to export.")
+        missing = np.full(self.shape, np.nan)
+        columns = {field: self.fields.get(field, missing) for field in EXPORT_FIELDS}
+        present = _present(self.shape, columns.values())
+        data_dates = self.dates[present.any(axis=0)]
+
+        if start_date is None:
+            start_date = data_dates.min()
+        if end_date is None:
+            end_date = data_dates.max()
+        if not write_empty_days:
+            dates = pd.Series(
+                data_dates[(data_dates >= start_date) & (data_dates <= end_date)]
+            ).sort_values()
+        else:
+            dates = pd.date_range(start_date, end_date)
+
+        def export_frames():
+            for date in dates:
+                column = self.dates.get_loc(date) if date in self.dates else None
+                rows = present[:, column] if column is not None \
+                    else np.zeros(len(self.geo_ids), dtype=bool)
+                yield date, pd.DataFrame({
+                    "geo_id": self.geo_ids[rows],
+                    **{field: values[rows, column] if column is not None else np.array([])
+                       for field, values in columns.items()}
+                })
+
+        write_export_frames(export_frames(), export_dir, geo_res, sensor, metric,
+                            remove_null_samples)
+        return dates
@@ -1,10 +1,19 @@
 """Indicator running utilities."""
 import argparse as ap
+from contextlib import contextmanager
+from glob import glob
 import importlib
-from typing import Any, Callable, Dict, Optional
+import os
+from os.path import abspath, basename, join
+import queue
+import threading
+from typing import Any, Callable, Dict, List, Optional
 from .archive import ArchiveDiffer, archiver_from_params
+from .export import export_listener
+from .instrumentation import PipelineProfiler
 from .logger import get_structured_logger
 from .utils import read_params
+from .validator.report import ValidationReport
 from .validator.validate import Validator
 from .validator.run import validator_from_params
 
@@ -13,6 +22,160 @@ Params = Dict[str, Any]
 # Trivial function to use as default value for validator and archive functions.
 NULL_FN = lambda x: None
 
+
+class ExportPipeline:  # pylint: disable=too-many-instance-attributes
+    """Diff and validate exported files while the indicator is still running.
+
+    While `running()`, every batch of files written by `create_export_csv` is queued and
+    processed on a worker thread: it is diffed against the archive, if there is an archiver, and
+    its files are run through the per-file static checks, if there is a validator.  `finish()`
+    is the barrier after the indicator returns.  It processes files that were never published,
+    e.g. because they were written by another process, and runs the checks that need all files.
+    Nothing is archived here, so the caller can archive only if validation succeeds.
+    """
+
+    def __init__(self, export_dir: str, validator: Optional[Validator] = None,
+                 archiver: Optional[ArchiveDiffer] = None, incremental: bool = False):
+        """Initialize an ExportPipeline.
+
+        Parameters
+        ----------
+        export_dir: str
+            directory to which the indicator exports files
+        validator: Optional[Validator]
+            validator of the exported files, or None to skip validation
+        archiver: Optional[ArchiveDiffer]
+            archiver whose cache has been updated, or None to skip diffing
+        incremental: bool
+            whether to only validate new and changed files, as in incremental validation
+        """
+        self.export_dir = abspath(export_dir)
+        self.validator = validator
+        self.archiver = archiver
+        self.incremental = incremental and archiver is not None
+        self.report = ValidationReport(validator.suppressed_errors) if validator else None
+        self._queue: queue.Queue = queue.Queue()
+        self._processed: Dict[str, Any] = {}
+        self._republished = False
+        self._error: Optional[Exception] = None
+        self._batch_frames: List[Any] = []
+        self._changes: Any = ([], {}, [])
+        self._diff_files: List[str] = []
+
+    def publish(self, export_dir: str, filenames: List[str]):
+        """Queue a batch of files exported to `export_dir` for processing."""
+        if abspath(export_dir) == self.export_dir:
+            self._queue.put(list(filenames))
+
+    @contextmanager
+    def running(self):
+        """Process batches of exported files in the background while in this context."""
+        worker = threading.Thread(target=self._work, daemon=True)
+        worker.start()
+        try:
+            with export_listener(self.publish):
+                yield self
+        finally:
+            self._queue.put(None)
+            worker.join()
+
+    def _work(self):
+        while True:
+            filenames = self._queue.get()
+            if filenames is None:
+                return
+            if self._error is not None:
+                continue
+            try:
+                self._process(filenames)
+            except Exception as e:  # pylint: disable=broad-except
+                self._error = e
+
+    def _process(self, filenames):
+        if any(f in self._processed for f in filenames):
+            self._republished = True
+            return
+        for filename in filenames:
+            stat = os.stat(join(self.export_dir, filename))
+            self._processed[filename] = (stat.st_mtime_ns, stat.st_size)
+
+        changes = None
+        if self.archiver:
+            deleted_files, common_diffs, new_files = self.archiver.diff_exports(filenames)
+            changes = (deleted_files, common_diffs, new_files)
+            self._diff_files += [diff for diff in common_diffs.values() if diff is not None]
+            self._changes = (deleted_files, {**self._changes[1], **common_diffs},
+                             self._changes[2] + new_files)
+        if self.validator and filenames:
+            self._batch_frames.append(self.validator.validate_batch(
+                filenames, self.report, changes if self.incremental else None))
+
+    def _unchanged_since_processed(self):
+        for filename, stat in self._processed.items():
+            path = join(self.export_dir, filename)
+            if not os.path.exists(path):
+                return False
+            current = os.stat(path)
+            if (current.st_mtime_ns, current.st_size) != stat:
+                return False
+        return True
+
+    def discard_diffs(self):
+        """Delete the diff files written to the export directory while processing batches.
+
+        Used when the pipelined results are discarded, as a file diffed here and later
+        re-written identically to the archive would otherwise keep its stale diff.
+        """
+        for diff_file in self._diff_files:
+            if os.path.exists(diff_file):
+                os.remove(diff_file)
+        self._diff_files = []
+
+    def finish(self):
+        """Complete diffing and validation once the indicator has written all files.
+
+        Returns
+        -------
+        (report, changes): Tuple[Optional[ValidationReport], Optional[changes]]
+            the validation report, or None without a validator, and the change set of all
+            exports as returned by `ArchiveDiffer.diff_exports()`, or None without an archiver.
+            Returns None instead if files were re-written after being processed, in which case
+            the pipelined results must be discarded.
+        """
+        if self._error is not None:
+            raise self._error
+        if self._republished or not self._unchanged_since_processed():
+            return None
+
+        exported = {basename(f) for f in glob(join(self.export_dir, "*.csv"))}
+        self._process(sorted(exported - set(self._processed)))
+
+        changes = self._changes if self.archiver else None
+        if self.validator:
+            self.validator.finish_batches(self._batch_frames, self.report,
+                                          changes if self.incremental else None)
+        return self.report, changes
+
+def _validate_exports(validator, archiver, incremental, cache_updated, profiler):
+    """Validate all exports once the indicator has run, diffing them first if incremental.
+
+    Returns the validation report, or None without a validator, and the change set of the
+    exports, or None if they were not diffed.
+    """
+    if not validator:
+        return None, None
+    if archiver and incremental:
+        # Diff against the archive first so that only new and changed files are validated.
+        with profiler.stage("archive_diff"):
+            if not cache_updated:
+                archiver.update_cache()
+            changes = archiver.diff_exports()
+        with profiler.stage("validation"):
+            return validator.validate(changes), changes
+    with profiler.stage("validation"):
+        return validator.validate(), None
+
+
 def run_indicator_pipeline(indicator_fn:  Callable[[Params], None],
                            validator_fn:  Callable[[Params], Optional[Validator]] = NULL_FN,
                            archiver_fn:  Callable[[Params], Optional[ArchiveDiffer]] = NULL_FN):
@@ -24,6 +187,22 @@ def run_indicator_pipeline(indicator_fn:  Callable[[Params], None],
     used in `indicator_fn`, `validator_fn`, `archiver_fn`, and shared across functions,
     respectively.
 
+    If both a validator and an archiver are used and the "validation" parameters set
+    `"incremental": true` in their "common" subdictionary, the exports are diffed against the
+    archive before validation, only new and changed files are validated, and the same diff is
+    then archived.
+
+    If the "common" subdictionary sets `"pipelined": true`, the validator and archiver are
+    created before the indicator runs, and each batch of files written by `create_export_csv` is
+    diffed and statically validated while the indicator computes later signals (see
+    `ExportPipeline`).  The remaining checks run once the indicator returns, and files are only
+    archived if all checks pass.
+
+    The wall time, CPU time, peak memory, and files written of each stage are logged when the run
+    finishes, along with any sub-stages that the indicator records with
+    `delphi_utils.profile_stage`.  If the "common" subdictionary sets "profile_dir", the same
+    profile is also written there as a JSON file.
+
     Arguments
     ---------
     indicator_fn: Callable[[Params], None]
@@ -34,17 +213,80 @@ def run_indicator_pipeline(indicator_fn:  Callable[[Params], None],
     archiver_fn: Callable[[Params], Optional[ArchiveDiffer]]
         function that takes a dictionary of parameters and produces the associated ArchiveDiffer or
         None if no archiving should be performed.
+
+    Returns
+    -------
+    PipelineProfiler
+        profile of the stages of the run
     """
     params = read_params()
-    indicator_fn(params)
-    validator = validator_fn(params)
-    archiver = archiver_fn(params)
-    if validator:
-        validation_report = validator.validate()
-        validation_report.log(get_structured_logger(params["common"].get("log_filename", None)))
+    logger = get_structured_logger(__name__, params["common"].get("log_filename", None))
+    profiler = PipelineProfiler([params["common"].get("export_dir"),
+                                 params.get("archive", {}).get("cache_dir")])
+    incremental = params.get("validation", {}).get("common", {}).get("incremental", False)
+
+    pipelined = params["common"].get("pipelined", False)
+    if pipelined:
+        validator = validator_fn(params)
+        archiver = archiver_fn(params)
+        if archiver:
+            archiver.update_cache()
+        pipeline = ExportPipeline(params["common"]["export_dir"], validator, archiver,
+                                  incremental)
+        with profiler.stage("indicator"), pipeline.running():
+            indicator_fn(params)
+        with profiler.stage("validation"):
+            pipelined_results = pipeline.finish()
+        if pipelined_results is None:
+            logger.warning("Exports were re-written after they were validated; "
+                           "validating all exports again")
+            pipeline.discard_diffs()
+    else:
+        with profiler.stage("indicator"):
+            indicator_fn(params)
+        validator = validator_fn(params)
+        archiver = archiver_fn(params)
+        pipelined_results = None
+
+    if pipelined_results is not None:
+        validation_report, changes = pipelined_results
+    else:
+        validation_report, changes = _validate_exports(validator, archiver, incremental,
+                                                       pipelined, profiler)
+    if validation_report:
+        validation_report.log(logger)
+    # Barrier: nothing is archived unless all exports passed validation.
     if archiver and (not validator or validation_report.success()):
-        archiver.archive()
+        with profiler.stage("archive"):
+            if changes is None and pipelined:
+                # The cache was updated before the indicator ran.
+                changes = archiver.diff_exports()
+            archiver.run(changes)
+
+    profiler.log(logger)
+    if params["common"].get("profile_dir"):
+        profiler.write_json(params["common"]["profile_dir"])
+    return profiler
+
+
+def run_indicator_module(indicator_name: str) -> PipelineProfiler:
+    """Run the indicator pipeline of a package with validation and archiving from its params.
 
+    Arguments
+    ---------
+    indicator_name: str
+        name of the Python package containing the indicator, which must export a
+        `run.run_module(params)` function.  Parameters are read from the current directory.
+
+    Returns
+    -------
+    PipelineProfiler
+        profile of the stages of the run
+    """
+    indicator_module = importlib.import_module(indicator_name)
+    return run_indicator_pipeline(indicator_module.run.run_module,
+                                  validator_from_params,
+                                  archiver_from_params)
 
 if __name__ == "__main__":
     parser = ap.ArgumentParser()
@@ -53,7 +295,4 @@ if __name__ == "__main__":
                         help="Name of the Python package containing the indicator.  This package "
                              "must export a `run.run_module(params)` function.")
     args = parser.parse_args()
-    indicator_module = importlib.import_module(args.indicator_name)
-    run_indicator_pipeline(indicator_module.run.run_module,
-                           validator_from_params,
-                           archiver_from_params)
+    run_indicator_module(args.indicator_name)
@@ -0,0 +1,209 @@
+"""Bounded, rate-limited scheduling of calls to remote APIs.
+
+`FetchScheduler` runs a fetch function over many keys on a fixed number of worker threads,
+spacing requests with a `TokenBucket`, retrying failures with exponential backoff, and yielding
+each result as soon as it is available, e.g.
+
+    scheduler = FetchScheduler(fetch_one, max_in_flight=8, rate_limiter=TokenBucket(10, 10))
+    for key, result in scheduler.imap_unordered(keys, return_exceptions=True):
+        ...
+
+At most `max_in_flight` requests are pending or completed-but-unconsumed at any time, so a slow
+consumer also bounds the memory held by downloaded results.
+"""
+
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Hashable, Iterable, Iterator, Optional, Tuple, Type
+
+
+class TokenBucket:
+    """Thread-safe token-bucket rate limiter.
+
+    Tokens are added continuously at `rate` per second up to `capacity`; each request takes one
+    token, waiting for it if the bucket is empty.  A full bucket allows a burst of `capacity`
+    requests.
+    """
+
+    def __init__(self, rate: float, capacity: float = 1,
+                 clock: Optional[Callable[[], float]] = None,
+                 sleep: Optional[Callable[[float], Any]] = None):
+        """Initialize a full bucket.
+
+        Parameters
+        ----------
+        rate: float
+            number of tokens added per second
+        capacity: float
+            maximum number of tokens held by the bucket
+        clock: Optional[Callable[[], float]]
+            monotonic clock returning seconds, defaults to `time.monotonic`
+        sleep: Optional[Callable[[float], Any]]
+            function used to wait for tokens, defaults to `time.sleep`
+        """
+        if rate <= 0:
+            raise ValueError("rate must be positive")
+        if capacity < 1:
+            raise ValueError("capacity must be at least 1")
+        self.rate = rate
+        self.capacity = capacity
+        self._clock = clock or time.monotonic
+        self._sleep = sleep or time.sleep
+        self._tokens = capacity
+        self._updated = self._clock()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def try_acquire(self) -> bool:
+        """Take a token if one is available, without waiting.
+
+        Returns
+        -------
+        Whether a token was taken.
+        """
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+    def acquire(self):
+        """Take a token, waiting until it would have been available.
+
+        The token is reserved immediately, so concurrent callers are queued in order of arrival
+        rather than competing for each new token.
+        """
+        with self._lock:
+            self._refill()
+            self._tokens -= 1
+            wait_time = -self._tokens / self.rate
+        if wait_time > 0:
+            self._sleep(wait_time)
+
+
+class FetchScheduler:  # pylint: disable=too-many-instance-attributes
+    """Run a fetch function over many keys with bounded concurrency, rate limits and retries."""
+
+    def __init__(self,
+                 fetch_fn: Callable[[Any], Any],
+                 max_in_flight: int = 8,
+                 rate_limiter: Optional[TokenBucket] = None,
+                 max_retries: int = 3,
+                 backoff_base: float = 1.0,
+                 backoff_max: float = 60.0,
+                 retry_on: Tuple[Type[BaseException], ...] = (Exception,),
+                 sleep: Optional[Callable[[float], Any]] = None):
+        """Initialize the scheduler.
+
+        Parameters
+        ----------
+        fetch_fn: Callable[[Any], Any]
+            function fetching the result for a single key
+        max_in_flight: int
+            maximum number of keys being fetched or waiting to be consumed at once
+        rate_limiter: Optional[TokenBucket]
+            limiter from which every attempt, including retries, takes a token
+        max_retries: int
+            number of times a failed fetch is retried before its error is reported
+        backoff_base: float
+            wait in seconds before the first retry; doubled for every further retry
+        backoff_max: float
+            maximum wait in seconds between retries
+        retry_on: Tuple[Type[BaseException], ...]
+            exception types that are retried; other exceptions are reported immediately
+        sleep: Optional[Callable[[float], Any]]
+            function used to wait between retries, defaults to `time.sleep`
+        """
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        self.fetch_fn = fetch_fn
+        self.max_in_flight = max_in_flight
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.retry_on = retry_on
+        self._sleep = sleep or time.sleep
+
+    def backoff(self, attempt: int) -> float:
+        """Return the wait in seconds before retrying after failed attempt number `attempt`."""
+        return min(self.backoff_max, self.backoff_base * 2 ** attempt)
+
+    def fetch(self, key):
+        """Fetch a single key, retrying failures with exponential backoff."""
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            try:
+                return self.fetch_fn(key)
+            except self.retry_on:
+                if attempt >= self.max_retries:
+                    raise
+                self._sleep(self.backoff(attempt))
+                attempt += 1
+
+    def imap_unordered(self, keys: Iterable[Hashable],
+                       return_exceptions: bool = False) -> Iterator[Tuple[Hashable, Any]]:
+        """Fetch all keys, yielding `(key, result)` pairs in order of completion.
+
+        Keys are only submitted when a slot is free, so the iterable may be lazy.  Closing the
+        iterator early cancels all fetches that have not started yet.
+
+        Parameters
+        ----------
+        keys: Iterable[Hashable]
+            keys to pass to the fetch function
+        return_exceptions: bool
+            yield the final exception of a failed fetch as its result instead of raising it
+
+        Returns
+        -------
+        Iterator over `(key, result)` pairs.
+        """
+        keys = iter(keys)
+        pending = {}
+        executor = ThreadPoolExecutor(max_workers=self.max_in_flight)
+        try:
+            for key in keys:
+                pending[executor.submit(self.fetch, key)] = key
+                if len(pending) == self.max_in_flight:
+                    break
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    key = pending.pop(future)
+                    error = future.exception()
+                    if error is not None and not return_exceptions:
+                        raise error
+                    yield key, future.result() if error is None else error
+                    # Refill the freed slot only once the consumer asks for more.
+                    for next_key in keys:
+                        pending[executor.submit(self.fetch, next_key)] = next_key
+                        break
+        finally:
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=True)
+
+    def map(self, keys: Iterable[Hashable], return_exceptions: bool = False) -> dict:
+        """Fetch all keys and collect the results in a dict keyed by key.
+
+        Parameters
+        ----------
+        keys: Iterable[Hashable]
+            keys to pass to the fetch function
+        return_exceptions: bool
+            store the final exception of a failed fetch as its result instead of raising it
+
+        Returns
+        -------
+        Dict mapping each key to its result.
+        """
+        return dict(self.imap_unordered(keys, return_exceptions))
@@ -209,6 +209,80 @@ class Smoother:  # pylint: disable=too-many-instance-attributes
             signal_smoothed.index = pandas_index
         return signal_smoothed
 
+    def smooth_batch(self, signals: np.ndarray, impute_order=2) -> np.ndarray:
+        """Apply a smoother to every row of a 2D array of signals.
+
+        The result is the same as calling `smooth` on each row. Rows without nans are smoothed
+        together in a single vectorized pass for the 'savgol', 'moving_average' and 'identity'
+        smoothers; all other rows are smoothed one at a time.
+
+        Parameters
+        ----------
+        signals: np.ndarray
+            A 2D array with one signal per row, on the same regularly-spaced time grid.
+        impute_order: int
+            The polynomial order of the fit used for imputation. By default, this is set to
+            2.
+
+        Returns
+        ----------
+        signals_smoothed: np.ndarray
+            A 2D float array of the same shape as signals, with the smoothed signals.
+        """
+        signals = np.asarray(signals, dtype=float)
+        if signals.ndim != 2:
+            raise ValueError("The signals should be a 2D array.")
+        if self.impute_method == "savgol" and impute_order > self.window_length:
+            raise ValueError("Impute order must be smaller than window length.")
+
+        signals_smoothed = np.empty_like(signals)
+        n_dates = signals.shape[1]
+        if self.smoother_name in {"savgol", "moving_average", "identity"} and \
+                n_dates > 1 and n_dates >= self.poly_fit_degree:
+            # Without nans there is nothing to impute or truncate.
+            batched = ~np.isnan(signals).any(axis=1)
+        else:
+            batched = np.zeros(len(signals), dtype=bool)
+        if batched.any():
+            signals_smoothed[batched] = self._batch_smoother(signals[batched])
+        for row in np.where(~batched)[0]:
+            signals_smoothed[row] = self.smooth(signals[row], impute_order=impute_order)
+        return signals_smoothed
+
+    def _batch_smoother(self, signals):
+        """Smooth every row of a 2D array of signals without nans."""
+        window_length = self.window_length
+        n_dates = signals.shape[1]
+        if self.smoother_name == "identity":
+            return signals.copy()
+
+        if self.smoother_name == "moving_average":
+            if not isinstance(window_length, int):
+                raise ValueError("k must be int.")
+            signals_smoothed = np.full(signals.shape, np.nan)
+            if n_dates >= window_length:
+                windows = np.lib.stride_tricks.sliding_window_view(signals, window_length, axis=1)
+                signals_smoothed[:, window_length - 1:] = windows.sum(axis=2) / window_length
+            return signals_smoothed
+
+        # savgol, as in savgol_smoother with each window a row of a strided view
+        signals_smoothed = np.full(signals.shape, np.nan)
+        if n_dates >= len(self.coeffs):
+            windows = np.lib.stride_tricks.sliding_window_view(signals, len(self.coeffs), axis=1)
+            signals_smoothed[:, len(self.coeffs) - 1:] = windows @ self.coeffs
+        if self.boundary_method == "nan":
+            return signals_smoothed
+        for ix in range(min(len(self.coeffs), n_dates)):
+            if ix == 0 or self.boundary_method == "identity":
+                signals_smoothed[:, ix] = signals[:, ix]
+            else:
+                try:
+                    coeffs = self.savgol_coeffs(-ix, 0, self.poly_fit_degree)
+                    signals_smoothed[:, ix] = signals[:, : ix + 1] @ coeffs
+                except np.linalg.LinAlgError:  # for small ix, the design matrix is singular
+                    signals_smoothed[:, ix] = signals[:, ix]
+        return signals_smoothed
+
     def _select_smoother(self):
         """Select a smoothing method based on the smoother type."""
         if self.smoother_name == "savgol":
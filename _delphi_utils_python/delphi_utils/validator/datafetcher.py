@@ -2,19 +2,26 @@
 """Functions to get CSV filenames and data."""
 
 import re
-import threading
+from concurrent.futures import ThreadPoolExecutor
 from os import listdir
 from os.path import isfile, join
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 import warnings
 import pandas as pd
+from pandas.api.types import union_categoricals
 import numpy as np
 
 import covidcast
 from .errors import APIDataFetchError, ValidationFailure
+from ..scheduler import FetchScheduler, TokenBucket
 
 FILENAME_REGEX = re.compile(
     r'^(?P<date>\d{8})_(?P<geo_type>\w+?)_(?P<signal>\w+)\.csv$')
 
+REFERENCE_COLUMNS = ["geo_id", "val", "se", "sample_size", "time_value"]
+
+ReferenceFrames = Dict[Tuple[str, str], Union[pd.DataFrame, ValidationFailure]]
+
 
 def make_date_filter(start_date, end_date):
     """
@@ -55,24 +62,140 @@ def make_date_filter(start_date, end_date):
     return custom_date_filter
 
 
-def load_all_files(export_dir, start_date, end_date):
-    """Load all files in a directory.
+def load_all_files(export_dir, start_date, end_date, n_threads=8):
+    """Load all files in a directory within a date range into a single frame.
 
     Parameters
     ----------
     export_dir: str
         directory from which to load files
+    start_date: date
+        earliest date (inclusive) of files to load
+    end_date: date
+        latest date (inclusive) of files to load
+    n_threads: int
+        maximum number of files to read concurrently
 
     Returns
     -------
-    loaded_data: List[Tuple(str, re.match, pd.DataFrame)]
-        triples of filenames, filename matches with the geo regex, and the data from the file
+    all_frames: pd.DataFrame
+        concatenated data from all files, with additional categorical `filename`, `geo_type`, and
+        `signal` columns and a `time_value` column derived from each file's name.  Every loaded
+        file is a category of `filename`, even if it contains no rows.
     """
     export_files = read_filenames(export_dir)
     date_filter = make_date_filter(start_date, end_date)
 
-    # Make list of tuples of CSV names and regex match objects.
-    return [(f, m, load_csv(join(export_dir, f))) for (f, m) in export_files if date_filter(m)]
+    return load_files_frame(export_dir,
+                            [(f, m) for (f, m) in export_files if date_filter(m)],
+                            n_threads=n_threads)
+
+
+def load_files_frame(directory, files, n_threads=8, as_timestamps=False):
+    """Read many export CSVs concurrently into one frame indexed by the fields of their names.
+
+    Each file is read into plain column arrays on a bounded thread pool; the arrays are
+    concatenated once at the end, and the per-file `filename`, `geo_type`, `signal` and
+    `time_value` fields are expanded to per-row columns from the regex matches without
+    touching the per-file data again.
+
+    Parameters
+    ----------
+    directory: str
+        directory containing the files
+    files: List[Tuple(str, re.match)]
+        pairs of filenames and their matches with FILENAME_REGEX
+    n_threads: int
+        maximum number of files to read concurrently
+    as_timestamps: bool
+        whether `time_value` should hold datetime64 values (as in API data) instead of
+        datetime.date objects (as in source data)
+
+    Returns
+    -------
+    pd.DataFrame with the columns of the CSVs plus `filename`, `geo_type`, `signal` and
+    `time_value`
+    """
+    def read_columns(filename):
+        df = load_csv(join(directory, filename))
+        return {col: df[col].to_numpy() for col in df.columns}, len(df)
+
+    with ThreadPoolExecutor(max_workers=max(1, n_threads)) as executor:
+        loaded = list(executor.map(read_columns, [f for f, _ in files]))
+
+    lengths = np.array([n_rows for _, n_rows in loaded], dtype=np.int64)
+    columns = {}
+    for file_columns, _ in loaded:
+        for col in file_columns:
+            columns.setdefault(col, None)
+    for col in REFERENCE_COLUMNS[:-1]:
+        columns.setdefault(col, None)
+
+    data = {}
+    for col in columns:
+        pieces = [file_columns[col] if col in file_columns
+                  else np.full(n_rows, np.nan, dtype=object if col == "geo_id" else float)
+                  for file_columns, n_rows in loaded]
+        data[col] = np.concatenate(pieces) if pieces else \
+            np.array([], dtype=object if col == "geo_id" else float)
+    del loaded
+    df = pd.DataFrame(data)
+
+    # Expand per-file fields to per-row columns in one step rather than once per file.
+    file_index = np.repeat(np.arange(len(files)), lengths)
+    fields = pd.DataFrame([m.groupdict() for _, m in files],
+                          columns=["date", "geo_type", "signal"])
+    df["filename"] = pd.Categorical.from_codes(file_index, [f for f, _ in files])
+    for col in ["geo_type", "signal"]:
+        categories = pd.Categorical(fields[col])
+        df[col] = pd.Categorical.from_codes(categories.codes[file_index], categories.categories)
+    file_dates = pd.to_datetime(fields["date"], format="%Y%m%d")
+    if as_timestamps:
+        df["time_value"] = file_dates.to_numpy()[file_index]
+    else:
+        df["time_value"] = file_dates.dt.date.to_numpy()[file_index]
+    return df
+
+
+def concat_files_frames(frames):
+    """Concatenate frames produced by `load_files_frame` from different sets of files.
+
+    Parameters
+    ----------
+    frames: List[pd.DataFrame]
+        frames to combine
+
+    Returns
+    -------
+    pd.DataFrame with the rows of all frames, whose `filename`, `geo_type` and `signal` columns
+    remain categorical with the union of the categories of all frames
+    """
+    if not frames:
+        return load_files_frame("", [])
+    categorical = ["filename", "geo_type", "signal"]
+    combined = pd.concat([df.drop(columns=categorical) for df in frames], ignore_index=True)
+    for col in categorical:
+        combined[col] = union_categoricals([df[col] for df in frames])
+    return combined[frames[0].columns]
+
+
+def split_files(all_frames):
+    """Split a frame produced by `load_all_files` back into per-file data sets.
+
+    Parameters
+    ----------
+    all_frames: pd.DataFrame
+        concatenated data with a categorical `filename` column
+
+    Returns
+    -------
+    loaded_data: List[Tuple(str, re.match, pd.DataFrame)]
+        triples of filenames, filename matches with the geo regex, and the data from the file
+    """
+    data_columns = [col for col in all_frames.columns
+                    if col not in ("filename", "geo_type", "signal", "time_value")]
+    return [(f, FILENAME_REGEX.match(f), df[data_columns].reset_index(drop=True))
+            for f, df in all_frames.groupby("filename", sort=False, observed=False)]
 
 
 def read_filenames(path):
@@ -154,59 +277,254 @@ def fetch_api_reference(data_source, start_date, end_date, geo_type, signal_type
     return api_df
 
 
-def get_one_api_df(data_source, min_date, max_date,
-                    geo_type, signal_type,
-                    api_semaphore, dict_lock, output_dict):
+def stream_api_calls(data_source, min_date, max_date, geo_signal_combos, n_threads=32,
+                     rate_limiter=None, max_retries=3):
     """
-    Pull API data for a single geo type-signal combination.
+    Get data from API for all geo-signal combinations, yielding each as soon as it arrives.
+
+    Requests are run on at most `n_threads` threads, optionally spaced by `rate_limiter`, and
+    failed requests are retried with exponential backoff.  Combinations whose data could not be
+    retrieved yield a ValidationFailure instead of a data frame.
 
-    Raises error if data couldn't be retrieved. Saves data to data dict.
+    Arguments:
+        - data_source: str, name of the data source as used in COVIDcast API calls
+        - min_date: date, earliest date of data to fetch
+        - max_date: date, latest date of data to fetch
+        - geo_signal_combos: list of (geo_type, signal) tuples to fetch
+        - n_threads: int, maximum number of requests in flight at once
+        - rate_limiter: Optional[TokenBucket], limiter applied to every request
+        - max_retries: int, number of times a failed request is retried
+
+    Returns:
+        - iterator over ((geo_type, signal), pd.DataFrame or ValidationFailure) pairs
+    """
+    if n_threads > 32:
+        n_threads = 32
+        print("Warning: Don't run more than 32 threads at once due "
+                + "to API resource limitations")
+
+    def fetch_one(geo_signal_combo):
+        geo_type, signal_type = geo_signal_combo
+        return fetch_api_reference(data_source, min_date, max_date, geo_type, signal_type)
+
+    scheduler = FetchScheduler(fetch_one, max_in_flight=n_threads, rate_limiter=rate_limiter,
+                               max_retries=max_retries, retry_on=(APIDataFetchError, OSError))
+    for (geo_type, signal_type), geo_sig_api_df_or_error in scheduler.imap_unordered(
+            geo_signal_combos, return_exceptions=True):
+        if isinstance(geo_sig_api_df_or_error, (APIDataFetchError, OSError)):
+            geo_sig_api_df_or_error = ValidationFailure(
+                "api_data_fetch_error",
+                geo_type=geo_type,
+                signal=signal_type,
+                message=getattr(geo_sig_api_df_or_error, "custom_msg",
+                                str(geo_sig_api_df_or_error)))
+        elif isinstance(geo_sig_api_df_or_error, Exception):
+            raise geo_sig_api_df_or_error
+        yield (geo_type, signal_type), geo_sig_api_df_or_error
+
+
+def threaded_api_calls(data_source, min_date, max_date, geo_signal_combos, n_threads=32,
+                       rate_limiter=None, max_retries=3):
+    """Get data from API for all geo-signal combinations in a threaded way.
+
+    See `stream_api_calls` for the arguments.  Returns a dict mapping each (geo_type, signal)
+    tuple to its data frame or ValidationFailure.
     """
-    api_semaphore.acquire()
+    return dict(stream_api_calls(data_source, min_date, max_date, geo_signal_combos, n_threads,
+                                 rate_limiter, max_retries))
 
-    # Pull reference data from API for all dates.
-    try:
-        geo_sig_api_df_or_error = fetch_api_reference(
-            data_source, min_date, max_date, geo_type, signal_type)
 
-    except APIDataFetchError as e:
-        geo_sig_api_df_or_error = ValidationFailure("api_data_fetch_error",
-                                                    geo_type=geo_type,
-                                                    signal=signal_type,
-                                                    message=e.custom_msg)
+class ReferenceProvider:
+    """Base class for sources of reference data used by the dynamic checks.
 
-    api_semaphore.release()
+    A reference provider answers the question "what data was already published?" for every
+    geo type-signal combination of a data source.  Reference frames are formatted like the
+    output of `fetch_api_reference`.
+    """
 
-    # Use a lock so only one thread can access the dictionary.
-    dict_lock.acquire()
-    output_dict[(geo_type, signal_type)] = geo_sig_api_df_or_error
-    dict_lock.release()
+    def get_geo_signal_combos(self) -> List[Tuple[str, str]]:
+        """Get list of geo type-signal type combinations that we expect to see.
 
+        To be implemented by specific providers.
+        """
+        raise NotImplementedError
+
+    def get_reference_frames(self, start_date, end_date,
+                             geo_signal_combos) -> ReferenceFrames:
+        """Get reference data for each geo type-signal combination between two dates.
+
+        To be implemented by specific providers.
+
+        Parameters
+        ----------
+        start_date: date
+            earliest date (inclusive) of reference data to return
+        end_date: date
+            latest date (inclusive) of reference data to return
+        geo_signal_combos: List[Tuple[str, str]]
+            geo type-signal combinations for which to return reference data
+
+        Returns
+        -------
+        Dict mapping each (geo_type, signal) pair to either a reference pd.DataFrame or a
+        ValidationFailure describing why the data could not be retrieved.
+        """
+        raise NotImplementedError
 
-def threaded_api_calls(data_source, min_date, max_date, geo_signal_combos, n_threads=32):
-    """Get data from API for all geo-signal combinations in a threaded way."""
-    if n_threads > 32:
-        n_threads = 32
-        print("Warning: Don't run more than 32 threads at once due "
-                + "to API resource limitations")
+    def iter_reference_frames(self, start_date, end_date,
+                              geo_signal_combos) -> Iterator[Tuple[Tuple[str, str], Any]]:
+        """Get reference data for each geo type-signal combination as it becomes available.
 
-    output_dict = dict()
-    dict_lock = threading.Lock()
-    api_semaphore = threading.Semaphore(value=n_threads)
+        Providers that fetch combinations independently should override this to yield each
+        combination as soon as it is ready.  See `get_reference_frames` for the parameters.
 
-    thread_objs = [threading.Thread(
-        target=get_one_api_df, args=(data_source, min_date, max_date,
-                                     geo_type, signal_type,
-                                     api_semaphore,
-                                     dict_lock, output_dict)
-    ) for geo_type, signal_type in geo_signal_combos]
+        Returns
+        -------
+        Iterator over ((geo_type, signal), reference pd.DataFrame or ValidationFailure) pairs,
+        in no particular order.
+        """
+        yield from self.get_reference_frames(start_date, end_date, geo_signal_combos).items()
+
+
+class APIReferenceProvider(ReferenceProvider):
+    """Reference provider backed by the COVIDcast API."""
+
+    def __init__(self, data_source: str, n_threads: int = 32,
+                 rate_limiter: Optional[TokenBucket] = None, max_retries: int = 3):
+        """Initialize an APIReferenceProvider.
+
+        Parameters
+        ----------
+        data_source: str
+            name of the data source as used in COVIDcast API calls
+        n_threads: int
+            maximum number of API requests in flight at once
+        rate_limiter: Optional[TokenBucket]
+            limiter applied to every API request, or None to send requests as fast as possible
+        max_retries: int
+            number of times a failed API request is retried
+        """
+        self.data_source = data_source
+        self.n_threads = n_threads
+        self.rate_limiter = rate_limiter
+        self.max_retries = max_retries
+
+    def get_geo_signal_combos(self):
+        """Get the geo type-signal combinations listed in the COVIDcast metadata."""
+        return get_geo_signal_combos(self.data_source)
+
+    def get_reference_frames(self, start_date, end_date, geo_signal_combos):
+        """Fetch reference data for all combinations from the COVIDcast API."""
+        return threaded_api_calls(self.data_source, start_date, end_date, geo_signal_combos,
+                                  self.n_threads, self.rate_limiter, self.max_retries)
+
+    def iter_reference_frames(self, start_date, end_date, geo_signal_combos):
+        """Fetch reference data from the COVIDcast API, yielding each combination on arrival."""
+        return stream_api_calls(self.data_source, start_date, end_date, geo_signal_combos,
+                                self.n_threads, self.rate_limiter, self.max_retries)
+
+
+class ArchiveReferenceProvider(ReferenceProvider):
+    """Reference provider backed by the archiver's local cache of published CSVs.
+
+    The archiver's `cache_dir` holds the last-published version of every export file, which is
+    what the API would return for those dates.  All cached files in the requested date range are
+    read in a single pass and partitioned by geo type and signal, so no network access is needed.
+    """
+
+    def __init__(self, cache_dir: str, fallback: Optional[ReferenceProvider] = None):
+        """Initialize an ArchiveReferenceProvider.
 
-    # Start all threads.
-    for thread in thread_objs:
-        thread.start()
+        Parameters
+        ----------
+        cache_dir: str
+            directory containing the archived export CSVs
+        fallback: Optional[ReferenceProvider]
+            provider to query for geo type-signal combinations absent from the cache, or None if
+            such combinations should receive empty reference frames
+        """
+        self.cache_dir = cache_dir
+        self.fallback = fallback
+
+    def get_geo_signal_combos(self):
+        """Get the geo type-signal combinations found in the cache directory."""
+        combos = {(m.group("geo_type"), m.group("signal"))
+                  for _, m in read_filenames(self.cache_dir) if m}
+        return sorted(combos)
+
+    def get_reference_frames(self, start_date, end_date, geo_signal_combos):
+        """Read reference data for all combinations from the cache directory."""
+        date_filter = make_date_filter(start_date, end_date)
+        cached_files = [(f, m) for f, m in read_filenames(self.cache_dir) if date_filter(m)]
+        grouped = dict(iter(load_files_frame(self.cache_dir, cached_files, as_timestamps=True)
+                            .groupby(["geo_type", "signal"], sort=False, observed=True)))
+
+        output_dict = dict()
+        missing_combos = []
+        for geo_type, signal_type in geo_signal_combos:
+            if (geo_type, signal_type) in grouped:
+                output_dict[(geo_type, signal_type)] = grouped[(geo_type, signal_type)][
+                    REFERENCE_COLUMNS].reset_index(drop=True)
+            elif self.fallback is not None:
+                missing_combos.append((geo_type, signal_type))
+            else:
+                output_dict[(geo_type, signal_type)] = pd.DataFrame(columns=REFERENCE_COLUMNS)
+
+        if missing_combos:
+            output_dict.update(
+                self.fallback.get_reference_frames(start_date, end_date, missing_combos))
+        return output_dict
+
+
+def reference_provider_from_params(params):
+    """Build a ReferenceProvider for the dynamic checks from `params`.
 
-    # Wait until all threads are finished.
-    for thread in thread_objs:
-        thread.join()
+    Parameters
+    ----------
+    params: Dict[str, Dict[str, Any]]
+        Dictionary of user-defined parameters with the following structure:
+        - "validation":
+            - "common":
+                - "data_source": str, name of the data source in the COVIDcast API
+            - "dynamic" (optional):
+                - "reference_source" (optional): str, either "api" (default) or "archive"
+                - "reference_cache_dir" (optional): str, directory of archived CSVs; defaults to
+                    the "cache_dir" of the "archive" parameters
+                - "reference_api_fallback" (optional): bool, whether to query the API for
+                    combinations missing from the archive (default False)
+                - "api_max_in_flight" (optional): int, maximum number of concurrent API requests
+                    (default 32)
+                - "api_rate_limit" (optional): float, maximum API requests per second, with
+                    bursts of up to "api_max_in_flight" requests (default unlimited)
+                - "api_max_retries" (optional): int, number of times a failed API request is
+                    retried with exponential backoff (default 3)
+        - "archive" (optional):
+            - "cache_dir": str, directory containing cached data from previous indicator runs
 
-    return output_dict
+    Returns
+    -------
+    ReferenceProvider of the configured type.
+    """
+    validation_params = params["validation"]
+    data_source = validation_params["common"]["data_source"]
+    dynamic_params = validation_params.get("dynamic", dict())
+    reference_source = dynamic_params.get("reference_source", "api")
+
+    n_threads = dynamic_params.get("api_max_in_flight", 32)
+    rate_limit = dynamic_params.get("api_rate_limit")
+    api_provider = APIReferenceProvider(
+        data_source, n_threads,
+        TokenBucket(rate_limit, n_threads) if rate_limit is not None else None,
+        dynamic_params.get("api_max_retries", 3))
+
+    if reference_source == "api":
+        return api_provider
+
+    assert reference_source == "archive", \
+        f'reference_source must be "api" or "archive", not "{reference_source}"'
+    cache_dir = dynamic_params.get("reference_cache_dir",
+                                   params.get("archive", dict()).get("cache_dir"))
+    assert cache_dir is not None, "Archive reference data requires a reference_cache_dir or an "\
+        "archive cache_dir"
+    fallback = api_provider if dynamic_params.get("reference_api_fallback", False) else None
+    return ArchiveReferenceProvider(cache_dir, fallback)
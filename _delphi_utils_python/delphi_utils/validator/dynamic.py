@@ -2,11 +2,25 @@
 from dataclasses import dataclass
 from datetime import date, timedelta
 from typing import Dict, Set
+import numpy as np
 import pandas as pd
-from .errors import ValidationFailure, APIDataFetchError
-from .datafetcher import get_geo_signal_combos, threaded_api_calls
+from .errors import ValidationFailure
+from .report import profile_check
+from .datafetcher import APIReferenceProvider
 from .utils import relative_difference_by_min, TimeWindow
 
+# recent_lookbehind: start from the check date and working backward in time,
+# how many days at a time do we want to check for anomalies?
+# Choosing 1 day checks just the daily data.
+RECENT_LOOKBEHIND = timedelta(days=1)
+
+# semirecent_lookbehind: starting from the check date and working backward
+# in time, how many days do we use to form the reference statistics.
+SEMIRECENT_LOOKBEHIND = timedelta(days=7)
+
+# Get 14 days prior to the earliest list date
+OUTLIER_LOOKBEHIND = timedelta(days=14)
+
 
 class DynamicValidator:
     """Class for validation of static properties of individual datasets."""
@@ -30,12 +44,14 @@ class DynamicValidator:
         # how many days behind do we expect each signal to be
         expected_lag: Dict[str, int]
 
-    def __init__(self, params):
+    def __init__(self, params, reference_provider=None):
         """
         Initialize object and set parameters.
 
         Arguments:
             - params: dictionary of user settings; if empty, defaults will be used
+            - reference_provider: ReferenceProvider supplying previously published data; if None,
+                the COVIDcast API is queried
         """
         common_params = params["common"]
         dynamic_params = params.get("dynamic", dict())
@@ -53,7 +69,11 @@ class DynamicValidator:
             expected_lag=dynamic_params.get("expected_lag", dict())
         )
 
-    def validate(self, all_frames, report):
+        if reference_provider is None:
+            reference_provider = APIReferenceProvider(self.params.data_source)
+        self.reference_provider = reference_provider
+
+    def validate(self, all_frames, report, geo_signal_combos=None):
         """
         Perform all checks over the combined data set from all files.
 
@@ -63,38 +83,61 @@ class DynamicValidator:
             combined data from all input files
         report: ValidationReport
             report to which the results of these checks will be added
+        geo_signal_combos: Optional[List[Tuple[str, str]]]
+            geo type-signal combinations to check, or None to check all combinations expected by
+            the reference provider
         """
-        # recent_lookbehind: start from the check date and working backward in time,
-        # how many days at a time do we want to check for anomalies?
-        # Choosing 1 day checks just the daily data.
-        recent_lookbehind = timedelta(days=1)
-
-        # semirecent_lookbehind: starting from the check date and working backward
-        # in time, how many days do we use to form the reference statistics.
-        semirecent_lookbehind = timedelta(days=7)
-
-        # Get 14 days prior to the earliest list date
-        outlier_lookbehind = timedelta(days=14)
-
         # Get all expected combinations of geo_type and signal.
-        geo_signal_combos = get_geo_signal_combos(self.params.data_source)
+        expected_combos = self.reference_provider.get_geo_signal_combos()
+        if geo_signal_combos is None:
+            geo_signal_combos = expected_combos
+        else:
+            selected_combos = set(geo_signal_combos)
+            geo_signal_combos = [combo for combo in expected_combos if combo in selected_combos]
 
-        all_api_df = threaded_api_calls(self.params.data_source,
-                                        self.params.time_window.start_date - outlier_lookbehind,
-                                        self.params.time_window.end_date,
-                                        geo_signal_combos)
+        geo_sig_frames = _partition_by_combo(all_frames)
+        combos_with_data = self._check_test_data(all_frames, geo_sig_frames, geo_signal_combos,
+                                                 report)
 
         # Keeps script from checking all files in a test run.
         kroc = 0
 
         # Comparison checks
         # Run checks for recent dates in each geo-sig combo vs semirecent (previous
-        # week) API data.
+        # week) API data, starting on each combo as soon as its reference data arrives.
+        reference_frames = self._stream_reference_frames(combos_with_data, report)
+        for (geo_type, signal_type), api_df_or_error in reference_frames:
+            report.increment_total_checks()
+            if isinstance(api_df_or_error, ValidationFailure):
+                report.add_raised_error(api_df_or_error)
+                continue
+
+            self._check_vs_reference(geo_sig_frames[(geo_type, signal_type)],
+                                     api_df_or_error.sort_values("time_value", kind="mergesort"),
+                                     geo_type, signal_type, report)
+
+            # Keeps script from checking all files in a test run.
+            kroc += 1
+            if self.test_mode and kroc == 2:
+                reference_frames.close()
+                break
+
+    def _check_test_data(self, all_frames, geo_sig_frames, geo_signal_combos, report):
+        """
+        Perform the checks on the test data alone of each geo type-signal combination.
+
+        Arguments:
+            - all_frames: pd.DataFrame; combined data from all input files
+            - geo_sig_frames: dict of the test data of each combination, from _partition_by_combo
+            - geo_signal_combos: list of (geo type, signal) combinations to check
+            - report: ValidationReport; report where results are added
+
+        Returns:
+            - list of the combinations with test data, for which reference data is needed
+        """
+        combos_with_data = []
         for geo_type, signal_type in geo_signal_combos:
-            geo_sig_df = all_frames.query(
-                "geo_type == @geo_type & signal == @signal_type")
-            # Drop unused columns.
-            geo_sig_df.drop(columns=["geo_type", "signal"])
+            geo_sig_df = geo_sig_frames.get((geo_type, signal_type), all_frames.iloc[0:0])
 
             report.increment_total_checks()
 
@@ -111,101 +154,147 @@ class DynamicValidator:
                 max_date, geo_type, signal_type, report)
             self.check_max_allowed_max_date(
                 max_date, geo_type, signal_type, report)
+            combos_with_data.append((geo_type, signal_type))
+        return combos_with_data
+
+    def _stream_reference_frames(self, combos, report):
+        """
+        Iterate over the reference data of combinations as it is fetched, timing the fetches.
+
+        Arguments:
+            - combos: list of (geo type, signal) combinations
+            - report: ValidationReport; report where the fetch times are added
+
+        Returns:
+            - generator of ((geo type, signal), reference pd.DataFrame or ValidationFailure)
+        """
+        return _timed_iter(report, "fetch_reference_data",
+                           self.reference_provider.iter_reference_frames(
+                               self.params.time_window.start_date - OUTLIER_LOOKBEHIND,
+                               self.params.time_window.end_date,
+                               combos))
+
+    def _date_windows(self, geo_sig_df, api_df, signal_type):
+        """
+        Slice the test and reference data of a combination into the windows of each check.
+
+        Arguments:
+            - geo_sig_df: pd.DataFrame; test data of the combination, sorted by date
+            - api_df: pd.DataFrame; reference data of the combination, sorted by date
+            - signal_type: str; signal name as in the CSV name
+
+        Returns:
+            - dict with the test and reference data of the outlier check ("source_df",
+              "outlier_api_df"), and the bounds of the recent test data ("recent_bounds") and
+              reference data ("reference_bounds") of each checking date
+        """
+        test_days = _to_days(geo_sig_df["time_value"])
+        api_days = _to_days(api_df["time_value"])
+        checking_dates = np.array(self.params.time_window.date_seq, dtype="datetime64[D]")
+
+        # Outlier dataframe
+        earliest_available_date = geo_sig_df["time_value"].min()
+        source_df = geo_sig_df.iloc[slice(*_date_range_bounds(
+            test_days, self.params.time_window.start_date,
+            self.params.time_window.end_date))]
+        outlier_api_df = api_df.iloc[slice(*_date_range_bounds(
+            api_days,
+            earliest_available_date - OUTLIER_LOOKBEHIND,
+            earliest_available_date - timedelta(days=1)))]
+
+        # Find the recent test data and reference API data for every checking date at once.
+        recent_cutoff_dates = checking_dates - \
+            np.timedelta64(RECENT_LOOKBEHIND.days - 1, "D")
+        reference_lookbehind = min(SEMIRECENT_LOOKBEHIND, self.params.max_check_lookbehind)
+        if signal_type in self.params.smoothed_signals:
+            # Add an extra 7 days to the reference period.
+            reference_lookbehind += timedelta(days=7)
+        reference_start_dates = recent_cutoff_dates - \
+            np.timedelta64(reference_lookbehind.days + 1, "D")
+        reference_end_dates = recent_cutoff_dates - np.timedelta64(1, "D")
+
+        reference_bounds = _date_range_bounds(api_days, reference_start_dates,
+                                              reference_end_dates)
+        return {
+            "source_df": source_df,
+            "outlier_api_df": outlier_api_df,
+            "recent_bounds": _date_range_bounds(test_days, recent_cutoff_dates, checking_dates),
+            "reference_bounds": reference_bounds,
+            "test_rows_per_reporting_day": np.searchsorted(test_days, checking_dates, "right") -
+                                           np.searchsorted(test_days, checking_dates, "left"),
+            "reference_days": _count_distinct_sorted(api_days, *reference_bounds),
+        }
+
+    def _check_vs_reference(self, geo_sig_df, api_df, geo_type, signal_type, report):
+        """
+        Perform the comparison checks of a combination's test data against its reference data.
 
-            # Get relevant reference data from API dictionary.
-            api_df_or_error = all_api_df[(geo_type, signal_type)]
+        Arguments:
+            - geo_sig_df: pd.DataFrame; test data of the combination, sorted by date
+            - api_df: pd.DataFrame; reference data of the combination, sorted by date
+            - geo_type: str; geo type name (county, msa, hrr, state) as in the CSV name
+            - signal_type: str; signal name as in the CSV name
+            - report: ValidationReport; report where results are added
+        """
+        windows = self._date_windows(geo_sig_df, api_df, signal_type)
+        self.check_positive_negative_spikes(
+            windows["source_df"], windows["outlier_api_df"], geo_type, signal_type, report)
+
+        recent_bounds = windows["recent_bounds"]
+        reference_bounds = windows["reference_bounds"]
+        reference_rows = reference_bounds[1] - reference_bounds[0]
+        checked = (recent_bounds[1] > recent_bounds[0]) & (reference_rows > 0)
+        test_windows = _stack_windows(geo_sig_df, *recent_bounds, checked)
+        reference_windows = _stack_windows(api_df, *reference_bounds, checked)
+        with report.timed_check("check_avg_val_vs_reference",
+                                len(test_windows[0]) + len(reference_windows[0])):
+            avg_changed = self._avg_val_changed_by_window(*test_windows, *reference_windows)
+
+        # Check data from a group of dates against recent (previous 7 days,
+        # by default) data from the API.
+        for i, checking_date in enumerate(self.params.time_window.date_seq):
+            recent_df = geo_sig_df.iloc[recent_bounds[0][i]:recent_bounds[1][i]]
 
             report.increment_total_checks()
-            if isinstance(api_df_or_error, APIDataFetchError):
-                report.raised_errors.append(api_df_or_error)
+
+            if recent_df.empty:
+                report.add_raised_error(
+                    ValidationFailure("check_missing_geo_sig_date_combo",
+                                      checking_date,
+                                      geo_type,
+                                      signal_type,
+                                      "test data for a given checking date-geo type-signal type"
+                                      " combination is missing. Source data may be missing"
+                                      " for one or more dates"))
                 continue
 
-            # Outlier dataframe
-            earliest_available_date = geo_sig_df["time_value"].min()
-            source_df = geo_sig_df.query(
-                'time_value <= @self.params.time_window.end_date & '
-                'time_value >= @self.params.time_window.start_date'
-            )
-
-            # These variables are interpolated into the call to `api_df_or_error.query()`
-            # below but pylint doesn't recognize that.
-            # pylint: disable=unused-variable
-            outlier_start_date = earliest_available_date - outlier_lookbehind
-            outlier_end_date = earliest_available_date - timedelta(days=1)
-            outlier_api_df = api_df_or_error.query(
-                'time_value <= @outlier_end_date & time_value >= @outlier_start_date')
-            # pylint: enable=unused-variable
-
-            self.check_positive_negative_spikes(
-                source_df, outlier_api_df, geo_type, signal_type, report)
-
-            # Check data from a group of dates against recent (previous 7 days,
-            # by default) data from the API.
-            for checking_date in self.params.time_window.date_seq:
-                recent_cutoff_date = checking_date - \
-                    recent_lookbehind + timedelta(days=1)
-                recent_df = geo_sig_df.query(
-                    'time_value <= @checking_date & time_value >= @recent_cutoff_date')
-
-                report.increment_total_checks()
-
-                if recent_df.empty:
-                    report.add_raised_error(
-                        ValidationFailure("check_missing_geo_sig_date_combo",
-                                          checking_date,
-                                          geo_type,
-                                          signal_type,
-                                          "test data for a given checking date-geo type-signal type"
-                                          " combination is missing. Source data may be missing"
-                                          " for one or more dates"))
-                    continue
-
-                # Reference dataframe runs backwards from the recent_cutoff_date
-                #
-                # These variables are interpolated into the call to `api_df_or_error.query()`
-                # below but pylint doesn't recognize that.
-                # pylint: disable=unused-variable
-                reference_start_date = recent_cutoff_date - \
-                    min(semirecent_lookbehind, self.params.max_check_lookbehind) - \
-                    timedelta(days=1)
-                if signal_type in self.params.smoothed_signals:
-                    # Add an extra 7 days to the reference period.
-                    reference_start_date = reference_start_date - \
-                        timedelta(days=7)
-
-                reference_end_date = recent_cutoff_date - timedelta(days=1)
-                # pylint: enable=unused-variable
-
-                # Subset API data to relevant range of dates.
-                reference_api_df = api_df_or_error.query(
-                    "time_value >= @reference_start_date & time_value <= @reference_end_date")
-
-                report.increment_total_checks()
-
-                if reference_api_df.empty:
-                    report.add_raised_error(
-                        ValidationFailure("empty_reference_data",
-                                          checking_date,
-                                          geo_type,
-                                          signal_type,
-                                          "reference data is empty; comparative checks could not "
-                                          "be performed"))
-                    continue
-
-                self.check_max_date_vs_reference(
-                    recent_df, reference_api_df, checking_date, geo_type, signal_type, report)
-
-                self.check_rapid_change_num_rows(
-                    recent_df, reference_api_df, checking_date, geo_type, signal_type, report)
-
-                self.check_avg_val_vs_reference(
-                    recent_df, reference_api_df, checking_date, geo_type, signal_type, report)
+            # Subset API data to relevant range of dates.
+            reference_api_df = api_df.iloc[reference_bounds[0][i]:reference_bounds[1][i]]
 
-            # Keeps script from checking all files in a test run.
-            kroc += 1
-            if self.test_mode and kroc == 2:
-                break
+            report.increment_total_checks()
+
+            if reference_api_df.empty:
+                report.add_raised_error(
+                    ValidationFailure("empty_reference_data",
+                                      checking_date,
+                                      geo_type,
+                                      signal_type,
+                                      "reference data is empty; comparative checks could not "
+                                      "be performed"))
+                continue
 
+            self.check_max_date_vs_reference(
+                recent_df, reference_api_df, checking_date, geo_type, signal_type, report)
+
+            self._check_rapid_change(
+                windows["test_rows_per_reporting_day"][i],
+                reference_rows[i] / windows["reference_days"][i],
+                checking_date, geo_type, signal_type, report)
+
+            self._check_avg_val_changed(
+                avg_changed.get(i, False), checking_date, geo_type, signal_type, report)
+
+    @profile_check()
     def check_min_allowed_max_date(self, max_date, geo_type, signal_type, report):
         """
         Check if time since data was generated is reasonable or too long ago.
@@ -232,6 +321,7 @@ class DynamicValidator:
 
         report.increment_total_checks()
 
+    @profile_check()
     def check_max_allowed_max_date(self, max_date, geo_type, signal_type, report):
         """
         Check if time since data was generated is reasonable or too recent.
@@ -254,6 +344,7 @@ class DynamicValidator:
 
         report.increment_total_checks()
 
+    @profile_check()
     def check_max_date_vs_reference(self, df_to_test, df_to_reference, checking_date,
                                     geo_type, signal_type, report):
         """
@@ -303,6 +394,14 @@ class DynamicValidator:
         reference_rows_per_reporting_day = df_to_reference.shape[0] / len(
             set(df_to_reference["time_value"]))
 
+        self._check_rapid_change(test_rows_per_reporting_day, reference_rows_per_reporting_day,
+                                 checking_date, geo_type, signal_type, report)
+
+    @staticmethod
+    @profile_check("check_rapid_change_num_rows")
+    def _check_rapid_change(test_rows_per_reporting_day, reference_rows_per_reporting_day,
+                            checking_date, geo_type, signal_type, report):
+        """Compare number of observations per day; see `check_rapid_change_num_rows`."""
         try:
             compare_rows = relative_difference_by_min(
                 test_rows_per_reporting_day,
@@ -322,6 +421,7 @@ class DynamicValidator:
 
         report.increment_total_checks()
 
+    @profile_check()
     def check_positive_negative_spikes(self, source_df, api_frames, geo, sig, report):
         """
         Adapt Dan's corrections package to Python (only consider spikes).
@@ -343,12 +443,16 @@ class DynamicValidator:
 
         """
         report.increment_total_checks()
+        if source_df.empty or api_frames.empty:
+            return
+
         # Combine all possible frames so that the rolling window calculations make sense.
         source_frame_start = source_df["time_value"].min()
         source_frame_end = source_df["time_value"].max()
-        all_frames = pd.concat([api_frames, source_df]). \
+        all_frames = pd.concat([api_frames, source_df])
+        all_frames = all_frames.assign(time_value=_to_days(all_frames["time_value"])). \
             drop_duplicates(subset=["geo_id", "time_value"], keep='last'). \
-            sort_values(by=['time_value']).reset_index(drop=True)
+            sort_values(by=['geo_id', 'time_value'], kind="mergesort")
 
         # Tuned Variables from Dan's Code for flagging outliers. Size_cut is a
         # check on the minimum value reported, sig_cut is a check
@@ -358,97 +462,64 @@ class DynamicValidator:
         sig_cut = 3
         sig_consec = 2.25
 
-        # Functions mapped to rows to determine outliers based on fstat and ststat values
-
-        def outlier_flag(frame):
-            if (abs(frame["val"]) > size_cut) and not (pd.isna(frame["ststat"])) \
-                    and (frame["ststat"] > sig_cut):
-                return True
-            if (abs(frame["val"]) > size_cut) and (pd.isna(frame["ststat"])) and \
-                    not (pd.isna(frame["ftstat"])) and (frame["ftstat"] > sig_cut):
-                return True
-            if (frame["val"] < -size_cut) and not (pd.isna(frame["ststat"])) and \
-                    not pd.isna(frame["ftstat"]):
-                return True
-            return False
-
-        def outlier_nearby(frame):
-            if (not pd.isna(frame['ststat'])) and (frame['ststat'] > sig_consec):
-                return True
-            if pd.isna(frame['ststat']) and (frame['ftstat'] > sig_consec):
-                return True
-            return False
-
-        # Calculate ftstat and ststat values for the rolling windows, group fames by geo region
-        region_group = all_frames.groupby("geo_id")
+        # Lay out the values of every geo region as one column of a panel, indexed by the position
+        # of each observation within its region, so that the rolling windows of all regions are
+        # computed together.
+        geo_codes, geo_ids = pd.factorize(all_frames["geo_id"])
+        positions = all_frames.groupby("geo_id", sort=False).cumcount().to_numpy()
+        val = all_frames["val"].to_numpy(dtype=float)
+        panel = np.full((positions.max() + 1, len(geo_ids)), np.nan)
+        panel[positions, geo_codes] = val
+        panel = pd.DataFrame(panel)
+
         window_size = 14
         # Shift the window to match how R calculates rolling windows with even numbers
         shift_val = -1 if window_size % 2 == 0 else 0
 
         # Calculate the t-statistics for the two rolling windows (windows center and windows right)
-        all_full_frames = []
-        for _, group in region_group:
-            rolling_windows = group["val"].rolling(
-                window_size, min_periods=window_size)
-            center_windows = group["val"].rolling(
-                window_size, min_periods=window_size, center=True)
-            fmedian = rolling_windows.median()
-            smedian = center_windows.median().shift(shift_val)
-            fsd = rolling_windows.std() + 0.00001  # if std is 0
-            ssd = center_windows.std().shift(shift_val) + 0.00001  # if std is 0
-            group['ftstat'] = abs(group["val"] - fmedian.fillna(0)) / fsd
-            group['ststat'] = abs(group["val"] - smedian.fillna(0)) / ssd
-            all_full_frames.append(group)
-
-        all_frames = pd.concat(all_full_frames)
+        rolling_windows = panel.rolling(window_size, min_periods=window_size)
+        center_windows = panel.rolling(window_size, min_periods=window_size, center=True)
+        fmedian = rolling_windows.median().to_numpy()[positions, geo_codes]
+        smedian = center_windows.median().shift(shift_val).to_numpy()[positions, geo_codes]
+        fsd = rolling_windows.std().to_numpy()[positions, geo_codes] + 0.00001  # if std is 0
+        ssd = center_windows.std().shift(shift_val).to_numpy()[positions, geo_codes] \
+            + 0.00001  # if std is 0
+        ftstat = np.abs(val - np.nan_to_num(fmedian)) / fsd
+        ststat = np.abs(val - np.nan_to_num(smedian)) / ssd
+
         # Determine outliers in source frames only, only need the reference
         # data from just before the start of the source data
         # because lead and lag outlier calculations are only one day
-        #
-        # These variables are interpolated into the call to `api_df_or_error.query()`
-        # below but pylint doesn't recognize that.
-        # pylint: disable=unused-variable
-        api_frames_end = min(api_frames["time_value"].max(),
-                             source_frame_start-timedelta(days=1))
-        # pylint: enable=unused-variable
-        outlier_df = all_frames.query(
-            'time_value >= @api_frames_end & time_value <= @source_frame_end')
-        outlier_df = outlier_df.sort_values(by=['geo_id', 'time_value']) \
-            .reset_index(drop=True).copy()
-        outliers = outlier_df[outlier_df.apply(outlier_flag, axis=1)]
-        outliers_reset = outliers.copy().reset_index(drop=True)
-
-        # Find the lead outliers and the lag outliers. Check that the selected row
-        # is actually a leading and lagging row for given geo_id
-        upper_index = list(filter(lambda x: x < outlier_df.shape[0],
-                                  list(outliers.index+1)))
-        upper_df = outlier_df.iloc[upper_index, :].reset_index(drop=True)
-        upper_compare = outliers_reset[:len(upper_index)]
-        sel_upper_df = upper_df[upper_compare["geo_id"]
-                                == upper_df["geo_id"]].copy()
-        lower_index = list(filter(lambda x: x >= 0, list(outliers.index-1)))
-        lower_df = outlier_df.iloc[lower_index, :].reset_index(drop=True)
-        lower_compare = outliers_reset[-len(lower_index):].reset_index(drop=True)
-        sel_lower_df = lower_df[lower_compare["geo_id"]
-                                == lower_df["geo_id"]].copy()
-
-        outliers_list = [outliers]
-        if sel_upper_df.size > 0:
-            outliers_list.append(
-                sel_upper_df[sel_upper_df.apply(outlier_nearby, axis=1)])
-        if sel_lower_df.size > 0:
-            outliers_list.append(
-                sel_lower_df[sel_lower_df.apply(outlier_nearby, axis=1)])
-
-        all_outliers = pd.concat(outliers_list). \
-            sort_values(by=['time_value', 'geo_id']). \
-            drop_duplicates().reset_index(drop=True)
+        time_value = all_frames["time_value"].to_numpy()
+        api_frames_end = min(_to_days(api_frames["time_value"]).max(),
+                             _to_days(pd.Series([source_frame_start]))[0] - np.timedelta64(1, "D"))
+        source_frame_bounds = _to_days(pd.Series([source_frame_start, source_frame_end]))
+        in_outlier_df = (time_value >= api_frames_end) & (time_value <= source_frame_bounds[1])
+
+        # Flag outliers based on ftstat and ststat values
+        with np.errstate(invalid="ignore"):
+            big = np.abs(val) > size_cut
+            has_ststat = ~np.isnan(ststat)
+            outlier = (big & has_ststat & (ststat > sig_cut)) | \
+                (big & ~has_ststat & (ftstat > sig_cut)) | \
+                ((val < -size_cut) & has_ststat & ~np.isnan(ftstat))
+            nearby = np.where(has_ststat, ststat > sig_consec, ftstat > sig_consec)
+        outlier &= in_outlier_df
+
+        # Find the lead outliers and the lag outliers, which are the rows directly after and
+        # before an outlier for the same geo_id
+        rows = np.flatnonzero(in_outlier_df)
+        same_geo_as_next = geo_codes[rows][1:] == geo_codes[rows][:-1]
+        row_outlier = outlier[rows]
+        lead = np.r_[False, row_outlier[:-1] & same_geo_as_next]
+        lag = np.r_[row_outlier[1:] & same_geo_as_next, False]
+        all_outliers = row_outlier | ((lead | lag) & nearby[rows])
 
         # Identify outliers just in the source data
-        source_outliers = all_outliers.query(
-            "time_value >= @source_frame_start & time_value <= @source_frame_end")
+        in_source = (time_value[rows] >= source_frame_bounds[0]) & \
+            (time_value[rows] <= source_frame_bounds[1])
 
-        if source_outliers.shape[0] > 0:
+        if np.any(all_outliers & in_source):
             report.raised_errors.append(
                 ValidationFailure(
                     "check_positive_negative_spikes",
@@ -458,6 +529,7 @@ class DynamicValidator:
                     "Source dates with flagged ouliers based on the previous 14 days of data "
                     "available"))
 
+    @profile_check()
     def check_avg_val_vs_reference(self, df_to_test, df_to_reference, checking_date, geo_type,
                                    signal_type, report):
         """
@@ -473,33 +545,45 @@ class DynamicValidator:
         Returns:
             - None
         """
-        # Calculate reference mean and standard deviation for each geo_id.
-        reference_mean = df_to_reference.groupby(['geo_id'], as_index=False)[
-            ['val', 'se', 'sample_size']].mean().assign(type="reference mean")
-        reference_sd = df_to_reference.groupby(['geo_id'], as_index=False)[
-            ['val', 'se', 'sample_size']].std().assign(type="reference sd")
+        changed = self._avg_val_changed_by_window(
+            df_to_test, np.zeros(df_to_test.shape[0], dtype=int),
+            df_to_reference, np.zeros(df_to_reference.shape[0], dtype=int))
+        self._check_avg_val_changed(changed.get(0, False), checking_date, geo_type, signal_type,
+                                    report)
+
+    @staticmethod
+    def _avg_val_changed_by_window(df_to_test, test_windows, df_to_reference, reference_windows):
+        """
+        Compare average values of test and reference data for many windows at once.
+
+        Each row of the test and reference data is assigned to a window, and the comparison of
+        `check_avg_val_vs_reference` is performed separately within each window, using
+        grouped operations over all windows together.
+
+        Arguments:
+            - df_to_test: pandas dataframe of CSV source data
+            - test_windows: array of window labels for the rows of df_to_test
+            - df_to_reference: pandas dataframe of reference data
+            - reference_windows: array of window labels for the rows of df_to_reference
+
+        Returns:
+            - pd.Series of booleans indexed by window, true where average differences are large
+        """
+        columns = ["val", "se", "sample_size"]
+        reference_df = df_to_reference[["geo_id"] + columns].assign(window=reference_windows)
+
+        # Calculate reference mean and standard deviation for each window and geo_id.
+        grouped = reference_df.groupby(["window", "geo_id"])[columns]
+        reference_mean = grouped.mean()
+        reference_sd = grouped.std()
 
         # Replace standard deviations of 0 with non-zero min sd for that type. Ignores NA.
-        replacements = {"val": {0: reference_sd.val[reference_sd.val > 0].min()},
-                        "se": {0: reference_sd.se[reference_sd.se > 0].min()},
-                        "sample_size": {0: reference_sd.se[reference_sd.sample_size > 0].min()}}
-        reference_sd.replace(replacements, inplace=True)
-
-        # Duplicate reference_mean and reference_sd for every unique time_value seen in df_to_test
-        reference_df = pd.concat(
-            [reference_mean, reference_sd]
-        ).assign(
-            key=0
-        ).merge(
-            df_to_test.assign(key=0)[["time_value", "key"]].drop_duplicates()
-        ).drop("key", axis=1)
-
-        # Drop unused columns from test data.
-        df_to_test = df_to_test[[
-            "geo_id", "val", "se", "sample_size", "time_value"
-        ]].assign(
-            type="test"
-        )
+        window_index = reference_sd.index.get_level_values("window")
+        min_sd = reference_sd.where(reference_sd > 0).groupby(window_index).min()
+        min_sd["sample_size"] = reference_sd["se"].where(
+            reference_sd["sample_size"] > 0).groupby(window_index).min()
+        reference_sd = reference_sd.mask(
+            reference_sd == 0, min_sd.reindex(window_index).set_axis(reference_sd.index))
 
         # For each variable (val, se, and sample size) where not missing, calculate the
         # mean z-score and mean absolute z-score of the test data across all geographic
@@ -511,46 +595,32 @@ class DynamicValidator:
         #  - Use to calculate z-score for each test datapoint for a given geo_id and date.
         #  - Avg z-scores over each geo_id, across all dates.
         #  - Avg all z-scores together.
-        df_all = pd.concat(
-            [df_to_test, reference_df]
-        ).melt(
-            id_vars=["geo_id", "type", "time_value"], value_vars=["val", "se", "sample_size"]
-        ).pivot(
-            index=("geo_id", "variable", "time_value"), columns="type", values="value"
-        ).reset_index(
-            ("geo_id", "variable", "time_value")
-        ).dropna(
-        ).assign(
-            z=lambda x: (
-                x["test"] - x["reference mean"]) / x["reference sd"],
-            abs_z=lambda x: abs(x["z"])
-        ).groupby(
-            ["geo_id", "variable"], as_index=False
-        ).agg(
-            geo_z=("z", "mean"),
-            geo_abs_z=("abs_z", "mean")
-        ).groupby(
-            "variable", as_index=False
-        ).agg(
-            mean_z=("geo_z", "mean"),
-            mean_abs_z=("geo_abs_z", "mean")
-        )[["variable", "mean_z", "mean_abs_z"]]
+        keys = pd.MultiIndex.from_arrays([np.asarray(test_windows), df_to_test["geo_id"]],
+                                         names=["window", "geo_id"])
+        z = (df_to_test[columns].to_numpy(dtype=float) -
+             reference_mean.reindex(keys).to_numpy(dtype=float)) / \
+            reference_sd.reindex(keys).to_numpy(dtype=float)
+        z = pd.DataFrame(z, index=keys, columns=columns)
+        geo_z = z.groupby(level=["window", "geo_id"])
+        mean_z = geo_z.mean().groupby(level="window").mean()
+        mean_abs_z = z.abs().groupby(level=["window", "geo_id"]).mean() \
+            .groupby(level="window").mean()
 
         # Set thresholds for comparison.
         classes = ['mean_z', 'val_mean_z', 'mean_abs_z']
         thres = pd.DataFrame([[4.0, 3.5, 4.25]], columns=classes)
 
         # Check if the calculated mean differences are high compared to the thresholds.
-        mean_z_high = (
-            abs(df_all["mean_z"]) > float(thres["mean_z"])).any() or (
-                (df_all["variable"] == "val").any() and
-                (abs(df_all[df_all["variable"] == "val"]["mean_z"])
-                 > float(thres["val_mean_z"])).any()
-        )
-        mean_abs_z_high = (df_all["mean_abs_z"] > float(
-            thres["mean_abs_z"])).any()
+        mean_z_high = (mean_z.abs() > float(thres["mean_z"])).any(axis=1) | \
+            (mean_z["val"].abs() > float(thres["val_mean_z"]))
+        mean_abs_z_high = (mean_abs_z > float(thres["mean_abs_z"])).any(axis=1)
+
+        return mean_z_high | mean_abs_z_high
 
-        if mean_z_high or mean_abs_z_high:
+    @staticmethod
+    def _check_avg_val_changed(changed, checking_date, geo_type, signal_type, report):
+        """Report large average differences; see `check_avg_val_vs_reference`."""
+        if changed:
             report.add_raised_error(
                 ValidationFailure(
                     "check_test_vs_reference_avg_changed",
@@ -564,3 +634,64 @@ class DynamicValidator:
                     + 'tolerances for `val` are more restrictive than those for other columns.'))
 
         report.increment_total_checks()
+
+
+def _partition_by_combo(all_frames):
+    """Split test data by geo type and signal, sorting each part by date.
+
+    Sorted parts let date windows be found by binary search instead of repeated queries.
+    """
+    return {key: df.sort_values("time_value", kind="mergesort")
+            for key, df in all_frames.groupby(["geo_type", "signal"], sort=False, observed=True)}
+
+
+def _timed_iter(report, check_name, iterable):
+    """Yield from `iterable`, recording the time spent waiting for each item in `report`."""
+    iterator = iter(iterable)
+    done = object()
+    try:
+        while True:
+            with report.timed_check(check_name):
+                item = next(iterator, done)
+            if item is done:
+                return
+            yield item
+    finally:
+        if hasattr(iterator, "close"):
+            iterator.close()
+
+
+def _to_days(time_values):
+    """Convert a series of dates or timestamps to an array of datetime64 days."""
+    return pd.to_datetime(time_values).to_numpy().astype("datetime64[D]")
+
+
+def _date_range_bounds(days, start_dates, end_dates):
+    """Find positions in sorted `days` bounding each inclusive range of dates."""
+    return (np.searchsorted(days, np.asarray(start_dates, dtype="datetime64[D]"), "left"),
+            np.searchsorted(days, np.asarray(end_dates, dtype="datetime64[D]"), "right"))
+
+
+def _count_distinct_sorted(days, starts, stops):
+    """Count the distinct values in each slice `days[start:stop]` of a sorted array."""
+    # changes[k] is the number of positions i < k at which days[i] differs from days[i - 1].
+    changes = np.r_[0, 0, np.cumsum(days[1:] != days[:-1])]
+    nonempty = stops > starts
+    return np.where(nonempty,
+                    1 + changes[stops] - changes[np.minimum(starts + 1, len(days))],
+                    0)
+
+
+def _stack_windows(df, starts, stops, selected):
+    """
+    Concatenate the slices `df.iloc[start:stop]` for the selected windows.
+
+    Returns
+    -------
+    The stacked rows and an array labelling each row with the position of its window.
+    """
+    windows = np.flatnonzero(selected)
+    lengths = (stops - starts)[windows]
+    offsets = np.repeat(starts[windows] - np.cumsum(lengths) + lengths, lengths)
+    rows = np.arange(lengths.sum()) + offsets
+    return df.iloc[rows], np.repeat(windows, lengths)
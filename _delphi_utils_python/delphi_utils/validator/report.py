@@ -1,9 +1,51 @@
 """Validation output reports."""
 import sys
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from functools import wraps
 from typing import List
+import pandas as pd
 from ..logger import get_structured_logger
 from .errors import ValidationFailure
 
+
+@dataclass
+class CheckProfile:
+    """Accumulated cost of one validation check."""
+
+    # number of times the check was run
+    invocations: int = 0
+    # total wall time spent in the check
+    elapsed_time_in_seconds: float = 0.0
+    # total number of data rows passed to the check
+    rows_examined: int = 0
+
+
+def profile_check(check_name=None):
+    """Record the cost of each call of a check method in its ValidationReport.
+
+    The decorated method must take the report as its last positional argument or as the `report`
+    keyword argument.  The rows of all DataFrame and Series arguments are counted as examined.
+
+    Parameters
+    ----------
+    check_name: Optional[str]
+        Name under which to record the check; defaults to the name of the decorated method.
+    """
+    def decorator(check_fn):
+        name = check_name or check_fn.__name__
+
+        @wraps(check_fn)
+        def wrapper(*args, **kwargs):
+            report = kwargs["report"] if "report" in kwargs else args[-1]
+            rows = sum(len(arg) for arg in args if isinstance(arg, (pd.DataFrame, pd.Series)))
+            with report.timed_check(name, rows):
+                return check_fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
 class ValidationReport:
     """Class for reporting the results of validation."""
 
@@ -29,6 +71,8 @@ class ValidationReport:
             Warnings raised from validation execution
         unsuppressed_errors: List[Exception]
             Errors raised from validation failures not found in `self.errors_to_suppress`
+        check_profile: Dict[str, CheckProfile]
+            Invocations, wall time, and rows examined for each check name
         """
         self.errors_to_suppress = errors_to_suppress
         self.num_suppressed = 0
@@ -36,6 +80,7 @@ class ValidationReport:
         self.raised_errors = []
         self.raised_warnings = []
         self.unsuppressed_errors = []
+        self.check_profile = {}
 
     def add_raised_error(self, error):
         """Add an error to the report.
@@ -59,6 +104,26 @@ class ValidationReport:
         """Record a check."""
         self.total_checks += 1
 
+    @contextmanager
+    def timed_check(self, check_name, rows_examined=0):
+        """Record the wall time of the enclosed block as one invocation of a check.
+
+        Parameters
+        ----------
+        check_name: str
+            Name of the check being run
+        rows_examined: int
+            Number of data rows the check examines
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            profile = self.check_profile.setdefault(check_name, CheckProfile())
+            profile.invocations += 1
+            profile.elapsed_time_in_seconds += time.perf_counter() - start
+            profile.rows_examined += rows_examined
+
     def add_raised_warning(self, warning):
         """Add a warning to the report.
 
@@ -90,6 +155,13 @@ class ValidationReport:
             logger.critical(str(error))
         for warning in self.raised_warnings:
             logger.warning(str(warning))
+        for check_name, profile in sorted(self.check_profile.items(),
+                                          key=lambda item: -item[1].elapsed_time_in_seconds):
+            logger.info("Validation check profile",
+                        check_name=check_name,
+                        invocations=profile.invocations,
+                        elapsed_time_in_seconds=round(profile.elapsed_time_in_seconds, 4),
+                        rows_examined=profile.rows_examined)
 
     def print_and_exit(self, logger=None, die_on_failures=True):
         """Print results and exit.
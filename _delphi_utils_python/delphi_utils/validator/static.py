@@ -3,9 +3,11 @@ import re
 from datetime import datetime
 from dataclasses import dataclass
 from typing import Dict, List
+import numpy as np
 import pandas as pd
 from .datafetcher import FILENAME_REGEX
 from .errors import ValidationFailure
+from .report import profile_check
 from .utils import GEO_REGEX_DICT, TimeWindow
 from ..geomap import GeoMapper
 
@@ -74,6 +76,296 @@ class StaticValidator:
             self.check_bad_sample_size(data_df, filename, report)
 
 
+    def validate_frame(self, all_frames, report, filenames=None):
+        """
+        Perform the single-file checks over all files at once.
+
+        Produces the same failures as `validate`, but each check is evaluated once over the
+        combined data with array operations, and per-file results are derived by grouping rows
+        on their `filename`.
+
+        Parameters
+        ----------
+        all_frames: pd.DataFrame
+            combined data from all input files, as produced by `load_all_files`
+        report: ValidationReport
+            report to which the results of these checks will be added
+        filenames: Optional[List[str]]
+            names of all files in the time window, used to check for missing dates; defaults to
+            the files in `all_frames`
+        """
+        if filenames is None:
+            filenames = _FileGroups(all_frames).filenames
+        self.check_missing_date_files([(f, None) for f in filenames], report)
+        self.validate_files(all_frames, report)
+
+    def validate_files(self, all_frames, report):
+        """
+        Perform the per-file checks of `validate_frame` on some files.
+
+        Every file is checked independently, so files may be checked in separate batches.
+
+        Parameters
+        ----------
+        all_frames: pd.DataFrame
+            combined data from the files to check, as produced by `load_files_frame`
+        report: ValidationReport
+            report to which the results of these checks will be added
+        """
+        files = _FileGroups(all_frames)
+        self._check_df_format_frame(files, report)
+        self._check_duplicate_rows_frame(all_frames, files, report)
+        geo_ids = self._check_bad_geo_id_format_frame(all_frames, files, report)
+        self._check_bad_geo_id_value_frame(geo_ids, files, report)
+        self._check_bad_val_frame(all_frames, files, report)
+        self._check_bad_se_frame(all_frames, files, report)
+        self._check_bad_sample_size_frame(all_frames, files, report)
+
+    @staticmethod
+    @profile_check("check_df_format")
+    def _check_df_format_frame(files, report):
+        """Check filename format for all files; see `check_df_format`."""
+        for filename in files.filenames:
+            if not filename or not FILENAME_REGEX.match(filename):
+                report.add_raised_error(
+                    ValidationFailure("check_filename_format",
+                                      filename=filename,
+                                      message="nameformat not recognized"))
+        # Frames built from files are always DataFrames, so that check never fails.
+        files.increment_checks(report, 2)
+
+    @staticmethod
+    @profile_check("check_duplicate_rows")
+    def _check_duplicate_rows_frame(all_frames, files, report):
+        """Check for duplicated rows within each file; see `check_duplicate_rows`."""
+        data_columns = [col for col in all_frames.columns
+                        if col not in ("geo_type", "signal", "time_value")]
+        for filename in files.filenames[files.any(all_frames.duplicated(subset=data_columns))]:
+            report.add_raised_warning(
+                ValidationFailure("check_duplicate_rows",
+                                  filename=filename,
+                                  message="Some rows are duplicated, which may indicate data "
+                                          "integrity issues"))
+        files.increment_checks(report)
+
+    @staticmethod
+    @profile_check("check_bad_geo_id_format")
+    def _check_bad_geo_id_format_frame(all_frames, files, report):
+        """
+        Check format of geo_ids for all files; see `check_bad_geo_id_format`.
+
+        Returns
+        -------
+        pd.Series of geo_ids after removing decimals from float-formatted ids and left-padding
+        numeric ids with zeros, as done by `check_bad_geo_id_format`.
+        """
+        numeric_geo_types = {"msa", "county", "hrr", "dma"}
+        fill_len = {"msa": 5, "county": 5, "dma": 3}
+
+        geo_ids = all_frames["geo_id"].astype(object).copy()
+        for geo_type in files.geo_types:
+            file_mask = files.geo_type_file_mask(geo_type)
+            if geo_type not in GEO_REGEX_DICT:
+                for filename in files.filenames[file_mask]:
+                    report.add_raised_error(
+                        ValidationFailure(
+                            "check_geo_type",
+                            filename=filename,
+                            message=f"Unrecognized geo type {geo_type}"))
+                continue
+
+            rows = file_mask[files.codes]
+            geo_regex = GEO_REGEX_DICT[geo_type]
+            ids = geo_ids[rows]
+            if ids.empty:
+                continue
+
+            if geo_type in numeric_geo_types:
+                # Check if geo_ids were stored as floats (contain decimal point) and
+                # contents before decimal match the specified regex pattern.
+                split_ids = ids.str.split(".", n=1, expand=True)
+                head = split_ids[0]
+                is_float = split_ids[1].notna() if split_ids.shape[1] > 1 \
+                    else pd.Series(False, index=ids.index)
+                is_float &= head.str.fullmatch(geo_regex, na=False)
+                float_files = files.any(pd.Series(is_float).reindex(geo_ids.index,
+                                                                    fill_value=False))
+
+                # If any floats found in a file, remove decimal and anything after.
+                strip_rows = float_files[files.codes[rows]]
+                ids = ids.where(~strip_rows, head)
+                for filename in files.filenames[float_files]:
+                    report.add_raised_warning(
+                        ValidationFailure(
+                            "check_geo_id_type",
+                            filename=filename,
+                            message="geo_ids saved as floats; strings preferred"))
+
+            if geo_type in fill_len:
+                # Left-pad with zeroes up to expected length. Fixes missing leading zeroes
+                # caused by FIPS codes saved as numeric.
+                ids = ids.str.zfill(fill_len[geo_type])
+
+            geo_ids[rows] = ids
+            conforming = ids.str.fullmatch(geo_regex, na=False)
+            unexpected = pd.Series(False, index=geo_ids.index)
+            unexpected[rows] = ~conforming.to_numpy()
+            for filename, bad_geos in files.values_by_file(geo_ids, unexpected):
+                report.add_raised_error(
+                    ValidationFailure(
+                        "check_geo_id_format",
+                        filename=filename,
+                        message=f"Non-conforming geo_ids {set(bad_geos)} found"))
+
+        files.increment_checks(report)
+        return geo_ids
+
+    @profile_check("check_bad_geo_id_value")
+    def _check_bad_geo_id_value_frame(self, geo_ids, files, report):
+        """Check geo_id values for all files; see `check_bad_geo_id_value`."""
+        lower_ids = geo_ids.str.lower()
+        unexpected = pd.Series(False, index=geo_ids.index)
+        for geo_type in files.geo_types:
+            rows = files.geo_type_file_mask(geo_type)[files.codes]
+            valid_geos = self._get_valid_geo_values(geo_type)
+            unexpected[rows] = ~lower_ids[rows].isin(valid_geos).to_numpy()
+        for filename, bad_geos in files.values_by_file(geo_ids, unexpected):
+            report.add_raised_error(
+                ValidationFailure(
+                    "check_bad_geo_id_value",
+                    filename=filename,
+                    message=f"Unrecognized geo_ids (not in historical data) {bad_geos}"))
+        files.increment_checks(report)
+
+        upper_case = (lower_ids != geo_ids) & geo_ids.notna()
+        for filename, upper_case_geos in files.values_by_file(geo_ids, upper_case):
+            report.add_raised_warning(
+                ValidationFailure(
+                    "check_geo_id_lowercase",
+                    filename=filename,
+                    message=f"geo_ids {upper_case_geos} contains uppercase characters. Lowercase "
+                            "is preferred."))
+        files.increment_checks(report)
+
+    @staticmethod
+    @profile_check("check_bad_val")
+    def _check_bad_val_frame(all_frames, files, report):
+        """Check value field for all files; see `check_bad_val`."""
+        val = all_frames["val"]
+        percent_files = np.array(["pct" in signal for signal in files.signals], dtype=bool)
+        proportion_files = np.array(["prop" in signal for signal in files.signals], dtype=bool)
+
+        for filename in files.filenames[percent_files & files.any(val > 100)]:
+            report.add_raised_error(
+                ValidationFailure(
+                    "check_val_pct_gt_100",
+                    filename=filename,
+                    message="val column can't have any cell greater than 100 for percents"))
+        files.increment_checks(report, 1, percent_files)
+
+        for filename in files.filenames[proportion_files & files.any(val > 100000)]:
+            report.add_raised_error(
+                ValidationFailure("check_val_prop_gt_100k",
+                                  filename=filename,
+                                  message="val column can't have any cell greater than 100000 "
+                                          "for proportions"))
+        files.increment_checks(report, 1, proportion_files)
+
+        for filename in files.filenames[files.any(val.isnull())]:
+            report.add_raised_error(
+                ValidationFailure("check_val_missing",
+                                  filename=filename,
+                                  message="val column can't have any cell that is NA"))
+        files.increment_checks(report)
+
+        for filename in files.filenames[files.any(val < 0)]:
+            report.add_raised_error(
+                ValidationFailure("check_val_lt_0",
+                                  filename=filename,
+                                  message="val column can't have any cell smaller than 0"))
+        files.increment_checks(report)
+
+    @profile_check("check_bad_se")
+    def _check_bad_se_frame(self, all_frames, files, report):
+        """Check standard errors for all files; see `check_bad_se`."""
+        val = all_frames["val"]
+        sample_size = all_frames["sample_size"]
+        se = all_frames["se"].round(3)
+        se_upper_limit = ((val * sample_size + 50) / (sample_size + 1)).round(3)
+        in_range = (se > 0) & (se < 50) & (se <= se_upper_limit)
+
+        if self.params.missing_se_allowed:
+            for filename in files.filenames[files.any(~(se.isnull() | in_range))]:
+                report.add_raised_error(
+                    ValidationFailure("check_se_missing_or_in_range",
+                                      filename=filename,
+                                      message="se must be NA or in (0, min(50,val*(1+eps))]"))
+            files.increment_checks(report)
+        else:
+            for filename in files.filenames[files.any(~in_range)]:
+                report.add_raised_error(
+                    ValidationFailure("check_se_not_missing_and_in_range",
+                                      filename=filename,
+                                      message="se must be in (0, min(50,val*(1+eps))] and not "
+                                              "missing"))
+            files.increment_checks(report)
+
+            for filename in files.filenames[files.mean(se.isnull()) > 0.5]:
+                report.add_raised_error(
+                    ValidationFailure("check_se_many_missing",
+                                      filename=filename,
+                                      message='Recent se values are >50% NA'))
+            files.increment_checks(report)
+
+        se_zero = files.any(se == 0)
+        jeffreys = files.any((val == 0) & (se == 0))
+        for filename in files.filenames[jeffreys]:
+            report.add_raised_error(
+                ValidationFailure("check_se_0_when_val_0",
+                                  filename=filename,
+                                  message="when signal value is 0, se must be non-zero. please "
+                                  + "use Jeffreys correction to generate an appropriate se"
+                                  + " (see wikipedia.org/wiki/Binomial_proportion_confidence"
+                                  + "_interval#Jeffreys_interval for details)"))
+        for filename in files.filenames[se_zero & ~jeffreys]:
+            report.add_raised_error(
+                ValidationFailure("check_se_0",
+                                  filename=filename,
+                                  message="se must be non-zero"))
+        files.increment_checks(report)
+
+    @profile_check("check_bad_sample_size")
+    def _check_bad_sample_size_frame(self, all_frames, files, report):
+        """Check sample sizes for all files; see `check_bad_sample_size`."""
+        sample_size = all_frames["sample_size"]
+        minimum_sample_size = self.params.minimum_sample_size
+
+        if self.params.missing_sample_size_allowed:
+            bad = ~(sample_size.isnull() | (sample_size >= minimum_sample_size))
+            for filename in files.filenames[files.any(bad)]:
+                report.add_raised_error(
+                    ValidationFailure("check_n_missing_or_gt_min",
+                                      filename=filename,
+                                      message="sample size must be NA or >= "
+                                              f"{minimum_sample_size}"))
+            files.increment_checks(report)
+        else:
+            for filename in files.filenames[files.any(sample_size.isnull())]:
+                report.add_raised_error(
+                    ValidationFailure("check_n_missing",
+                                      filename=filename,
+                                      message="sample_size must not be NA"))
+            files.increment_checks(report)
+
+            for filename in files.filenames[files.any(sample_size < minimum_sample_size)]:
+                report.add_raised_error(
+                    ValidationFailure("check_n_gt_min",
+                                      filename=filename,
+                                      message="sample size must be >= "
+                                              f"{minimum_sample_size}"))
+            files.increment_checks(report)
+
+    @profile_check()
     def check_missing_date_files(self, daily_filenames, report):
         """
         Check for missing dates between the specified start and end dates.
@@ -103,6 +395,7 @@ class StaticValidator:
 
         report.increment_total_checks()
 
+    @profile_check()
     def check_df_format(self, df_to_test, nameformat, report):
         """
         Check basic format of source data CSV df.
@@ -150,6 +443,7 @@ class StaticValidator:
             valid_geos |= set(x + "000" for x in gmpr.get_geo_values("state_code"))
         return valid_geos
 
+    @profile_check()
     def check_bad_geo_id_value(self, df_to_test, filename, geo_type, report):
         """
         Check for bad geo_id values, by comparing to a list of known historical values.
@@ -180,6 +474,7 @@ class StaticValidator:
                             "is preferred."))
         report.increment_total_checks()
 
+    @profile_check()
     def check_bad_geo_id_format(self, df_to_test, nameformat, geo_type, report):
         """
         Check validity of geo_type and format of geo_ids, according to regex pattern.
@@ -245,6 +540,7 @@ class StaticValidator:
 
         report.increment_total_checks()
 
+    @profile_check()
     def check_bad_val(self, df_to_test, nameformat, signal_type, report):
         """
         Check value field for validity.
@@ -297,6 +593,7 @@ class StaticValidator:
 
         report.increment_total_checks()
 
+    @profile_check()
     def check_bad_se(self, df_to_test, nameformat, report):
         """
         Check standard errors for validity.
@@ -372,6 +669,7 @@ class StaticValidator:
         # Remove se_upper_limit column.
         df_to_test.drop(columns=["se_upper_limit"])
 
+    @profile_check()
     def check_bad_sample_size(self, df_to_test, nameformat, report):
         """
         Check sample sizes for validity.
@@ -420,6 +718,7 @@ class StaticValidator:
 
             report.increment_total_checks()
 
+    @profile_check()
     def check_duplicate_rows(self, data_df, filename, report):
         """
         Check if any rows are duplicated in a data set.
@@ -441,3 +740,60 @@ class StaticValidator:
                                   message="Some rows are duplicated, which may indicate data "
                                           "integrity issues"))
         report.increment_total_checks()
+
+
+class _FileGroups:
+    """Row-to-file bookkeeping for checks run over a combined frame.
+
+    Rows are assigned to files through the codes of the categorical `filename` column, so that
+    per-file reductions of row masks are single `np.bincount` calls.
+    """
+
+    def __init__(self, all_frames):
+        """Index the files of `all_frames`, a frame produced by `load_all_files`."""
+        filenames = all_frames["filename"].cat
+        self.codes = filenames.codes.to_numpy()
+        self.filenames = np.asarray(filenames.categories, dtype=object)
+        self.n_rows = np.bincount(self.codes, minlength=len(self.filenames))
+        matches = [FILENAME_REGEX.match(f) for f in self.filenames]
+        self.file_geo_types = np.array([m.group("geo_type") if m else "" for m in matches],
+                                       dtype=object)
+        self.signals = [m.group("signal") if m else "" for m in matches]
+        self.geo_types = sorted(set(self.file_geo_types))
+
+    def count(self, row_mask):
+        """Count the rows of each file for which `row_mask` holds."""
+        return np.bincount(self.codes, weights=np.asarray(row_mask, dtype=float),
+                           minlength=len(self.filenames))
+
+    def any(self, row_mask):
+        """Determine, for each file, whether `row_mask` holds for any of its rows."""
+        return self.count(row_mask) > 0
+
+    def mean(self, row_mask):
+        """Compute, for each file, the fraction of its rows for which `row_mask` holds."""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self.count(row_mask) / self.n_rows
+
+    def geo_type_file_mask(self, geo_type):
+        """Select the files with a given geo type."""
+        return self.file_geo_types == geo_type
+
+    def values_by_file(self, values, row_mask):
+        """List, for each file with any rows selected by `row_mask`, the selected `values`."""
+        rows = np.flatnonzero(np.asarray(row_mask, dtype=bool))
+        if len(rows) == 0:
+            return []
+        rows = rows[np.argsort(self.codes[rows], kind="stable")]
+        file_codes = self.codes[rows]
+        selected = np.asarray(values, dtype=object)[rows]
+        boundaries = np.flatnonzero(np.diff(file_codes)) + 1
+        return [(self.filenames[code], list(group))
+                for code, group in zip(file_codes[np.r_[0, boundaries]],
+                                       np.split(selected, boundaries))]
+
+    def increment_checks(self, report, checks_per_file=1, file_mask=None):
+        """Record `checks_per_file` checks for every file, or for those in `file_mask`."""
+        n_files = len(self.filenames) if file_mask is None else int(np.sum(file_mask))
+        for _ in range(checks_per_file * n_files):
+            report.increment_total_checks()
@@ -1,11 +1,13 @@
 # -*- coding: utf-8 -*-
 """Tools to validate CSV source data, including various check methods."""
-from .datafetcher import load_all_files
+from os.path import basename
+from .datafetcher import (FILENAME_REGEX, concat_files_frames, load_all_files, load_files_frame,
+                          make_date_filter, read_filenames, reference_provider_from_params)
 from .dynamic import DynamicValidator
 from .errors import ValidationFailure
 from .report import ValidationReport
 from .static import StaticValidator
-from .utils import aggregate_frames, TimeWindow
+from .utils import TimeWindow
 
 class Validator:
     """Class containing validation() function and supporting functions.
@@ -39,22 +41,121 @@ class Validator:
                                                   validation_params["common"]["span_length"])
 
         self.static_validation = StaticValidator(validation_params)
-        self.dynamic_validation = DynamicValidator(validation_params)
+        self.dynamic_validation = DynamicValidator(validation_params,
+                                                   reference_provider_from_params(params))
 
-    def validate(self):
+    def validate(self, changes=None):
         """
         Run all data checks.
 
         Arguments:
-            - export_dir: path to data CSVs
+            - changes: optional change set of the exports relative to the archive, as returned
+                by `ArchiveDiffer.diff_exports()`; when provided, static checks are only run on
+                new and changed files and dynamic checks only on the geo type-signal
+                combinations with new or changed files.  When None, all files are checked.
 
         Returns:
             - ValidationReport collating the validation outcomes
         """
         report = ValidationReport(self.suppressed_errors)
-        frames_list = load_all_files(self.export_dir, self.time_window.start_date,
-                                     self.time_window.end_date)
-        self.static_validation.validate(frames_list, report)
-        all_frames = aggregate_frames(frames_list)
-        self.dynamic_validation.validate(all_frames, report)
+        if changes is None:
+            all_frames = load_all_files(self.export_dir, self.time_window.start_date,
+                                        self.time_window.end_date)
+            self.static_validation.validate_frame(all_frames, report)
+            self.dynamic_validation.validate(all_frames, report)
+            return report
+
+        date_filter = make_date_filter(self.time_window.start_date, self.time_window.end_date)
+        export_files = [(f, m) for f, m in read_filenames(self.export_dir) if date_filter(m)]
+        changed_files = changed_filenames(changes) & {f for f, _ in export_files}
+        changed_combos = {(m.group("geo_type"), m.group("signal"))
+                          for f, m in export_files if f in changed_files}
+
+        # Dynamic checks need the full history of each changed combination, but static checks
+        # are only needed for the files that changed.
+        all_frames = load_files_frame(
+            self.export_dir,
+            [(f, m) for f, m in export_files
+             if (m.group("geo_type"), m.group("signal")) in changed_combos])
+        changed_frames = all_frames[all_frames["filename"].isin(changed_files)].copy()
+        changed_frames["filename"] = changed_frames["filename"].cat.set_categories(
+            sorted(f for f, _ in export_files if f in changed_files))
+
+        self.static_validation.validate_frame(changed_frames, report,
+                                              filenames=[f for f, _ in export_files])
+        self.dynamic_validation.validate(all_frames, report, sorted(changed_combos))
+        return report
+
+    def validate_batch(self, filenames, report, changes=None):
+        """
+        Run the per-file static checks on a batch of exported files.
+
+        Used to validate files while the indicator is still exporting others; once all files
+        are exported, `finish_batches` completes the validation.
+
+        Arguments:
+            - filenames: base names of exported files; files outside the time window are skipped
+            - report: ValidationReport to which the results of the checks are added
+            - changes: optional change set of the batch relative to the archive, as returned by
+                `ArchiveDiffer.diff_exports()`; when provided, only new and changed files are
+                checked
+
+        Returns:
+            - data of all files of the batch in the time window, to pass to `finish_batches`
+        """
+        date_filter = make_date_filter(self.time_window.start_date, self.time_window.end_date)
+        batch_files = [(f, m) for f, m in ((f, FILENAME_REGEX.match(f)) for f in filenames)
+                       if m and date_filter(m)]
+        batch_frames = load_files_frame(self.export_dir, batch_files)
+        if changes is None:
+            self.static_validation.validate_files(batch_frames, report)
+        else:
+            changed_files = changed_filenames(changes)
+            changed_frames = batch_frames[batch_frames["filename"].isin(changed_files)].copy()
+            changed_frames["filename"] = changed_frames["filename"].cat.set_categories(
+                sorted(f for f, _ in batch_files if f in changed_files))
+            self.static_validation.validate_files(changed_frames, report)
+        return batch_frames
+
+    def finish_batches(self, batch_frames, report, changes=None):
+        """
+        Run the checks that need all exported files, after all batches have been validated.
+
+        Arguments:
+            - batch_frames: list of the frames returned by `validate_batch` for every batch
+            - report: ValidationReport to which the results of the checks are added
+            - changes: optional change set of all exports relative to the archive; when
+                provided, dynamic checks are only run on the geo type-signal combinations with
+                new or changed files
+
+        Returns:
+            - the report
+        """
+        date_filter = make_date_filter(self.time_window.start_date, self.time_window.end_date)
+        export_files = [(f, m) for f, m in read_filenames(self.export_dir) if date_filter(m)]
+        self.static_validation.check_missing_date_files(export_files, report)
+
+        all_frames = concat_files_frames(batch_frames)
+        if changes is None:
+            self.dynamic_validation.validate(all_frames, report)
+        else:
+            changed_files = changed_filenames(changes)
+            changed_combos = {(m.group("geo_type"), m.group("signal"))
+                              for f, m in export_files if f in changed_files}
+            self.dynamic_validation.validate(all_frames, report, sorted(changed_combos))
         return report
+
+
+def changed_filenames(changes):
+    """
+    List the names of new and changed files in a change set.
+
+    Arguments:
+        - changes: change set as returned by `ArchiveDiffer.diff_exports()`
+
+    Returns:
+        - set of base names of files that are new or have a diff
+    """
+    _, common_diffs, new_files = changes
+    changed = [f for f, diff in common_diffs.items() if diff is not None] + list(new_files)
+    return {basename(f) for f in changed}
@@ -0,0 +1,305 @@
+"""Dedicated solver for the weekday effects of count signals.
+
+Indicators adjust count signals for day-of-week effects by fitting, for each numerator column,
+
+    log(numerator_t / denominator_t) = alpha_{wd(t)} + phi_t
+
+as a Poisson GLM with an L1 penalty on the third differences of phi (see the `Weekday` class of
+each indicator for the full model):
+
+    minimize  sum_t [exp(eta_t + log den_t) - num_t (eta_t + log den_t)] / T
+              + lam ** 2 / (T - 2) * ||diff(phi, 3)||_1,      eta = X beta,
+
+where beta = (alpha_0, ..., alpha_5, phi_0, ..., phi_{T-1}) and Sunday's effect is minus the sum
+of the other six.  `fit_weekday_params` solves this with a primal-dual interior-point method.  The
+third differences make every Newton system banded, up to the six weekday effects, so each
+iteration takes time linear in T.  A generic conic solver instead works on a T x T design matrix
+and an exponential cone per day.
+
+The parameters of a run can be saved with `save_weekday_params` and used by the next run to start
+the solver near the optimum, see `load_weekday_params`.
+"""
+import os
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+from scipy.linalg import solveh_banded
+
+# Coefficients of the third difference operator, diff(phi, 3)[j] = sum_r D3[r] * phi[j + r].
+D3 = np.array([-1.0, 3.0, -3.0, 1.0])
+N_WEEKDAY_PARAMS = 6
+
+
+def weekday_design(dayofweek: np.ndarray) -> np.ndarray:
+    """Return the weekday columns of the design matrix, one row per day.
+
+    Days other than Sunday (6) have a 1 in the column of their day of week; Sundays have -1 in
+    every column, so that the seven effects sum to zero.
+    """
+    dayofweek = np.asarray(dayofweek)
+    design = np.zeros((len(dayofweek), N_WEEKDAY_PARAMS))
+    not_sunday = np.where(dayofweek != 6)[0]
+    design[not_sunday, dayofweek[not_sunday]] = 1
+    design[dayofweek == 6, :] = -1
+    return design
+
+
+def weekday_factors(params: np.ndarray) -> np.ndarray:
+    """Return the multiplicative weekday effects exp(alpha_wd) of fitted parameters.
+
+    params holds the parameters of one numerator column in its last axis, as returned by
+    `fit_weekday_params`; the result has the same leading axes and one factor for each day of
+    week, Monday (0) to Sunday (6), so that counts are adjusted by dividing them by
+    `factors[..., dayofweek]`.
+    """
+    params = np.asarray(params, dtype=float)
+    effects = np.empty(params.shape[:-1] + (7,))
+    effects[..., :N_WEEKDAY_PARAMS] = params[..., :N_WEEKDAY_PARAMS]
+    effects[..., N_WEEKDAY_PARAMS] = -np.sum(params[..., :N_WEEKDAY_PARAMS], axis=-1)
+    return np.exp(effects)
+
+
+def _diff3_transpose(values: np.ndarray, n: int) -> np.ndarray:
+    """Multiply by the transpose of the third difference operator of a length n vector."""
+    out = np.zeros(n)
+    for r, coef in enumerate(D3):
+        out[r:r + len(values)] += coef * values
+    return out
+
+
+def _diff3_gram_banded(weights: np.ndarray, n: int) -> np.ndarray:
+    """Return D^T diag(weights) D in the upper banded form of `scipy.linalg.solveh_banded`."""
+    banded = np.zeros((len(D3), n))
+    for k in range(len(D3)):
+        for r in range(len(D3) - k):
+            banded[len(D3) - 1 - k, r + k:r + k + len(weights)] += weights * D3[r] * D3[r + k]
+    return banded
+
+
+def _diff3_gram_banded_rows(n_rows: int) -> np.ndarray:
+    """Return D D^T for a D with n_rows rows, in the upper banded form of `solveh_banded`."""
+    banded = np.zeros((len(D3), n_rows))
+    for k in range(len(D3)):
+        banded[len(D3) - 1 - k, k:] = np.dot(D3[:len(D3) - k], D3[k:])
+    return banded
+
+
+def weekday_objective(params: np.ndarray,
+                      nums: np.ndarray,
+                      denoms: np.ndarray,
+                      dayofweek: np.ndarray,
+                      lam: float = 10) -> float:
+    """Return the penalized objective of the weekday model at params (see module docstring)."""
+    n_days = len(nums)
+    offset = np.log(denoms)
+    eta = weekday_design(dayofweek) @ params[:N_WEEKDAY_PARAMS] + params[N_WEEKDAY_PARAMS:]
+    loss = np.sum(np.exp(eta + offset) - nums * (eta + offset)) / n_days
+    return loss + lam ** 2 / (n_days - 2) * np.abs(np.diff(params[N_WEEKDAY_PARAMS:], 3)).sum()
+
+
+def fit_weekday_params(nums: np.ndarray,  # pylint: disable=too-many-statements,too-many-branches
+                       denoms: np.ndarray,
+                       dayofweek: np.ndarray,
+                       lam: float = 10,
+                       init: Optional[np.ndarray] = None,
+                       tol: float = 1e-9,
+                       max_iter: int = 200) -> np.ndarray:
+    """Fit the weekday effects of one numerator column.
+
+    Parameters
+    ----------
+    nums: np.ndarray
+        Numerator of every day.
+    denoms: np.ndarray
+        Denominator of every day; must be positive.
+    dayofweek: np.ndarray
+        Day of week of every day, from 0 (Monday) to 6 (Sunday).
+    lam: float
+        Penalty parameter of the model.
+    init: Optional[np.ndarray]
+        Parameters from which to start the solver, e.g. those of the previous run; by default,
+        the log of the ratio of numerator to denominator.
+    tol: float
+        Tolerance on the duality gap and on the optimality conditions, relative to the size of
+        the objective.
+    max_iter: int
+        Maximum number of Newton steps.
+
+    Returns
+    -------
+    np.ndarray
+        The 6 weekday effects (Monday to Saturday) followed by the T values of phi.
+
+    Raises
+    ------
+    RuntimeError
+        If the solver does not converge within max_iter steps, or the Newton systems become
+        singular.
+    """
+    nums = np.asarray(nums, dtype=float)
+    denoms = np.asarray(denoms, dtype=float)
+    n_days = len(nums)
+    if n_days < len(D3) + 1:
+        raise ValueError(f"Need at least {len(D3) + 1} days to fit weekday effects.")
+    if np.any(denoms <= 0):
+        raise ValueError("Denominators must be positive to fit weekday effects.")
+    design = weekday_design(dayofweek)
+    offset = np.log(denoms)
+    penalty = lam ** 2 / (n_days - 2)
+    n_diffs = n_days - len(D3) + 1
+
+    if init is None:
+        alpha = np.zeros(N_WEEKDAY_PARAMS)
+        phi = np.log((nums + 0.5) / denoms)
+    else:
+        alpha = np.array(init[:N_WEEKDAY_PARAMS], dtype=float)
+        phi = np.array(init[N_WEEKDAY_PARAMS:], dtype=float)
+
+    # |diff(phi, 3)| <= slack, with dual variables dual_pos for diff <= slack and dual_neg for
+    # -diff <= slack; the objective penalizes the sum of the slacks.
+    diff = np.diff(phi, 3)
+    if init is None:
+        slack = np.abs(diff) + np.maximum(1e-3 * np.abs(diff), 1e-6)
+        dual_pos = np.full(n_diffs, penalty / 2)
+        dual_neg = np.full(n_diffs, penalty / 2)
+    else:
+        # At the optimum, the dual of the penalty (dual_pos - dual_neg) balances the gradient
+        # of the loss in phi, so take its least squares solution at init, and start at a
+        # duality gap close to the tolerance.
+        with np.errstate(over="ignore"):
+            mu = np.exp(design @ alpha + phi + offset) / n_days
+        dual = solveh_banded(_diff3_gram_banded_rows(n_diffs), -np.diff(mu - nums / n_days, 3))
+        dual = np.clip(dual, -0.99 * penalty, 0.99 * penalty)
+        dual_pos, dual_neg = (penalty + dual) / 2, (penalty - dual) / 2
+        gap = 10 * tol * max(1.0, np.sum(mu))
+        slack = np.abs(diff) + gap / n_diffs / np.minimum(dual_pos, dual_neg)
+
+    def residuals(alpha, phi, slack, dual_pos, dual_neg, inv_t):
+        with np.errstate(over="ignore"):
+            grad = (np.exp(design @ alpha + phi + offset) - nums) / n_days
+        diff = np.diff(phi, 3)
+        cons_pos, cons_neg = diff - slack, -diff - slack
+        return (
+            (design.T @ grad, grad + _diff3_transpose(dual_pos - dual_neg, n_days),
+             penalty - dual_pos - dual_neg),
+            (-dual_pos * cons_pos - inv_t, -dual_neg * cons_neg - inv_t),
+            (cons_pos, cons_neg)
+        )
+
+    def norm(parts):
+        return np.sqrt(sum(np.sum(part ** 2) for part in parts))
+
+    for _ in range(max_iter):
+        gap = dual_pos @ (slack - diff) + dual_neg @ (slack + diff)
+        inv_t = gap / (10 * 2 * n_diffs)
+        r_dual, r_cent, (cons_pos, cons_neg) = residuals(alpha, phi, slack, dual_pos,
+                                                         dual_neg, inv_t)
+        mu = np.exp(design @ alpha + phi + offset) / n_days
+        scale = max(1.0, np.sum(mu))
+        if gap <= tol * scale and norm(r_dual) <= tol * scale:
+            return np.concatenate([alpha, phi])
+
+        # Newton step, eliminating the slacks and the dual variables
+        d_pos, d_neg = dual_pos / -cons_pos, dual_neg / -cons_neg
+        rhs_alpha = -r_dual[0]
+        rhs_slack = -r_dual[2] + r_cent[0] / cons_pos + r_cent[1] / cons_neg
+        rhs_phi = -r_dual[1] - _diff3_transpose(r_cent[0] / cons_pos - r_cent[1] / cons_neg,
+                                                n_days)
+        ratio = (d_neg - d_pos) / (d_pos + d_neg)
+        rhs_phi -= _diff3_transpose(ratio * rhs_slack, n_days)
+        banded = _diff3_gram_banded(4 * d_pos * d_neg / (d_pos + d_neg), n_days)
+        banded[-1] += mu
+        weighted_design = mu[:, None] * design
+        try:
+            solved = solveh_banded(banded, np.column_stack([rhs_phi, weighted_design]))
+            schur = design.T @ weighted_design - weighted_design.T @ solved[:, 1:]
+            step_alpha = np.linalg.solve(schur, rhs_alpha - weighted_design.T @ solved[:, 0])
+        except np.linalg.LinAlgError:
+            # e.g. no finite optimum, when a numerator is 0 on every day
+            break
+        step_phi = solved[:, 0] - solved[:, 1:] @ step_alpha
+        step_diff = np.diff(step_phi, 3)
+        step_slack = (rhs_slack - (d_neg - d_pos) * step_diff) / (d_pos + d_neg)
+        step_pos = (r_cent[0] - dual_pos * (step_diff - step_slack)) / cons_pos
+        step_neg = (r_cent[1] - dual_neg * (-step_diff - step_slack)) / cons_neg
+
+        # largest step keeping the dual variables positive, then backtrack until the
+        # constraints are strictly satisfied and the residuals decrease
+        step = 1.0
+        for dual, step_dual in [(dual_pos, step_pos), (dual_neg, step_neg)]:
+            shrinking = step_dual < 0
+            if shrinking.any():
+                step = min(step, np.min(-dual[shrinking] / step_dual[shrinking]))
+        step *= 0.99
+        res_norm = norm(r_dual + r_cent)
+        while step > 1e-12:
+            new = (alpha + step * step_alpha, phi + step * step_phi, slack + step * step_slack,
+                   dual_pos + step * step_pos, dual_neg + step * step_neg)
+            new_dual, new_cent, new_cons = residuals(*new, inv_t)
+            if max(np.max(new_cons[0]), np.max(new_cons[1])) < 0 and \
+                    norm(new_dual + new_cent) <= (1 - 0.01 * step) * res_norm:
+                break
+            step /= 2
+        else:
+            break
+        alpha, phi, slack, dual_pos, dual_neg = new
+        diff = np.diff(phi, 3)
+
+    raise RuntimeError("Weekday effects did not converge.")
+
+
+def load_weekday_params(cache_file: str, dates: Sequence) -> Optional[np.ndarray]:
+    """Load the parameters saved by a previous run, aligned to the dates of this run.
+
+    The weekday effects are kept; phi is kept on the dates of both runs, and carried from the
+    nearest date of the previous run to the others.
+
+    Parameters
+    ----------
+    cache_file: str
+        File written by `save_weekday_params`.
+    dates: Sequence
+        Consecutive days of this run.
+
+    Returns
+    -------
+    Optional[np.ndarray]
+        Array with one row of parameters per numerator column, or None if the file does not
+        exist or does not share a date with this run.
+    """
+    if not os.path.exists(cache_file):
+        return None
+    with np.load(cache_file) as cached:
+        cached_dates = pd.DatetimeIndex(cached["dates"])
+        cached_params = cached["params"]
+    dates = pd.DatetimeIndex(dates)
+    if len(cached_dates) == 0 or len(dates) == 0 or \
+            dates[-1] < cached_dates[0] or dates[0] > cached_dates[-1]:
+        return None
+    positions = np.clip(cached_dates.searchsorted(dates), 0, len(cached_dates) - 1)
+    # dates before the first cached date take its value, dates after the last take the last
+    return np.hstack([cached_params[:, :N_WEEKDAY_PARAMS],
+                      cached_params[:, N_WEEKDAY_PARAMS:][:, positions]])
+
+
+def save_weekday_params(cache_file: str, dates: Sequence, params: np.ndarray):
+    """Save the parameters of this run for `load_weekday_params`.
+
+    Parameters
+    ----------
+    cache_file: str
+        File to write; its directory is created if needed.
+    dates: Sequence
+        Consecutive days of the parameters.
+    params: np.ndarray
+        Array with one row of parameters per numerator column.
+    """
+    directory = os.path.dirname(cache_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # write to a temporary file first so that an interrupted run leaves the old file intact
+    tmp_file = f"{cache_file}.tmp.npz"
+    np.savez(tmp_file, dates=pd.DatetimeIndex(dates).values.astype("datetime64[D]"),
+             params=np.atleast_2d(params))
+    os.replace(tmp_file, cache_file)
@@ -17,6 +17,7 @@ required = [
     "pylint",
     "pytest",
     "pytest-cov",
+    "scipy",
     "slackclient",
     "structlog",
     "xlrd"
@@ -73,6 +73,29 @@ class TestArchiveDiffer:
         with pytest.raises(NotImplementedError):
             arch_diff.archive_exports(None)
 
+    def test_diff_exports_subset(self, tmp_path):
+        cache_dir = join(str(tmp_path), "cache")
+        export_dir = join(str(tmp_path), "export")
+        mkdir(cache_dir)
+        mkdir(export_dir)
+        for csv_name, df in CSVS_BEFORE.items():
+            df.to_csv(join(cache_dir, f"{csv_name}.csv"), index=False)
+        for csv_name, df in CSVS_AFTER.items():
+            df.to_csv(join(export_dir, f"{csv_name}.csv"), index=False)
+        arch_diff = ArchiveDiffer(cache_dir, export_dir)
+        arch_diff._cache_updated = True
+
+        deleted_files, common_diffs, new_files = arch_diff.diff_exports(["csv1.csv"])
+
+        # Deleted files are found across all exports, but only the given files are diffed
+        assert deleted_files == [join(cache_dir, "csv2.csv")]
+        assert common_diffs == {join(export_dir, "csv1.csv"): join(export_dir, "csv1.csv.diff")}
+        assert new_files == []
+
+        _, common_diffs, new_files = arch_diff.diff_exports(["csv3.csv"])
+        assert common_diffs == {}
+        assert new_files == [join(export_dir, "csv3.csv")]
+
     def test_diff_and_filter_exports(self, tmp_path):
         cache_dir = join(str(tmp_path), "cache")
         export_dir = join(str(tmp_path), "export")
@@ -0,0 +1,71 @@
+"""Tests for delphi_utils.dtypes."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from delphi_utils import apply_dtype_policy
+from delphi_utils.dtypes import memory_usage
+
+
+class RecordingLogger:
+    def __init__(self):
+        self.events = []
+
+    def info(self, event, **kwargs):
+        self.events.append((event, kwargs))
+
+
+class TestApplyDtypePolicy:
+    """Tests for apply_dtype_policy."""
+
+    DF = pd.DataFrame({
+        "fips": ["01001", "01003", "01001", "06001"] * 50,
+        "date": ["2020-06-01", "2020-06-01", "2020-06-02", "2020-06-02"] * 50,
+        "count": [1, 2, 3, 4] * 50,
+        "count_na": [1.0, np.nan, 3.0, 4.0] * 50,
+        "rate": [0.5, 0.25, 1.0, 2.0] * 50,
+        "other": ["a", "b", "c", "d"] * 50,
+    })
+
+    def test_policy(self):
+        logger = RecordingLogger()
+        df = apply_dtype_policy(
+            self.DF, {"fips": "category", "date": "date", "count": "count",
+                      "count_na": "count", "rate": "float"}, logger=logger)
+        assert df["fips"].dtype == "category"
+        assert df["date"].dtype == "datetime64[ns]"
+        assert df["count"].dtype == np.int32
+        assert df["count_na"].dtype == np.float32
+        assert df["rate"].dtype == np.float32
+        assert df["other"].dtype == object
+        assert (df["fips"].astype(str) == self.DF["fips"]).all()
+        assert np.array_equal(df["count_na"], self.DF["count_na"], equal_nan=True)
+        assert self.DF["count"].dtype == np.int64
+
+        event, report = logger.events[0]
+        assert event == "Applied dtype policy"
+        assert report["bytes_before"] == memory_usage(self.DF)
+        assert report["bytes_after"] == memory_usage(df) < report["bytes_before"]
+
+    def test_guards(self):
+        df = pd.DataFrame({
+            "big": [1, 2 ** 31, 0],
+            "fractional": [0.5, 1.0, 0.0],
+            "big_na": [2.0 ** 24, 1.0, np.nan],
+            "precise": [0.1, 0.2, 0.0],
+        })
+        lean = apply_dtype_policy(df, {"big": "count", "fractional": "count",
+                                       "big_na": "count", "precise": "float"})
+        pd.testing.assert_frame_equal(lean, df)
+
+        # Sums of int32 counts do not overflow.
+        df = apply_dtype_policy(pd.DataFrame({"g": [0, 0], "n": [2 ** 31 - 1] * 2}),
+                                {"n": "count"})
+        assert df["n"].dtype == np.int32
+        assert df.groupby("g")["n"].sum()[0] == 2 ** 32 - 2
+
+    def test_bad_inputs(self):
+        with pytest.raises(ValueError):
+            apply_dtype_policy(self.DF, {"count": "int"})
+        with pytest.raises(ValueError):
+            apply_dtype_policy(self.DF, {"other": "count"})
@@ -5,6 +5,7 @@ from os.path import join
 
 import pandas as pd
 from delphi_utils import create_export_csv
+from delphi_utils.export import export_listener
 
 def _clean_directory(directory):
     """Clean files out of a directory."""
@@ -69,6 +70,23 @@ class TestExport:
             ]
         )
 
+    def test_export_listener(self):
+        """Test that listeners are notified of the files written by each export."""
+        _clean_directory(self.TEST_DIR)
+        batches = []
+
+        with export_listener(lambda export_dir, filenames: batches.append((export_dir, filenames))):
+            create_export_csv(df=self.DF, export_dir=self.TEST_DIR, geo_res="county",
+                              sensor="test")
+            create_export_csv(df=self.DF, export_dir=self.TEST_DIR, geo_res="state",
+                              sensor="test", start_date=datetime(2020, 3, 1))
+        create_export_csv(df=self.DF, export_dir=self.TEST_DIR, geo_res="msa", sensor="test")
+
+        assert batches == [
+            (self.TEST_DIR, ["20200215_county_test.csv", "20200301_county_test.csv",
+                             "20200315_county_test.csv"]),
+            (self.TEST_DIR, ["20200301_state_test.csv", "20200315_state_test.csv"])]
+
     def test_export_rounding(self):
         """Test that exporting CSVs with the `metrics` argument yields the correct files."""
 
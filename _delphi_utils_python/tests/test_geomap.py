@@ -135,6 +135,12 @@ class TestGeoMapper:
     # jhu_big_data = pd.read_csv("test_dir/small_deaths.csv")
 
     # Loading tests updated 8/26
+    def test_warm_cache(self):
+        GeoMapper.warm_cache([("fips", "state")])
+        shared = GeoMapper().crosswalks["fips"]["state"]
+        assert shared is not None
+        assert GeoMapper().crosswalks["fips"]["state"] is shared
+
     def test_crosswalks(self):
         # These tests ensure that the one-to-many crosswalks have properly normalized weights
         gmpr = GeoMapper()
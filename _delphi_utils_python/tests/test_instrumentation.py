@@ -0,0 +1,107 @@
+"""Tests for delphi_utils.instrumentation."""
+import json
+import time
+
+import pytest
+
+from delphi_utils.instrumentation import RSS_SAMPLE_SECONDS, PipelineProfiler, profile_stage
+
+
+class TestPipelineProfiler:
+    """Tests for the PipelineProfiler class."""
+
+    def test_stage_metrics(self, tmp_path):
+        """Test that a stage records time, memory, and files written to watched directories."""
+        (tmp_path / "old.csv").write_text("unchanged")
+        profiler = PipelineProfiler([str(tmp_path), None])
+
+        with profiler.stage("indicator") as metrics:
+            (tmp_path / "a.csv").write_text("12345")
+            (tmp_path / "b.csv").write_text("123")
+            sum(range(100000))
+
+        assert profiler.stages == [metrics]
+        assert metrics.name == "indicator"
+        assert metrics.parent is None
+        assert metrics.files_written == 2
+        assert metrics.bytes_written == 8
+        assert metrics.wall_time_seconds > 0
+        assert metrics.cpu_time_seconds >= 0
+        assert metrics.peak_rss_bytes > 0
+        assert metrics.process_peak_rss_bytes > 0
+        assert not metrics.failed
+
+    def test_stage_rss(self):
+        """Test that each stage reports its own peak resident set size."""
+        np = pytest.importorskip("numpy")
+        profiler = PipelineProfiler()
+        with profiler.stage("heavy") as heavy:
+            data = np.ones(50_000_000)  # 400 MB
+            time.sleep(5 * RSS_SAMPLE_SECONDS)  # held for several samples
+            del data
+        with profiler.stage("light") as light:
+            sum(range(100000))
+
+        if heavy.peak_rss_bytes == 0:
+            pytest.skip("resident set size cannot be read on this platform")
+        assert heavy.peak_rss_bytes - light.peak_rss_bytes > 300_000_000
+        assert abs(heavy.rss_change_bytes) < 100_000_000
+        # the process-lifetime peak still includes the heavy stage
+        assert light.process_peak_rss_bytes > 400_000_000
+
+    def test_sub_stages(self):
+        """Test that profile_stage records into the enclosing stage's profiler."""
+        profiler = PipelineProfiler()
+        with profiler.stage("indicator"):
+            with profile_stage("pull"):
+                with profile_stage("geo_map"):
+                    pass
+            with profile_stage("export"):
+                pass
+
+        assert [(m.name, m.parent) for m in profiler.stages] == [
+            ("indicator", None),
+            ("indicator/pull", "indicator"),
+            ("indicator/pull/geo_map", "indicator/pull"),
+            ("indicator/export", "indicator")]
+
+    def test_profile_stage_inactive(self):
+        """Test that profile_stage does nothing outside of a profiled stage."""
+        with profile_stage("pull") as metrics:
+            pass
+        assert metrics is None
+
+    def test_failed_stage(self):
+        """Test that a stage raising an exception is still recorded."""
+        profiler = PipelineProfiler()
+        with pytest.raises(ValueError):
+            with profiler.stage("indicator"):
+                raise ValueError("bad")
+        assert profiler.stages[0].failed
+        with profile_stage("pull") as metrics:
+            assert metrics is None
+
+    def test_output(self, tmp_path):
+        """Test that the profile is logged and written as JSON."""
+        profiler = PipelineProfiler()
+        with profiler.stage("indicator"):
+            with profile_stage("pull"):
+                pass
+
+        logged = []
+        class FakeLogger:
+            def info(self, msg, **kwargs):
+                logged.append((msg, kwargs))
+        profiler.log(FakeLogger())
+        assert [kwargs["name"] for _, kwargs in logged] == ["indicator", "indicator/pull"]
+        assert all(msg == "Pipeline stage profile" for msg, _ in logged)
+
+        path = profiler.write_json(str(tmp_path / "profiles"))
+        with open(path) as profile_file:
+            profile = json.load(profile_file)
+        assert profile["start_time"] == profiler.start_time.isoformat()
+        assert [stage["name"] for stage in profile["stages"]] == ["indicator", "indicator/pull"]
+        assert set(profile["stages"][0]) == {
+            "name", "parent", "wall_time_seconds", "cpu_time_seconds", "peak_rss_bytes",
+            "rss_change_bytes", "process_peak_rss_bytes", "files_written", "bytes_written",
+            "failed"}
@@ -0,0 +1,176 @@
+"""Tests for delphi_utils.logger."""
+import json
+import logging
+import multiprocessing
+import queue
+import threading
+
+import pytest
+
+from delphi_utils.logger import LogListener, get_structured_logger, init_worker_logging
+
+
+def _log_from_worker(i):
+    logger = get_structured_logger("test_logger.worker", log_exceptions=False)
+    logger.info("Worker progress", item=i)
+    return i
+
+
+def _log_root_from_worker(i):
+    logging.warning("Root progress %d", i)
+    return i
+
+
+def _log_many_from_worker(i):
+    for j in range(100):
+        logging.warning("Root progress %d %d", i, j)
+    return i
+
+
+@pytest.fixture(autouse=True)
+def reset_worker_logging():
+    """Make sure no test leaves the process logging to a queue."""
+    yield
+    init_worker_logging(None)
+
+
+def read_lines(path):
+    with open(path) as log_file:
+        return [json.loads(line) for line in log_file]
+
+
+class TestLogListener:
+    """Tests for queued logging through a LogListener."""
+
+    def test_queued_logging(self, tmp_path):
+        """Test that events sent to the queue are written to the file once stopped."""
+        log_file = tmp_path / "log.txt"
+        with LogListener(str(log_file), flush_interval=0.01) as listener:
+            logger = get_structured_logger("test_logger.queued", log_queue=listener.queue,
+                                           log_exceptions=False)
+            for i in range(5):
+                logger.info("Progress", geo="ca", item=i)
+            logger.debug("Not written")
+
+        lines = read_lines(log_file)
+        assert [line["item"] for line in lines] == list(range(5))
+        assert all(line["event"] == "Progress" and line["level"] == "info" for line in lines)
+        assert lines[0]["logger"] == "test_logger.queued"
+
+    def test_batches(self, tmp_path):
+        """Test that queued events are written in batches of at most batch_size."""
+        q = queue.Queue()
+        logger = get_structured_logger("test_logger.batches", log_queue=q, log_exceptions=False)
+        for i in range(25):
+            logger.info("Progress", item=i)
+        q.put(None)
+        writes = []
+        log_file = tmp_path / "log.txt"
+        listener = LogListener(str(log_file), batch_size=10, log_queue=q)
+
+        class RecordingStream:
+            def write(self, lines):
+                writes.append(lines.count("\n"))
+
+            def flush(self):
+                pass
+
+        with pytest.MonkeyPatch.context() as mp:
+            mp.setattr("sys.stderr", RecordingStream())
+            listener.start()._thread.join()  # pylint: disable=protected-access
+        assert writes == [10, 10, 5]
+        assert len(read_lines(log_file)) == 25
+
+    def test_worker_logging(self, tmp_path):
+        """Test that events logged in pool workers are written by the parent."""
+        log_file = tmp_path / "log.txt"
+        with LogListener(str(log_file), flush_interval=0.01) as listener:
+            with multiprocessing.Pool(2, initializer=init_worker_logging,
+                                      initargs=(listener.queue,)) as pool:
+                assert pool.map(_log_from_worker, range(10)) == list(range(10))
+                pool.close()
+                pool.join()
+
+        lines = read_lines(log_file)
+        assert sorted(line["item"] for line in lines) == list(range(10))
+        assert all(line["logger"] == "test_logger.worker" for line in lines)
+
+    def test_worker_root_logging(self, tmp_path):
+        """Test that events logged with the logging module in pool workers are queued too."""
+        log_file = tmp_path / "log.txt"
+        with LogListener(str(log_file), flush_interval=0.01) as listener:
+            with multiprocessing.Pool(2, initializer=init_worker_logging,
+                                      initargs=(listener.queue,)) as pool:
+                assert pool.map(_log_root_from_worker, range(10)) == list(range(10))
+                pool.close()
+                pool.join()
+
+        with open(log_file) as f:
+            assert sorted(f.read().splitlines()) == sorted(f"Root progress {i}" for i in range(10))
+
+    def test_heavy_worker_logging(self, tmp_path):
+        """Test that a pool logging heavily is closed and the listener stopped, losing no events."""
+        log_file = tmp_path / "log.txt"
+
+        def run_pool():
+            with LogListener(str(log_file), flush_interval=0.01) as listener:
+                with multiprocessing.Pool(4, initializer=init_worker_logging,
+                                          initargs=(listener.queue,)) as pool:
+                    pool.map(_log_many_from_worker, range(16), chunksize=1)
+                    pool.close()
+                    pool.join()
+
+        run = threading.Thread(target=run_pool, daemon=True)
+        run.start()
+        run.join(timeout=60)
+        assert not run.is_alive()
+        with open(log_file) as f:
+            assert sorted(f.read().splitlines()) == \
+                sorted(f"Root progress {i} {j}" for i in range(16) for j in range(100))
+
+    def test_switch_modes(self, tmp_path):
+        """Test that a logger switched between a file and a queue writes each event once."""
+        log_file = tmp_path / "log.txt"
+        queued_file = tmp_path / "queued.txt"
+        name = "test_logger.switched"
+        get_structured_logger(name, filename=str(log_file), log_exceptions=False).info("Direct")
+        with LogListener(str(queued_file), flush_interval=0.01) as listener:
+            logger = get_structured_logger(name, log_queue=listener.queue, log_exceptions=False)
+            logger.info("Queued")
+        logger = get_structured_logger(name, filename=str(log_file), log_exceptions=False)
+        logger.info("Direct again")
+
+        assert [line["event"] for line in read_lines(log_file)] == ["Direct", "Direct again"]
+        assert [line["event"] for line in read_lines(queued_file)] == ["Queued"]
+        assert logging.getLogger(name).propagate
+
+
+class TestDebugSampling:
+    """Tests for sampling of debug events."""
+
+    def test_sampled(self, tmp_path):
+        """Test that only a fraction of debug events is kept, and all other events."""
+        log_file = tmp_path / "log.txt"
+        with LogListener(str(log_file), flush_interval=0.01) as listener:
+            logger = get_structured_logger("test_logger.sampled", log_queue=listener.queue,
+                                           log_exceptions=False, debug_sample_rate=0.1)
+            for i in range(1000):
+                logger.debug("Fit", item=i)
+            logger.info("Done")
+
+        lines = read_lines(log_file)
+        assert lines[-1]["event"] == "Done"
+        assert 30 < len(lines) - 1 < 200
+        assert all(line["level"] == "debug" for line in lines[:-1])
+
+    def test_all_or_none(self, tmp_path):
+        """Test that sample rates of 1 and 0 keep all and no debug events."""
+        log_file = tmp_path / "log.txt"
+        with LogListener(str(log_file), flush_interval=0.01) as listener:
+            for rate in [0, 1]:
+                logger = get_structured_logger(f"test_logger.rate{rate}",
+                                               log_queue=listener.queue,
+                                               log_exceptions=False, debug_sample_rate=rate)
+                for i in range(10):
+                    logger.debug("Fit", item=i)
+        assert [line["logger"] for line in read_lines(log_file)] == ["test_logger.rate1"] * 10
@@ -0,0 +1,83 @@
+"""Tests for orchestrator.py."""
+import json
+from os import mkdir
+from os.path import join
+
+import mock
+import pytest
+
+from delphi_utils.orchestrator import parse_indicator, run_indicators
+
+RUN_MODULE = '''
+import json
+import os
+import pandas as pd
+from delphi_utils import GeoMapper, create_export_csv
+
+def run_module(params):
+    if params["indicator"].get("fail"):
+        raise ValueError("indicator failed")
+    mapper = GeoMapper()
+    create_export_csv(
+        pd.DataFrame({"geo_id": ["pa"], "timestamp": ["2020-09-01"], "val": [1.0],
+                      "se": [0.1], "sample_size": [100.0]}),
+        params["common"]["export_dir"], "state", "sig")
+    with open("run.json", "w") as f:
+        json.dump({"pid": os.getpid(),
+                   "warm": mapper.crosswalks["zip"]["fips"] is not None}, f)
+'''
+
+
+@pytest.fixture
+def indicators(tmp_path, monkeypatch):
+    """Create three fake indicator packages, the last of which fails."""
+    monkeypatch.syspath_prepend(str(tmp_path))
+    specs = []
+    for name in ["fake_indicator_a", "fake_indicator_b", "fake_indicator_c"]:
+        package_dir = tmp_path / name
+        mkdir(package_dir)
+        (package_dir / "__init__.py").write_text("from . import run\n")
+        (package_dir / "run.py").write_text(RUN_MODULE)
+        mkdir(package_dir / "receiving")
+        (package_dir / "params.json").write_text(json.dumps({
+            "common": {"export_dir": "./receiving"},
+            "indicator": {"fail": name.endswith("c")}}))
+        specs.append(f"{name}={package_dir}")
+    return specs
+
+
+class TestOrchestrator:
+    """Tests for running several indicators."""
+
+    def test_parse_indicator(self):
+        """Test that indicator specifications are split into package and directory."""
+        assert parse_indicator("delphi_quidel") == ("delphi_quidel", ".")
+        assert parse_indicator("delphi_quidel=../quidel") == ("delphi_quidel", "../quidel")
+
+    def test_run_indicators(self, indicators, tmp_path):
+        """Test that all indicators run in shared workers and their profiles are combined."""
+        logger = mock.Mock()
+        profile_file = str(tmp_path / "profile.json")
+
+        profile = run_indicators([parse_indicator(spec) for spec in indicators],
+                                 max_workers=2, profile_file=profile_file, logger=logger)
+
+        summaries = profile["indicators"]
+        assert [s["indicator"] for s in summaries] == \
+            ["fake_indicator_a", "fake_indicator_b", "fake_indicator_c"]
+        assert [s["status"] for s in summaries] == ["success", "success", "failed"]
+        assert "indicator failed" in summaries[2]["error"]
+        assert profile["max_workers"] == 2
+        assert len({s["worker_pid"] for s in summaries}) <= 2
+        assert [stage["name"] for stage in summaries[0]["stages"]] == ["indicator"]
+        assert summaries[0]["stages"][0]["files_written"] == 1
+
+        for name in ["fake_indicator_a", "fake_indicator_b"]:
+            with open(join(str(tmp_path), name, "run.json")) as f:
+                run = json.load(f)
+            assert run["warm"]
+            assert (tmp_path / name / "receiving" / "20200901_state_sig.csv").exists()
+
+        with open(profile_file) as f:
+            assert json.load(f) == profile
+        assert logger.info.call_count == 4
@@ -0,0 +1,105 @@
+"""Tests for the SignalPanel container."""
+from datetime import datetime
+from os import listdir
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from delphi_utils import GeoMapper, SignalPanel, Smoother, create_export_csv
+
+
+class TestSignalPanel:
+    """Tests for SignalPanel."""
+
+    DF = pd.DataFrame({
+        "geo_id": ["01001", "01003", "01001", "06001", "06001"],
+        "timestamp": pd.to_datetime(
+            ["2020-06-01", "2020-06-01", "2020-06-03", "2020-06-02", "2020-06-03"]),
+        "num": [1.0, 2.0, 3.0, 4.0, np.nan],
+        "den": [10.0, 20.0, 30.0, 40.0, 50.0],
+    })
+
+    def test_from_frame(self):
+        panel = SignalPanel.from_frame(self.DF)
+        assert list(panel.geo_ids) == ["01001", "01003", "06001"]
+        assert list(panel.dates) == list(pd.date_range("2020-06-01", "2020-06-03"))
+        assert set(panel.fields) == {"num", "den"}
+        assert np.array_equal(panel["num"], [[1, np.nan, 3], [2, np.nan, np.nan],
+                                             [np.nan, 4, np.nan]], equal_nan=True)
+        pd.testing.assert_frame_equal(
+            panel.to_frame(),
+            self.DF.sort_values(["geo_id", "timestamp"]).reset_index(drop=True))
+
+    def test_bad_inputs(self):
+        with pytest.raises(ValueError):
+            SignalPanel.from_frame(pd.concat([self.DF, self.DF]))
+        with pytest.raises(ValueError):
+            SignalPanel(["a"], pd.to_datetime(["2020-06-01", "2020-06-03"]), {})
+        with pytest.raises(ValueError):
+            SignalPanel(["a"], pd.date_range("2020-06-01", "2020-06-02"),
+                        {"count": np.zeros((1, 2))})
+        with pytest.raises(ValueError):
+            SignalPanel(["a"], pd.date_range("2020-06-01", "2020-06-02"),
+                        {"num": np.zeros((1, 3))})
+
+    def test_window(self):
+        panel = SignalPanel.from_frame(self.DF)
+        window = panel.window(datetime(2020, 6, 2), datetime(2020, 6, 10))
+        assert list(window.dates) == list(pd.date_range("2020-06-02", "2020-06-03"))
+        assert np.shares_memory(window["num"], panel["num"])
+        assert np.array_equal(window["den"], panel["den"][:, 1:], equal_nan=True)
+
+    def test_aggregate_geo(self):
+        gmpr = GeoMapper()
+        panel = SignalPanel.from_frame(self.DF).aggregate_geo(gmpr, "fips", "state_id")
+        expected = gmpr.replace_geocode(self.DF.rename(columns={"geo_id": "fips"}), "fips",
+                                        "state_id", new_col="geo_id", date_col="timestamp")
+        pd.testing.assert_frame_equal(
+            panel.to_frame(),
+            expected.sort_values(["geo_id", "timestamp"]).reset_index(drop=True),
+            check_like=True)
+
+        # Weighted crosswalk
+        panel = SignalPanel.from_frame(self.DF).aggregate_geo(gmpr, "fips", "hrr")
+        expected = gmpr.replace_geocode(self.DF.rename(columns={"geo_id": "fips"}), "fips",
+                                        "hrr", new_col="geo_id", date_col="timestamp")
+        pd.testing.assert_frame_equal(
+            panel.to_frame(),
+            expected.sort_values(["geo_id", "timestamp"]).reset_index(drop=True),
+            check_like=True)
+
+    def test_smooth(self):
+        rng = np.random.default_rng(0)
+        values = rng.random((5, 40))
+        values[1, :3] = np.nan
+        values[2, 10] = np.nan
+        panel = SignalPanel(list("abcde"), pd.date_range("2020-06-01", periods=40),
+                            {"val": values})
+        smoother = Smoother("savgol", window_length=7)
+        smoothed = panel.smooth(smoother, "val", out_field="se")
+        assert smoothed["val"] is panel["val"]
+        for row in range(5):
+            assert np.allclose(smoothed["se"][row], smoother.smooth(values[row]),
+                               equal_nan=True)
+
+    def test_export_csv(self, tmp_path):
+        df = self.DF.assign(val=self.DF["num"] / self.DF["den"], se=0.1,
+                            sample_size=self.DF["den"])
+        panel = SignalPanel.from_frame(df)
+        for kwargs in [{}, {"start_date": datetime(2020, 6, 2), "write_empty_days": True,
+                            "end_date": datetime(2020, 6, 5)}]:
+            expected_dir = tmp_path / "expected"
+            actual_dir = tmp_path / "actual"
+            expected_dir.mkdir()
+            actual_dir.mkdir()
+            expected_dates = create_export_csv(df, expected_dir, "county", "sig", **kwargs)
+            dates = panel.export_csv(actual_dir, "county", "sig", **kwargs)
+            assert list(dates) == list(expected_dates)
+            assert sorted(listdir(actual_dir)) == sorted(listdir(expected_dir))
+            for name in listdir(expected_dir):
+                assert (actual_dir / name).read_text() == (expected_dir / name).read_text()
+            for directory in [expected_dir, actual_dir]:
+                for path in directory.iterdir():
+                    path.unlink()
+                directory.rmdir()
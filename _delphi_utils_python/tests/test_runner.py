@@ -1,8 +1,17 @@
 """Tests for runner.py."""
 
+from datetime import datetime
+import json
+import os
+from os.path import join
+
 import mock
+import pandas as pd
 import pytest
 
+from delphi_utils import create_export_csv
+from delphi_utils.archive import FilesystemArchiveDiffer
+from delphi_utils.instrumentation import profile_stage
 from delphi_utils.validator.report import ValidationReport
 from delphi_utils.validator.errors import ValidationFailure
 from delphi_utils.runner import run_indicator_pipeline
@@ -53,7 +62,7 @@ class TestRunIndicator:
         mock_validator_fn.assert_called_once_with(self.PARAMS)
         mock_archiver_fn.assert_called_once_with(self.PARAMS)
         mock_validator_fn.return_value.validate.assert_called_once()
-        mock_archiver_fn.return_value.archive.assert_called_once()
+        mock_archiver_fn.return_value.run.assert_called_once_with(None)
 
     @mock.patch("delphi_utils.runner.read_params")
     def test_failed_validation(self, mock_read_params,
@@ -69,7 +78,7 @@ class TestRunIndicator:
         mock_validator_fn.assert_called_once_with(self.PARAMS)
         mock_archiver_fn.assert_called_once_with(self.PARAMS)
         mock_validator_fn.return_value.validate.assert_called_once()
-        mock_archiver_fn.return_value.archive.assert_not_called()
+        mock_archiver_fn.return_value.run.assert_not_called()
 
     @mock.patch("delphi_utils.runner.read_params")
     def test_indicator_only(self, mock_read_params, mock_indicator_fn):
@@ -96,7 +105,7 @@ class TestRunIndicator:
 
         mock_indicator_fn.assert_called_once_with(self.PARAMS)
         mock_archiver_fn.assert_called_once_with(self.PARAMS)
-        mock_archiver_fn.return_value.archive.assert_called_once()
+        mock_archiver_fn.return_value.run.assert_called_once_with(None)
 
     @mock.patch("delphi_utils.runner.read_params")
     def test_no_archive(self, mock_read_params, mock_indicator_fn, mock_validator_fn):
@@ -108,3 +117,153 @@ class TestRunIndicator:
         mock_indicator_fn.assert_called_once_with(self.PARAMS)
         mock_validator_fn.assert_called_once_with(self.PARAMS)
         mock_validator_fn.return_value.validate.assert_called_once()
+
+    @mock.patch("delphi_utils.runner.read_params")
+    def test_incremental_validation(self, mock_read_params,
+                                    mock_indicator_fn, mock_validator_fn, mock_archiver_fn):
+        """Test that the archive diff is validated and then archived."""
+        params = {**self.PARAMS, "validation": {"common": {"incremental": True}}}
+        mock_read_params.return_value = params
+        archiver = mock_archiver_fn.return_value
+        changes = ([], {"receiving/a.csv": "receiving/a.csv.diff"}, ["receiving/b.csv"])
+        archiver.diff_exports.return_value = changes
+
+        run_indicator_pipeline(mock_indicator_fn, mock_validator_fn, mock_archiver_fn)
+
+        archiver.update_cache.assert_called_once()
+        mock_validator_fn.return_value.validate.assert_called_once_with(changes)
+        archiver.run.assert_called_once_with(changes)
+
+    @mock.patch("delphi_utils.runner.read_params")
+    def test_profile(self, mock_read_params, tmp_path,
+                     mock_indicator_fn, mock_validator_fn, mock_archiver_fn):
+        """Test that a profile of the pipeline stages is written."""
+        params = {**self.PARAMS, "common": {"profile_dir": str(tmp_path)}}
+        mock_read_params.return_value = params
+
+        def indicator_fn(unused_params):
+            with profile_stage("pull"):
+                pass
+        mock_indicator_fn.side_effect = indicator_fn
+
+        run_indicator_pipeline(mock_indicator_fn, mock_validator_fn, mock_archiver_fn)
+
+        profile_files = list(tmp_path.glob("profile_*.json"))
+        assert len(profile_files) == 1
+        with open(profile_files[0]) as profile_file:
+            profile = json.load(profile_file)
+        assert [stage["name"] for stage in profile["stages"]] == \
+            ["indicator", "indicator/pull", "validation", "archive"]
+
+
+class TestPipelinedRun:
+    """Tests for running an indicator with pipelined validation and archiving."""
+
+    DF = pd.DataFrame({"geo_id": ["pa"], "timestamp": [datetime(2020, 9, 1)],
+                       "val": [1.0], "se": [0.1], "sample_size": [100.0]})
+
+    @pytest.fixture
+    def params(self, tmp_path):
+        """Set up pipelined parameters with an export directory."""
+        return {
+            "common": {"export_dir": str(tmp_path), "pipelined": True},
+            "validation": {"common": {"incremental": True}},
+            "archive": {}
+        }
+
+    @pytest.fixture
+    def validator(self):
+        """Set up a mock validator."""
+        validator = mock.Mock()
+        validator.suppressed_errors = []
+        validator.finish_batches.side_effect = lambda frames, report, changes: report
+        return validator
+
+    @pytest.fixture
+    def archiver(self, tmp_path):
+        """Set up a mock archiver finding all exports new."""
+        archiver = mock.Mock()
+        archiver.diff_exports.side_effect = lambda filenames=None: (
+            [], {}, [join(str(tmp_path), f) for f in filenames or []])
+        return archiver
+
+    def export(self, params, geo_res, sensor):
+        """Export a single file."""
+        create_export_csv(self.DF, params["common"]["export_dir"], geo_res, sensor)
+
+    @mock.patch("delphi_utils.runner.read_params")
+    def test_pipelined(self, mock_read_params, params, validator, archiver, tmp_path):
+        """Test that exported batches are diffed and validated as they are written."""
+        mock_read_params.return_value = params
+
+        def indicator_fn(params):
+            self.export(params, "state", "a")
+            self.export(params, "state", "b")
+            # Files written without create_export_csv are processed at the end.
+            self.DF.to_csv(join(params["common"]["export_dir"], "20200901_state_c.csv"))
+
+        run_indicator_pipeline(indicator_fn, lambda _: validator, lambda _: archiver)
+
+        archiver.update_cache.assert_called_once()
+        assert archiver.diff_exports.call_args_list == [
+            mock.call(["20200901_state_a.csv"]), mock.call(["20200901_state_b.csv"]),
+            mock.call(["20200901_state_c.csv"])]
+        changes = ([], {}, [join(str(tmp_path), f"20200901_state_{s}.csv") for s in "abc"])
+        assert [c[0][0] for c in validator.validate_batch.call_args_list] == [
+            ["20200901_state_a.csv"], ["20200901_state_b.csv"], ["20200901_state_c.csv"]]
+        validator.finish_batches.assert_called_once()
+        assert validator.finish_batches.call_args[0][2] == changes
+        validator.validate.assert_not_called()
+        archiver.run.assert_called_once_with(changes)
+
+    @mock.patch("delphi_utils.runner.read_params")
+    def test_pipelined_failed_validation(self, mock_read_params, params, validator, archiver):
+        """Test that nothing is archived when a pipelined batch fails validation."""
+        mock_read_params.return_value = params
+        validator.validate_batch.side_effect = lambda filenames, report, changes: \
+            report.add_raised_error(ValidationFailure("bad", filename=filenames[0]))
+
+        run_indicator_pipeline(lambda params: self.export(params, "state", "a"),
+                               lambda _: validator, lambda _: archiver)
+
+        validator.finish_batches.assert_called_once()
+        archiver.run.assert_not_called()
+
+    @mock.patch("delphi_utils.runner.read_params")
+    def test_pipelined_rewritten_exports(self, mock_read_params, params, validator, archiver):
+        """Test that all exports are validated again if a file is written twice."""
+        mock_read_params.return_value = params
+        validator.validate.return_value = ValidationReport([])
+
+        def indicator_fn(params):
+            self.export(params, "state", "a")
+            self.export(params, "state", "a")
+
+        run_indicator_pipeline(indicator_fn, lambda _: validator, lambda _: archiver)
+
+        validator.finish_batches.assert_not_called()
+        archiver.update_cache.assert_called_once()
+        assert archiver.diff_exports.call_args == mock.call()
+        validator.validate.assert_called_once_with(([], {}, []))
+        archiver.run.assert_called_once_with(([], {}, []))
+
+    @mock.patch("delphi_utils.runner.read_params")
+    def test_pipelined_stale_diffs(self, mock_read_params, params, tmp_path):
+        """Test that diffs of re-written exports are discarded when diffing all exports again."""
+        export_dir = str(tmp_path / "export")
+        cache_dir = str(tmp_path / "cache")
+        os.makedirs(export_dir)
+        os.makedirs(cache_dir)
+        params["common"]["export_dir"] = export_dir
+        mock_read_params.return_value = params
+        create_export_csv(self.DF, cache_dir, "state", "a")
+
+        def indicator_fn(params):
+            # A changed file is diffed, then re-written as it is in the archive.
+            create_export_csv(self.DF.assign(val=2.0), export_dir, "state", "a")
+            create_export_csv(self.DF, export_dir, "state", "a")
+
+        run_indicator_pipeline(indicator_fn, archiver_fn=lambda _: FilesystemArchiveDiffer(
+            cache_dir, export_dir))
+
+        assert not os.listdir(export_dir)
@@ -0,0 +1,166 @@
+"""Tests for delphi_utils.scheduler."""
+import threading
+
+import pytest
+
+from delphi_utils.scheduler import FetchScheduler, TokenBucket
+
+
+class FakeAPI:
+    """In-process stand-in for a remote API that records concurrent requests."""
+
+    def __init__(self, failures=None, gates=None):
+        self.failures = dict(failures or {})
+        self.gates = gates or {}
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.lock = threading.Lock()
+
+    def __call__(self, key):
+        with self.lock:
+            self.calls.append(key)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            if key in self.gates:
+                assert self.gates[key].wait(5)
+            with self.lock:
+                if self.failures.get(key, 0) > 0:
+                    self.failures[key] -= 1
+                    raise ConnectionError(f"failed to fetch {key}")
+            return key * 10
+        finally:
+            with self.lock:
+                self.in_flight -= 1
+
+
+class FakeClock:
+    """Clock advanced only by calls to its sleep method."""
+
+    def __init__(self):
+        self.now = 0.0
+        self.sleeps = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+class TestTokenBucket:
+    """Tests for the TokenBucket class."""
+
+    def test_burst_then_rate(self):
+        """Test that a full bucket allows a burst and then spaces requests by the rate."""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, capacity=3, clock=clock, sleep=clock.sleep)
+        for _ in range(3):
+            bucket.acquire()
+        assert clock.now == 0
+        assert not bucket.try_acquire()
+
+        bucket.acquire()
+        bucket.acquire()
+        assert clock.now == pytest.approx(1.0)
+
+    def test_refill_capped(self):
+        """Test that tokens do not accumulate beyond the capacity."""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=1, capacity=2, clock=clock, sleep=clock.sleep)
+        clock.now = 100
+        assert bucket.try_acquire()
+        assert bucket.try_acquire()
+        assert not bucket.try_acquire()
+
+    def test_invalid(self):
+        """Test that invalid settings are rejected."""
+        with pytest.raises(ValueError):
+            TokenBucket(rate=0)
+        with pytest.raises(ValueError):
+            TokenBucket(rate=1, capacity=0)
+
+
+class TestFetchScheduler:
+    """Tests for the FetchScheduler class."""
+
+    def test_map(self):
+        """Test that all keys are fetched with bounded concurrency."""
+        api = FakeAPI()
+        scheduler = FetchScheduler(api, max_in_flight=3)
+        assert scheduler.map(range(20)) == {i: i * 10 for i in range(20)}
+        assert sorted(api.calls) == list(range(20))
+        assert api.max_in_flight <= 3
+
+    def test_streams_results(self):
+        """Test that results are yielded as they complete, before slow requests finish."""
+        slow = threading.Event()
+        api = FakeAPI(gates={0: slow})
+        results = FetchScheduler(api, max_in_flight=2).imap_unordered([0, 1, 2])
+
+        assert next(results) == (1, 10)
+        assert next(results) == (2, 20)
+        slow.set()
+        assert next(results) == (0, 0)
+        with pytest.raises(StopIteration):
+            next(results)
+
+    def test_unconsumed_results_bounded(self):
+        """Test that a result held by the consumer keeps its slot until more are requested."""
+        api = FakeAPI()
+        results = FetchScheduler(api, max_in_flight=2).imap_unordered(range(10))
+        next(results)
+        threading.Event().wait(0.1)
+        assert len(api.calls) == 2
+
+        next(results)
+        threading.Event().wait(0.1)
+        assert len(api.calls) == 3
+
+        results.close()
+        assert len(api.calls) == 3
+
+    def test_retries_with_backoff(self):
+        """Test that failed requests are retried with exponential backoff."""
+        clock = FakeClock()
+        api = FakeAPI(failures={"a": 2})
+        scheduler = FetchScheduler(api, max_in_flight=1, backoff_base=0.5, sleep=clock.sleep)
+        assert scheduler.map(["a"]) == {"a": "a" * 10}
+        assert api.calls == ["a", "a", "a"]
+        assert clock.sleeps == [0.5, 1.0]
+
+    def test_retries_exhausted(self):
+        """Test that the last error is returned or raised once retries run out."""
+        clock = FakeClock()
+        api = FakeAPI(failures={"a": 10})
+        scheduler = FetchScheduler(api, max_in_flight=2, max_retries=2, backoff_base=1,
+                                   backoff_max=1.5, sleep=clock.sleep)
+        actual = scheduler.map(["a", "b"], return_exceptions=True)
+        assert isinstance(actual["a"], ConnectionError)
+        assert actual["b"] == "bb" * 5
+        assert api.calls.count("a") == 3
+        assert clock.sleeps == [1, 1.5]
+
+        with pytest.raises(ConnectionError):
+            scheduler.map(["a"])
+
+    def test_no_retry_on_other_errors(self):
+        """Test that errors of other types are not retried."""
+        api = FakeAPI(failures={"a": 1})
+        scheduler = FetchScheduler(api, retry_on=(TimeoutError,))
+        with pytest.raises(ConnectionError):
+            scheduler.map(["a"])
+        assert api.calls == ["a"]
+
+    def test_rate_limited(self):
+        """Test that every attempt takes a token from the rate limiter."""
+        clock = FakeClock()
+        bucket = TokenBucket(rate=10, capacity=1, clock=clock, sleep=clock.sleep)
+        api = FakeAPI(failures={0: 1})
+        scheduler = FetchScheduler(api, max_in_flight=1, rate_limiter=bucket,
+                                   backoff_base=0, sleep=clock.sleep)
+        scheduler.map(range(5))
+        # Six attempts, of which the first used the initial token.
+        assert clock.now == pytest.approx(0.5)
@@ -296,3 +296,25 @@ class TestSmoothers:
         ix1 = signal.index
         ix2 = smoothed_signal.index
         assert ix1.equals(ix2)
+
+    def test_smooth_batch(self):
+        signals = np.arange(60).reshape(3, 20) + np.random.rand(3, 20)
+        signals[1, :2] = np.nan
+        signals[2, 7] = np.nan
+        smoothers = [
+            Smoother(smoother_name="savgol", window_length=7),
+            Smoother(smoother_name="savgol", window_length=7, boundary_method="identity"),
+            Smoother(smoother_name="savgol", window_length=7, boundary_method="nan"),
+            Smoother(smoother_name="savgol", window_length=30, poly_fit_degree=1),
+            Smoother(smoother_name="moving_average", window_length=5),
+            Smoother(smoother_name="moving_average", window_length=30),
+            Smoother(smoother_name="identity"),
+        ]
+        for smoother in smoothers:
+            smoothed_signals = smoother.smooth_batch(signals)
+            assert smoothed_signals.shape == signals.shape
+            for signal, smoothed_signal in zip(signals, smoothed_signals):
+                assert np.allclose(smoother.smooth(signal), smoothed_signal, equal_nan=True)
+
+        with pytest.raises(ValueError):
+            Smoother().smooth_batch(signals[0])
@@ -0,0 +1,87 @@
+"""Tests for the weekday effect solver."""
+import numpy as np
+import pandas as pd
+import pytest
+
+from delphi_utils.weekday import (fit_weekday_params, load_weekday_params, save_weekday_params,
+                                  weekday_design, weekday_factors, weekday_objective)
+
+
+def synthetic_counts(n_days, scale, seed=0):
+    """Return numerators, denominators and days of week with known weekday effects."""
+    rng = np.random.default_rng(seed)
+    dates = pd.date_range("2020-03-01", periods=n_days)
+    days = np.arange(n_days)
+    effects = np.array([0.1, 0.05, 0, 0, -0.05, -0.2, 0.1])
+    denoms = rng.poisson(scale * (1 + 0.3 * np.sin(days / 50))) + 1.0
+    rates = 0.05 * np.exp(0.5 * np.sin(days / 30) + effects[dates.dayofweek])
+    return rng.poisson(denoms * rates).astype(float), denoms, dates
+
+
+class TestWeekday:
+    """Tests for the weekday effect solver."""
+
+    def test_design(self):
+        design = weekday_design(np.array([0, 3, 6]))
+        assert np.array_equal(design, [[1, 0, 0, 0, 0, 0],
+                                       [0, 0, 0, 1, 0, 0],
+                                       [-1, -1, -1, -1, -1, -1]])
+
+    def test_factors(self):
+        params = np.array([[0.1, 0.2, 0, 0, -0.1, 0.3, 5, 6],
+                           [0, 0, 0, 0, 0, 0, 1, 1]])
+        factors = weekday_factors(params)
+        assert np.allclose(factors, np.exp([[0.1, 0.2, 0, 0, -0.1, 0.3, -0.5],
+                                            [0, 0, 0, 0, 0, 0, 0]]))
+        assert np.array_equal(weekday_factors(params[0]), factors[0])
+
+    @pytest.mark.parametrize("scale", [100, 1e5])
+    def test_matches_cvxpy(self, scale):
+        cp = pytest.importorskip("cvxpy")
+        nums, denoms, dates = synthetic_counts(150, scale)
+        params = fit_weekday_params(nums, denoms, dates.dayofweek)
+
+        n_days = len(nums)
+        X = np.hstack([weekday_design(dates.dayofweek), np.eye(n_days)])
+        b = cp.Variable(X.shape[1])
+        ll = (nums @ (X @ b + np.log(denoms))
+              - cp.sum(cp.exp(X @ b + np.log(denoms)))) / n_days
+        penalty = 100 * cp.norm(cp.diff(b[6:], 3), 1) / (n_days - 2)
+        cp.Problem(cp.Minimize(-ll + penalty)).solve()
+
+        # at least as good an optimum as the generic solver
+        objective = weekday_objective(params, nums, denoms, dates.dayofweek)
+        expected = weekday_objective(b.value, nums, denoms, dates.dayofweek)
+        assert objective <= expected + 1e-7 * abs(expected)
+        assert np.allclose(params[:6], b.value[:6], atol=1e-3)
+        assert np.allclose(params[6:], b.value[6:], atol=1e-2)
+
+    def test_warm_start(self):
+        nums, denoms, dates = synthetic_counts(200, 1000)
+        previous = fit_weekday_params(nums[:-1], denoms[:-1], dates[:-1].dayofweek)
+        cold = fit_weekday_params(nums, denoms, dates.dayofweek)
+        warm = fit_weekday_params(nums, denoms, dates.dayofweek,
+                                  init=np.append(previous, previous[-1]))
+        assert np.allclose(warm, cold, atol=1e-4)
+        assert np.isclose(weekday_objective(warm, nums, denoms, dates.dayofweek),
+                          weekday_objective(cold, nums, denoms, dates.dayofweek), rtol=1e-8)
+
+    def test_no_optimum(self):
+        _, denoms, dates = synthetic_counts(30, 1000)
+        with pytest.raises(RuntimeError):
+            fit_weekday_params(np.zeros(30), denoms, dates.dayofweek)
+        with pytest.raises(ValueError):
+            fit_weekday_params(np.ones(30), np.zeros(30), dates.dayofweek)
+
+    def test_cache(self, tmp_path):
+        cache_file = str(tmp_path / "weekday" / "params.npz")
+        dates = pd.date_range("2020-03-01", periods=4)
+        assert load_weekday_params(cache_file, dates) is None
+
+        params = np.array([[1, 2, 3, 4, 5, 6, 10, 11, 12, 13.0]])
+        save_weekday_params(cache_file, dates, params)
+        assert np.array_equal(load_weekday_params(cache_file, dates), params)
+        # dates after the cached ones take the last cached value
+        shifted = load_weekday_params(cache_file, pd.date_range("2020-03-02", periods=5))
+        assert np.array_equal(shifted, [[1, 2, 3, 4, 5, 6, 11, 12, 13, 13, 13]])
+        assert load_weekday_params(cache_file, pd.date_range("2021-01-01", periods=4)) is None
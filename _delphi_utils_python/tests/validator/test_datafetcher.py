@@ -5,8 +5,12 @@ import mock
 import numpy as np
 import pandas as pd
 from delphi_utils.validator.datafetcher import (FILENAME_REGEX,
+                                                ArchiveReferenceProvider,
                                                 make_date_filter,
                                                 get_geo_signal_combos,
+                                                load_all_files,
+                                                reference_provider_from_params,
+                                                split_files,
                                                 threaded_api_calls)
 from delphi_utils.validator.errors import ValidationFailure
 
@@ -21,6 +25,49 @@ class TestDataFetcher:
         assert not date_filter(FILENAME_REGEX.match("20200620_a_b.csv"))
         assert not date_filter(FILENAME_REGEX.match("202006_a_b.csv"))
 
+    def test_load_all_files(self, tmp_path):
+        """Test that files in the date range are loaded into one frame."""
+        pd.DataFrame({"geo_id": ["01000", "02000"], "val": [1.0, 2.0],
+                      "se": [0.1, np.nan], "sample_size": [10.0, 20.0]}
+                     ).to_csv(tmp_path / "20200401_county_sig1.csv", index=False)
+        pd.DataFrame(columns=["geo_id", "val", "se", "sample_size"]
+                     ).to_csv(tmp_path / "20200402_county_sig1.csv", index=False)
+        pd.DataFrame({"geo_id": ["pa"], "val": [4.0], "se": [0.4], "sample_size": [40.0]}
+                     ).to_csv(tmp_path / "20200402_state_sig2.csv", index=False)
+        pd.DataFrame({"geo_id": ["pa"], "val": [5.0], "se": [0.5], "sample_size": [50.0]}
+                     ).to_csv(tmp_path / "20200501_state_sig2.csv", index=False)
+        (tmp_path / "notes.txt").write_text("not a csv")
+
+        all_frames = load_all_files(str(tmp_path), date(2020, 4, 1), date(2020, 4, 30),
+                                    n_threads=2)
+        all_frames = all_frames.sort_values(["time_value", "geo_id"]).reset_index(drop=True)
+
+        assert all_frames["geo_id"].tolist() == ["01000", "02000", "pa"]
+        assert all_frames["val"].tolist() == [1.0, 2.0, 4.0]
+        assert all_frames["geo_type"].astype(str).tolist() == ["county", "county", "state"]
+        assert all_frames["signal"].astype(str).tolist() == ["sig1", "sig1", "sig2"]
+        assert all_frames["time_value"].tolist() == [date(2020, 4, 1), date(2020, 4, 1),
+                                                     date(2020, 4, 2)]
+        assert set(all_frames["filename"].cat.categories) == {"20200401_county_sig1.csv",
+                                                               "20200402_county_sig1.csv",
+                                                               "20200402_state_sig2.csv"}
+
+        files = {f: (m, df) for f, m, df in split_files(all_frames)}
+        assert set(files.keys()) == set(all_frames["filename"].cat.categories)
+        assert files["20200402_county_sig1.csv"][1].empty
+        assert files["20200402_state_sig2.csv"][0].group("signal") == "sig2"
+        assert list(files["20200401_county_sig1.csv"][1].columns) == ["geo_id", "val", "se",
+                                                                      "sample_size"]
+
+    def test_load_all_files_empty(self, tmp_path):
+        """Test that an empty directory gives an empty frame with the expected columns."""
+        all_frames = load_all_files(str(tmp_path), date(2020, 4, 1), date(2020, 4, 30))
+
+        assert all_frames.empty
+        assert {"geo_id", "val", "se", "sample_size", "filename", "geo_type", "signal",
+                "time_value"} <= set(all_frames.columns)
+        assert split_files(all_frames) == []
+
     @mock.patch("covidcast.metadata")
     def test_get_geo_signal_combos(self, mock_metadata):
         """Test that the geo signal combos are correctly pulled from the covidcast metadata."""
@@ -39,9 +86,10 @@ class TestDataFetcher:
                                                        ("msa", "y"),
                                                        ("msa", "z")])
 
+    @mock.patch("time.sleep")
     @mock.patch("covidcast.signal")
-    def test_threaded_api_calls(self, mock_signal):
-        """Test that calls to the covidcast API are made."""
+    def test_threaded_api_calls(self, mock_signal, mock_sleep):
+        """Test that calls to the covidcast API are made and failed calls are retried."""
 
         signal_data_1 = pd.DataFrame({"geo_value": ["1044"],
                                       "stderr": [None],
@@ -102,3 +150,54 @@ class TestDataFetcher:
                 pd.testing.assert_frame_equal(v, expected[k])
             else:
                 assert str(v) == str(expected[k])
+        # The failing call is retried three times with exponential backoff.
+        assert mock_signal.call_count == 7
+        assert mock_sleep.call_args_list == [mock.call(1.0), mock.call(2.0), mock.call(4.0)]
+
+    def test_archive_reference_provider(self, tmp_path):
+        """Test that reference data is read from cached CSVs and split by geo and signal."""
+        pd.DataFrame({"geo_id": ["01000", "02000"], "val": [1.0, 2.0],
+                      "se": [0.1, np.nan], "sample_size": [10.0, 20.0]}
+                     ).to_csv(tmp_path / "20200401_county_sig1.csv", index=False)
+        pd.DataFrame({"geo_id": ["01000"], "val": [3.0], "se": [0.3], "sample_size": [30.0]}
+                     ).to_csv(tmp_path / "20200402_county_sig1.csv", index=False)
+        pd.DataFrame({"geo_id": ["pa"], "val": [4.0], "se": [0.4], "sample_size": [40.0]}
+                     ).to_csv(tmp_path / "20200402_state_sig1.csv", index=False)
+        pd.DataFrame({"geo_id": ["pa"], "val": [5.0], "se": [0.5], "sample_size": [50.0]}
+                     ).to_csv(tmp_path / "20200501_state_sig1.csv", index=False)
+
+        provider = ArchiveReferenceProvider(str(tmp_path))
+        assert provider.get_geo_signal_combos() == [("county", "sig1"), ("state", "sig1")]
+
+        actual = provider.get_reference_frames(
+            date(2020, 4, 1), date(2020, 4, 30),
+            [("county", "sig1"), ("state", "sig1"), ("msa", "sig1")])
+
+        expected_county = pd.DataFrame({
+            "geo_id": ["01000", "02000", "01000"],
+            "val": [1.0, 2.0, 3.0],
+            "se": [0.1, np.nan, 0.3],
+            "sample_size": [10.0, 20.0, 30.0],
+            "time_value": pd.to_datetime(["2020-04-01", "2020-04-01", "2020-04-02"])})
+        pd.testing.assert_frame_equal(
+            actual[("county", "sig1")].sort_values(["time_value", "geo_id"]).reset_index(drop=True),
+            expected_county)
+        assert actual[("state", "sig1")]["val"].tolist() == [4.0]
+        assert actual[("msa", "sig1")].empty
+
+    @mock.patch("delphi_utils.validator.datafetcher.threaded_api_calls")
+    def test_archive_reference_provider_fallback(self, mock_api_calls, tmp_path):
+        """Test that combinations missing from the cache are fetched from the fallback."""
+        mock_api_calls.return_value = {("msa", "sig1"): "api data"}
+        provider = reference_provider_from_params({
+            "validation": {"common": {"data_source": "src"},
+                           "dynamic": {"reference_source": "archive",
+                                       "reference_api_fallback": True}},
+            "archive": {"cache_dir": str(tmp_path)}})
+
+        assert isinstance(provider, ArchiveReferenceProvider)
+        actual = provider.get_reference_frames(date(2020, 4, 1), date(2020, 4, 30),
+                                               [("msa", "sig1")])
+        assert actual == {("msa", "sig1"): "api data"}
+        mock_api_calls.assert_called_once_with("src", date(2020, 4, 1), date(2020, 4, 30),
+                                               [("msa", "sig1")], 32, None, 3)
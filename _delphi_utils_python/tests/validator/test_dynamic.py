@@ -3,10 +3,24 @@ from datetime import date, datetime
 import numpy as np
 import pandas as pd
 
+from delphi_utils.validator.datafetcher import ReferenceProvider
 from delphi_utils.validator.report import ValidationReport
 from delphi_utils.validator.dynamic import DynamicValidator
 
 
+class FakeReferenceProvider(ReferenceProvider):
+    """Reference provider returning fixed frames."""
+
+    def __init__(self, frames):
+        self.frames = frames
+
+    def get_geo_signal_combos(self):
+        return list(self.frames.keys())
+
+    def get_reference_frames(self, start_date, end_date, geo_signal_combos):
+        return {combo: self.frames[combo] for combo in geo_signal_combos}
+
+
 class TestCheckRapidChange:
     params = {
         "common": {
@@ -364,3 +378,51 @@ class TestDataOutlier:
 
         assert len(report.raised_errors) == 1
         assert report.raised_errors[0].check_name == "check_positive_negative_spikes"
+
+
+class TestValidate:
+    params = {
+        "common": {
+            "data_source": "",
+            "span_length": 2,
+            "end_date": "2020-09-03"
+        }
+    }
+
+    @staticmethod
+    def make_frame(dates, n_geos, val=10.0):
+        return pd.DataFrame({
+            "geo_id": [str(i) for _ in dates for i in range(n_geos)],
+            "val": val,
+            "se": 0.5,
+            "sample_size": 100.0,
+            "time_value": [d for d in dates for _ in range(n_geos)]})
+
+    def test_date_windows(self):
+        api_dates = pd.date_range("2020-08-20", "2020-09-02")
+        api_df = self.make_frame(api_dates, 5)
+        validator = DynamicValidator(self.params, FakeReferenceProvider({
+            ("state", "a"): api_df,
+            ("state", "b"): self.make_frame(pd.date_range("2020-08-18", "2020-08-22"), 5),
+            ("county", "c"): api_df}))
+        validator.params.generation_date = date(2020, 9, 4)
+        report = ValidationReport([])
+
+        test_a = self.make_frame([date(2020, 9, 1), date(2020, 9, 3)], 5)
+        test_a = test_a[~((test_a["time_value"] == date(2020, 9, 3)) &
+                          (test_a["geo_id"].isin(["0", "1", "2"])))]
+        test_b = self.make_frame([date(2020, 9, 1), date(2020, 9, 2), date(2020, 9, 3)], 5)
+        all_frames = pd.concat([test_a.assign(geo_type="state", signal="a"),
+                                test_b.assign(geo_type="state", signal="b")])
+
+        validator.validate(all_frames, report)
+
+        failures = sorted((f.check_name, f.signal, f.date) for f in report.raised_errors)
+        assert failures == [
+            ("check_missing_geo_sig_combo", "c", None),
+            ("check_missing_geo_sig_date_combo", "a", date(2020, 9, 2)),
+            ("check_rapid_change_num_rows", "a", date(2020, 9, 3)),
+            ("empty_reference_data", "b", date(2020, 9, 1)),
+            ("empty_reference_data", "b", date(2020, 9, 2)),
+            ("empty_reference_data", "b", date(2020, 9, 3)),
+        ]
@@ -1,7 +1,8 @@
 """Tests for delphi_utils.validator.report."""
 import mock
+import pandas as pd
 from delphi_utils.validator.errors import ValidationFailure
-from delphi_utils.validator.report import ValidationReport
+from delphi_utils.validator.report import ValidationReport, profile_check
 
 class TestValidationReport:
     """Tests for ValidationReport class."""
@@ -60,3 +61,51 @@ class TestValidationReport:
         mock_logger.critical.assert_called_once_with(
             "bad failed for sig2 at resolution county on 2020-11-07: msg 2")
         mock_logger.warning.assert_has_calls([mock.call("wrong import"), mock.call("right import")])
+
+    def test_timed_check(self):
+        """Test that timed blocks accumulate per check name."""
+        report = ValidationReport([])
+        with report.timed_check("check_a", 10):
+            pass
+        with report.timed_check("check_a", 5):
+            pass
+        with report.timed_check("check_b"):
+            pass
+
+        assert set(report.check_profile) == {"check_a", "check_b"}
+        assert report.check_profile["check_a"].invocations == 2
+        assert report.check_profile["check_a"].rows_examined == 15
+        assert report.check_profile["check_a"].elapsed_time_in_seconds >= 0
+        assert report.check_profile["check_b"].rows_examined == 0
+
+    def test_profile_check(self):
+        """Test that decorated checks are profiled and still return their result."""
+        @profile_check()
+        def check_rows(df, report):
+            report.increment_total_checks()
+            return df.shape[0]
+
+        @profile_check("check_named")
+        def check_other(values, report=None):
+            return values.sum()
+
+        report = ValidationReport([])
+        assert check_rows(pd.DataFrame({"a": [1, 2, 3]}), report) == 3
+        assert check_other(pd.Series([1, 2]), report=report) == 3
+
+        assert report.total_checks == 1
+        assert report.check_profile["check_rows"].invocations == 1
+        assert report.check_profile["check_rows"].rows_examined == 3
+        assert report.check_profile["check_named"].rows_examined == 2
+
+    def test_log_profile(self):
+        """Test that the check profile is logged."""
+        mock_logger = mock.Mock()
+        report = ValidationReport([])
+        with report.timed_check("check_a", 10):
+            pass
+
+        report.log(mock_logger)
+        mock_logger.info.assert_called_once_with(
+            "Validation check profile", check_name="check_a", invocations=1,
+            elapsed_time_in_seconds=mock.ANY, rows_examined=10)
@@ -1,8 +1,9 @@
 """Tests for static validation."""
+from datetime import date
 import numpy as np
 import pandas as pd
 
-from delphi_utils.validator.datafetcher import FILENAME_REGEX
+from delphi_utils.validator.datafetcher import FILENAME_REGEX, load_all_files, split_files
 from delphi_utils.validator.report import ValidationReport
 from delphi_utils.validator.static import StaticValidator
 
@@ -542,3 +543,58 @@ class TestCheckBadN:
 
         assert len(report.raised_errors) == 1
         assert report.raised_errors[0].check_name == "check_n_gt_min"
+
+
+class TestValidateFrame:
+    params = {
+        "common": {
+            "data_source": "",
+            "span_length": 2,
+            "end_date": "2020-09-03"
+        }
+    }
+
+    @staticmethod
+    def failures(failure_list):
+        return sorted((f.check_name, f.date, f.geo_type, f.signal) for f in failure_list)
+
+    def test_same_as_per_file(self, tmp_path):
+        files = {
+            "20200901_county_a_pct.csv": [["42003", 150, 0.5, 200], ["6037", 1, 0, 200],
+                                          ["01001.0", 1, 0.5, 200], ["42003", 150, 0.5, 200]],
+            "20200901_state_b_prop.csv": [["pa", 200000, 0.5, 10], ["NY", 1, 0.5, 200],
+                                          ["zz", 0, 0, 200]],
+            "20200902_msa_c_num.csv": [["10180", -1, np.nan, np.nan], ["abcde", np.nan, 60, 200]],
+            "20200902_hrr_c_num.csv": [["1", 1, 0.5, 200], ["4567", 1, 0.5, 200]],
+            "20200902_state_c_num.csv": [],
+            "20200902_nation_c_num.csv": [["us", 1, 0.5, 200]],
+        }
+        for filename, rows in files.items():
+            pd.DataFrame(rows, columns=["geo_id", "val", "se", "sample_size"]).to_csv(
+                tmp_path / filename, index=False)
+        all_frames = load_all_files(str(tmp_path), date(2020, 9, 1), date(2020, 9, 3))
+
+        for missing_allowed in [True, False]:
+            validator = StaticValidator(self.params)
+            validator.params.missing_se_allowed = missing_allowed
+            validator.params.missing_sample_size_allowed = missing_allowed
+            per_file_report = ValidationReport([])
+            frame_report = ValidationReport([])
+
+            validator.validate(split_files(all_frames), per_file_report)
+            validator.validate_frame(all_frames, frame_report)
+
+            assert frame_report.total_checks == per_file_report.total_checks
+            assert self.failures(frame_report.raised_errors) == \
+                self.failures(per_file_report.raised_errors)
+            assert self.failures(frame_report.raised_warnings) == \
+                self.failures(per_file_report.raised_warnings)
+            assert {str(f) for f in frame_report.raised_warnings} == \
+                {str(f) for f in per_file_report.raised_warnings}
+
+        check_names = {f.check_name for f in frame_report.raised_errors}
+        assert {"check_missing_date_files", "check_val_pct_gt_100", "check_val_prop_gt_100k",
+                "check_val_lt_0", "check_se_0", "check_se_0_when_val_0",
+                "check_geo_id_format", "check_bad_geo_id_value"} <= check_names
+        assert {f.check_name for f in frame_report.raised_warnings} == {
+            "check_duplicate_rows", "check_geo_id_type", "check_geo_id_lowercase"}
@@ -1,6 +1,11 @@
 """Tests for Validator"""
+import mock
+import pandas as pd
 import pytest
+from delphi_utils.validator.dynamic import DynamicValidator
 from delphi_utils.validator.errors import ValidationFailure
+from delphi_utils.validator.report import ValidationReport
+from delphi_utils.validator.static import StaticValidator
 from delphi_utils.validator.validate import Validator
 
 class TestValidatorInitialization:
@@ -102,3 +107,91 @@ class TestValidatorInitialization:
                     }
                 }
             })
+
+
+class TestIncrementalValidation:
+    """Tests for validation of a change set."""
+
+    @mock.patch.object(DynamicValidator, "validate")
+    @mock.patch.object(StaticValidator, "validate_frame")
+    def test_changed_files_only(self, mock_static, mock_dynamic, tmp_path):
+        """Test that only changed files and their geo-signal combinations are checked."""
+        for filename in ["20200901_state_a.csv", "20200902_state_a.csv", "20200902_state_b.csv",
+                         "20200902_county_a.csv", "20200801_county_c.csv"]:
+            pd.DataFrame({"geo_id": ["pa"], "val": [1.0], "se": [0.1], "sample_size": [100.0]}
+                         ).to_csv(tmp_path / filename, index=False)
+        validator = Validator({
+            "common": {
+                "export_dir": str(tmp_path)
+            },
+            "validation": {
+                "common": {
+                    "data_source": "",
+                    "span_length": 1,
+                    "end_date": "2020-09-02"
+                }
+            }
+        })
+        changes = ([],
+                   {str(tmp_path / "20200902_state_a.csv"): str(tmp_path / "diff"),
+                    str(tmp_path / "20200902_county_a.csv"): None,
+                    str(tmp_path / "20200801_county_c.csv"): str(tmp_path / "diff")},
+                   [str(tmp_path / "20200902_state_b.csv")])
+
+        validator.validate(changes)
+
+        static_frame = mock_static.call_args[0][0]
+        assert list(static_frame["filename"].cat.categories) == ["20200902_state_a.csv",
+                                                                 "20200902_state_b.csv"]
+        assert sorted(mock_static.call_args[1]["filenames"]) == [
+            "20200901_state_a.csv", "20200902_county_a.csv", "20200902_state_a.csv",
+            "20200902_state_b.csv"]
+
+        dynamic_frame, _, combos = mock_dynamic.call_args[0]
+        assert combos == [("state", "a"), ("state", "b")]
+        assert set(dynamic_frame["filename"]) == {"20200901_state_a.csv", "20200902_state_a.csv",
+                                                  "20200902_state_b.csv"}
+
+
+class TestBatchValidation:
+    """Tests for validation of exported files in batches."""
+
+    @mock.patch.object(DynamicValidator, "validate")
+    def test_batches_match_full_validation(self, mock_dynamic, tmp_path):
+        """Test that validating files in batches gives the same results as validating all."""
+        for filename, val in [("20200901_state_a.csv", 1.0), ("20200902_state_a.csv", -1.0),
+                              ("20200902_state_b.csv", 2.0), ("20200801_state_b.csv", -5.0)]:
+            pd.DataFrame({"geo_id": ["pa", "ny"], "val": [val, 1.0], "se": [0.1, 0.1],
+                          "sample_size": [100.0, 10.0]}).to_csv(tmp_path / filename, index=False)
+        validator = Validator({
+            "common": {
+                "export_dir": str(tmp_path)
+            },
+            "validation": {
+                "common": {
+                    "data_source": "",
+                    "span_length": 2,
+                    "end_date": "2020-09-02"
+                }
+            }
+        })
+
+        full_report = validator.validate()
+        full_frame = mock_dynamic.call_args[0][0]
+
+        report = ValidationReport([])
+        frames = [validator.validate_batch(["20200901_state_a.csv", "20200902_state_a.csv"],
+                                           report),
+                  validator.validate_batch(["20200902_state_b.csv", "20200801_state_b.csv"],
+                                           report)]
+        assert validator.finish_batches(frames, report) is report
+
+        assert report.total_checks == full_report.total_checks
+        assert sorted(map(str, report.raised_errors)) == \
+            sorted(map(str, full_report.raised_errors))
+        assert sorted(map(str, report.raised_warnings)) == \
+            sorted(map(str, full_report.raised_warnings))
+        batch_frame = mock_dynamic.call_args[0][0]
+        assert set(batch_frame["filename"]) == set(full_frame["filename"])
+        assert batch_frame["filename"].dtype.name == "category"
+        assert len(batch_frame) == len(full_frame)
@@ -50,6 +50,9 @@ class Config:
 
     SMOOTHER_BANDWIDTH = 100  # bandwidth for the linear left Gaussian filter
     MIN_DEN = 100  # number of total visits needed to produce a sensor
+    LOAD_CHUNK_ROWS = 2 ** 20  # rows of a count file parsed at a time
+    SFTP_CHANNELS = 4  # SFTP sessions over which the day's files are downloaded in parallel
+    SFTP_BLOCK_BYTES = 2 ** 20  # bytes of a file written to disk at a time while downloading
     MAX_BACKFILL_WINDOW = (
         7  # maximum number of days used to average a backfill correction
     )
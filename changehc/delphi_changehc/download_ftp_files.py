@@ -1,13 +1,26 @@
-"""Download files from the specified ftp server."""
+"""Download files from the specified ftp server.
+
+The day's files are downloaded over parallel SFTP sessions of one connection.  Each file is first
+written to a partial file named after its remote modification time, from whose end an interrupted
+download resumes, and is moved into place with the remote modification time once it has the
+remote size.  Files of the input cache with the remote size and modification time are complete
+and not downloaded again.
+"""
 
 # standard
-import datetime
+from concurrent.futures import ThreadPoolExecutor
 import functools
+import os
 from os import path
+import queue
+import re
 
 # third party
 import paramiko
 
+# first party
+from .config import Config
+
 
 def print_callback(filename, bytes_so_far, bytes_total):
     """Log file transfer progress."""
@@ -16,33 +29,121 @@ def print_callback(filename, bytes_so_far, bytes_total):
         print(f'{filename} transfer: {rough_percent_transferred}%')
 
 
-def get_files_from_dir(sftp, filedate, out_path):
+def is_complete(fileattr, filepath):
+    """Return whether a local file has the size and modification time of a remote file."""
+    if not path.exists(filepath):
+        return False
+    stat = os.stat(filepath)
+    return stat.st_size == fileattr.st_size and int(stat.st_mtime) == int(fileattr.st_mtime)
+
+
+def partial_path(fileattr, out_path):
+    """Return the path of the partial download of a version of a remote file."""
+    return path.join(out_path, f"{fileattr.filename}.{int(fileattr.st_mtime)}.part")
+
+
+def download_file(sftp, fileattr, out_path, block_bytes=Config.SFTP_BLOCK_BYTES):
+    """Download a remote file, resuming a partial download of the same version of the file.
+
+    Args:
+        sftp: SFTP session in the directory of the file
+        fileattr: attributes of the file, as listed by the session
+        out_path: Path to local directory into which to download the file
+        block_bytes: number of bytes read from the session and written at a time
+    """
+    filename = fileattr.filename
+    part = partial_path(fileattr, out_path)
+    # partial downloads of other versions of the file cannot be resumed
+    other_version = re.compile(re.escape(filename) + r"\.\d+\.part")
+    for name in os.listdir(out_path):
+        if other_version.fullmatch(name) and path.join(out_path, name) != part:
+            os.remove(path.join(out_path, name))
+
+    offset = path.getsize(part) if path.exists(part) else 0
+    if offset > fileattr.st_size:
+        offset = 0
+    callback = functools.partial(print_callback, filename)
+    with sftp.open(filename, "rb") as remote, open(part, "r+b" if offset else "wb") as local:
+        remote.seek(offset)
+        local.seek(offset)
+        local.truncate()
+        remote.prefetch(fileattr.st_size)
+        while offset < fileattr.st_size:
+            block = remote.read(min(block_bytes, fileattr.st_size - offset))
+            if not block:
+                break
+            local.write(block)
+            offset += len(block)
+            callback(offset, fileattr.st_size)
+
+    if offset != fileattr.st_size:
+        raise IOError(f"downloaded {offset} of {fileattr.st_size} bytes of {filename}")
+    os.utime(part, (fileattr.st_mtime, fileattr.st_mtime))
+    os.replace(part, path.join(out_path, filename))
+
+
+def download_queued(open_channel, pending, out_path):
+    """Download the files of a queue over a new SFTP session, until the queue is empty."""
+    sftp = open_channel()
+    try:
+        while True:
+            try:
+                fileattr = pending.get_nowait()
+            except queue.Empty:
+                return
+            download_file(sftp, fileattr, out_path)
+    finally:
+        sftp.close()
+
+
+def get_files_from_dir(sftp, filedate, out_path, open_channel=None,
+                       n_channels=Config.SFTP_CHANNELS):
     """Download files from sftp server tagged with the specified day.
 
     Args:
         sftp: SFTP Session from Paramiko client
         filedate: YYYYmmdd string for which the files are named
         out_path: Path to local directory into which to download the files
+        open_channel: optional function opening another SFTP session in the same directory, to
+            download the files over up to n_channels sessions in parallel; if None, the files are
+            downloaded one at a time over sftp
+        n_channels: maximum number of sessions over which to download the files
     """
     # go through files in recieving dir
-    filepaths_to_download = {}
-    for fileattr in sftp.listdir_attr():
-        filename = fileattr.filename
-        if fileattr.filename.startswith(filedate) and \
-                not path.exists(path.join(out_path, filename)):
-            filepaths_to_download[filename] = path.join(out_path, filename)
+    files_to_download = [
+        fileattr for fileattr in sftp.listdir_attr()
+        if fileattr.filename.startswith(filedate) and
+        not is_complete(fileattr, path.join(out_path, fileattr.filename))
+    ]
 
     # make sure we don't download more than 6 files per day
-    assert len(filepaths_to_download) <= 6, "more files dropped than expected"
+    assert len(files_to_download) <= 6, "more files dropped than expected"
 
     # download!
-    for infile, outfile in filepaths_to_download.items():
-        callback_for_filename = functools.partial(print_callback, infile)
-        sftp.get(infile, outfile, callback=callback_for_filename)
-
-
-def download_covid(filedate, out_path, ftp_conn):
-    """Download files necessary to create chng-covid signal from ftp server.
+    if open_channel is None or len(files_to_download) <= 1:
+        for fileattr in files_to_download:
+            download_file(sftp, fileattr, out_path)
+        return
+    pending = queue.SimpleQueue()
+    for fileattr in files_to_download:
+        pending.put(fileattr)
+    n_workers = min(n_channels, len(files_to_download))
+    with ThreadPoolExecutor(n_workers) as pool:
+        futures = [pool.submit(download_queued, open_channel, pending, out_path)
+                   for _ in range(n_workers)]
+    for future in futures:
+        future.result()
+
+
+def open_count_products(client):
+    """Open an SFTP session of a client in the directory of the count files."""
+    sftp = client.open_sftp()
+    sftp.chdir('/countproducts')
+    return sftp
+
+
+def download_count_products(filedate, out_path, ftp_conn):
+    """Download the count files of a day from ftp server, over parallel SFTP sessions.
 
     Args:
         filedate: YYYYmmdd string for which the files are named
@@ -50,6 +151,7 @@ def download_covid(filedate, out_path, ftp_conn):
         ftp_conn: Dict containing login credentials to ftp server
     """
     # open client
+    client = None
     try:
         client = paramiko.SSHClient()
         client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
@@ -58,38 +160,32 @@ def download_covid(filedate, out_path, ftp_conn):
                        password=ftp_conn["pass"],
                        port=ftp_conn["port"],
                        allow_agent=False, look_for_keys=False)
-        sftp = client.open_sftp()
-
-        sftp.chdir('/countproducts')
-        get_files_from_dir(sftp, filedate, out_path)
+        sftp = open_count_products(client)
+        get_files_from_dir(sftp, filedate, out_path,
+                           open_channel=functools.partial(open_count_products, client))
 
     finally:
         if client:
             client.close()
 
 
-def download_cli(filedate, out_path, ftp_conn):
-    """Download files necessary to create chng-cli signal from ftp server.
+def download_covid(filedate, out_path, ftp_conn):
+    """Download files necessary to create chng-covid signal from ftp server.
 
     Args:
         filedate: YYYYmmdd string for which the files are named
         out_path: Path to local directory into which to download the files
         ftp_conn: Dict containing login credentials to ftp server
     """
-    # open client
-    try:
-        client = paramiko.SSHClient()
-        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+    download_count_products(filedate, out_path, ftp_conn)
 
-        client.connect(ftp_conn["host"], username=ftp_conn["user"],
-                       password=ftp_conn["pass"],
-                       port=ftp_conn["port"],
-                       allow_agent=False, look_for_keys=False)
-        sftp = client.open_sftp()
 
-        sftp.chdir('/countproducts')
-        get_files_from_dir(sftp, filedate, out_path)
+def download_cli(filedate, out_path, ftp_conn):
+    """Download files necessary to create chng-cli signal from ftp server.
 
-    finally:
-        if client:
-            client.close()
+    Args:
+        filedate: YYYYmmdd string for which the files are named
+        out_path: Path to local directory into which to download the files
+        ftp_conn: Dict containing login credentials to ftp server
+    """
+    download_count_products(filedate, out_path, ftp_conn)
@@ -6,16 +6,35 @@ Created: 2020-10-14
 """
 
 # third party
+import numpy as np
 import pandas as pd
+from delphi_utils import apply_dtype_policy
 
 # first party
 from .config import Config
 
 
+def _parse_counts(column, keep):
+    """Return the integer counts of the kept rows of a categorical column of a count file."""
+    codes = column.cat.codes.to_numpy()[keep]
+    if (codes < 0).any():
+        raise ValueError("Cannot convert non-finite values (NA or inf) to integer")
+    values = column.cat.categories.to_numpy()
+    ints = np.zeros(len(values), dtype=np.int64)
+    used = np.unique(codes)
+    # counts between 1 and 3 are coded as "3 or less", we convert to 1
+    ints[used] = [1 if value == "3 or less" else int(value) for value in values[used]]
+    return ints[codes]
+
+
 def load_chng_data(filepath, dropdate, base_geo,
-                   col_names, col_types, counts_col):
+                   col_names, col_types, counts_col, logger=None):
     """Load in and set up daily count data from Change.
 
+    The file is parsed in chunks of Config.LOAD_CHUNK_ROWS rows, and the counts of each chunk are
+    added to a dense array of locations by days before the drop date, so that the memory used is
+    bounded by the size of the aggregated data rather than by that of the file.
+
     Args:
         filepath: path to aggregated data
         dropdate: data drop date (datetime object)
@@ -23,6 +42,7 @@ def load_chng_data(filepath, dropdate, base_geo,
         col_names: column names of data
         col_types: column types of data
         counts_col: name of column containing counts
+        logger: optional logger to report the rows read and the memory used by the counts
 
     Returns:
         cleaned dataframe
@@ -42,39 +62,68 @@ def load_chng_data(filepath, dropdate, base_geo,
     assert date_flag, "'%s' must be present in col_names"%(Config.DATE_COL)
     assert geo_flag, "'fips' must be present in col_names"
 
-    data = pd.read_csv(
+    # all days of the data before the drop date
+    dates = pd.date_range(Config.FIRST_DATA_DATE, dropdate, inclusive="left")
+    n_days = len(dates)
+    # dense sums of the counts of the locations and days seen so far, and the pairs seen
+    geo_positions = {}
+    counts = np.zeros((0, n_days), dtype=np.int64)
+    present = np.zeros((0, n_days), dtype=bool)
+
+    n_rows = 0
+    # reading codes as categories, each distinct value of a chunk is only converted once
+    with pd.read_csv(
         filepath,
         sep=",",
         header=None,
         names=col_names,
-        dtype=col_types,
-    )
-
-    data[Config.DATE_COL] = \
-        pd.to_datetime(data[Config.DATE_COL],errors="coerce")
+        dtype={col: "category" for col in col_types},
+        chunksize=Config.LOAD_CHUNK_ROWS,
+    ) as reader:
+        for chunk in reader:
+            n_rows += len(chunk)
 
-    # restrict to start and end date
-    data = data[
-        (data[Config.DATE_COL] >= Config.FIRST_DATA_DATE) &
-        (data[Config.DATE_COL] < dropdate)
-        ]
+            # day of each row, or -1 if it is not a date before the drop date
+            chunk_dates = pd.to_datetime(chunk[Config.DATE_COL].cat.categories, errors="coerce")
+            in_range = (chunk_dates >= Config.FIRST_DATA_DATE) & (chunk_dates < dropdate)
+            days = np.append(np.where(in_range, dates.searchsorted(chunk_dates.floor("D")), -1),
+                             -1)[chunk[Config.DATE_COL].cat.codes]
+            # position of the location of each row, or -1 if it is missing
+            geos = chunk[base_geo].cat.categories
+            geo_codes = chunk[base_geo].cat.codes.to_numpy()
+            locs = np.array([geo_positions.setdefault(geo, len(geo_positions)) for geo in geos]
+                            + [-1], dtype=np.int64)[geo_codes]
+            keep = days >= 0
 
-    # counts between 1 and 3 are coded as "3 or less", we convert to 1
-    data.loc[data[counts_col] == "3 or less", counts_col] = "1"
-    data[counts_col] = data[counts_col].astype(int)
+            row_counts = _parse_counts(chunk[counts_col], keep)
+            assert (row_counts >= 0).all(), "Counts must be nonnegative"
 
-    assert (
-        (data[counts_col] >= 0).all().all()
-    ), "Counts must be nonnegative"
+            # aggregate age groups (so data is unique by date and base geography)
+            if len(geo_positions) > len(counts):
+                n_geos = max(2 * len(counts), len(geo_positions))
+                counts = np.vstack([counts, np.zeros((n_geos - len(counts), n_days), np.int64)])
+                present = np.vstack([present, np.zeros((n_geos - len(present), n_days), bool)])
+            with_geo = locs[keep] >= 0
+            cells = locs[keep][with_geo] * n_days + days[keep][with_geo]
+            counts += np.bincount(cells, weights=row_counts[with_geo],
+                                  minlength=counts.size).astype(np.int64).reshape(counts.shape)
+            present.reshape(-1)[cells] = True
 
-    # aggregate age groups (so data is unique by date and base geography)
-    data = data.groupby([base_geo, Config.DATE_COL]).sum()
-    data.dropna(inplace=True)  # drop rows with any missing entries
+    geo_ids = np.array(list(geo_positions), dtype=object)
+    order = np.argsort(geo_ids)
+    loc, day = np.nonzero(present[order])
+    data = pd.DataFrame(
+        {counts_col: counts[order][loc, day]},
+        index=pd.MultiIndex.from_arrays([geo_ids[order][loc], dates[day]],
+                                        names=[base_geo, Config.DATE_COL]))
+    data = apply_dtype_policy(data, {counts_col: "count"}, logger)
+    if logger is not None:
+        logger.info("Loaded counts", filepath=filepath, rows=n_rows, aggregated_rows=len(data))
 
     return data
 
 
-def load_combined_data(denom_filepath, covid_filepath, dropdate, base_geo):
+def load_combined_data(denom_filepath, covid_filepath, dropdate, base_geo, logger=None):
     """Load in denominator and covid data, and combine them.
 
     Args:
@@ -82,6 +131,7 @@ def load_combined_data(denom_filepath, covid_filepath, dropdate, base_geo):
         covid_filepath: path to the aggregated covid data
         dropdate: data drop date (datetime object)
         base_geo: base geographic unit before aggregation ('fips')
+        logger: optional logger to report the memory used by the raw data
 
     Returns:
         combined multiindexed dataframe, index 0 is geo_base, index 1 is date
@@ -90,10 +140,22 @@ def load_combined_data(denom_filepath, covid_filepath, dropdate, base_geo):
 
     # load each data stream
     denom_data = load_chng_data(denom_filepath, dropdate, base_geo,
-                     Config.DENOM_COLS, Config.DENOM_DTYPES, Config.DENOM_COL)
+                     Config.DENOM_COLS, Config.DENOM_DTYPES, Config.DENOM_COL, logger)
     covid_data = load_chng_data(covid_filepath, dropdate, base_geo,
-                     Config.COVID_COLS, Config.COVID_DTYPES, Config.COVID_COL)
+                     Config.COVID_COLS, Config.COVID_DTYPES, Config.COVID_COL, logger)
+    return combine_covid_data(denom_data, covid_data)
+
 
+def combine_covid_data(denom_data, covid_data):
+    """Combine loaded denominator and covid data.
+
+    Args:
+        denom_data: denominator data, as returned by `load_chng_data`
+        covid_data: covid data, as returned by `load_chng_data`
+
+    Returns:
+        combined multiindexed dataframe, index 0 is geo_base, index 1 is date
+    """
     # merge data
     data = denom_data.merge(covid_data, how="outer", left_index=True, right_index=True)
     assert data.isna().all(axis=1).sum() == 0, "entire row is NA after merge"
@@ -108,7 +170,7 @@ def load_combined_data(denom_filepath, covid_filepath, dropdate, base_geo):
 
 
 def load_cli_data(denom_filepath, flu_filepath, mixed_filepath, flu_like_filepath,
-                  covid_like_filepath, dropdate, base_geo):
+                  covid_like_filepath, dropdate, base_geo, logger=None):
     """Load in denominator and covid-like data, and combine them.
 
     Args:
@@ -119,6 +181,7 @@ def load_cli_data(denom_filepath, flu_filepath, mixed_filepath, flu_like_filepat
         covid_like_filepath: path to the aggregated covid-like data
         dropdate: data drop date (datetime object)
         base_geo: base geographic unit before aggregation ('fips')
+        logger: optional logger to report the memory used by the raw data
 
     Returns:
         combined multiindexed dataframe, index 0 is geo_base, index 1 is date
@@ -127,16 +190,31 @@ def load_cli_data(denom_filepath, flu_filepath, mixed_filepath, flu_like_filepat
 
     # load each data stream
     denom_data = load_chng_data(denom_filepath, dropdate, base_geo,
-                     Config.DENOM_COLS, Config.DENOM_DTYPES, Config.DENOM_COL)
+                     Config.DENOM_COLS, Config.DENOM_DTYPES, Config.DENOM_COL, logger)
     flu_data = load_chng_data(flu_filepath, dropdate, base_geo,
-                     Config.FLU_COLS, Config.FLU_DTYPES, Config.FLU_COL)
+                     Config.FLU_COLS, Config.FLU_DTYPES, Config.FLU_COL, logger)
     mixed_data = load_chng_data(mixed_filepath, dropdate, base_geo,
-                     Config.MIXED_COLS, Config.MIXED_DTYPES, Config.MIXED_COL)
+                     Config.MIXED_COLS, Config.MIXED_DTYPES, Config.MIXED_COL, logger)
     flu_like_data = load_chng_data(flu_like_filepath, dropdate, base_geo,
-                     Config.FLU_LIKE_COLS, Config.FLU_LIKE_DTYPES, Config.FLU_LIKE_COL)
+                     Config.FLU_LIKE_COLS, Config.FLU_LIKE_DTYPES, Config.FLU_LIKE_COL, logger)
     covid_like_data = load_chng_data(covid_like_filepath, dropdate, base_geo,
-                     Config.COVID_LIKE_COLS, Config.COVID_LIKE_DTYPES, Config.COVID_LIKE_COL)
+                     Config.COVID_LIKE_COLS, Config.COVID_LIKE_DTYPES, Config.COVID_LIKE_COL, logger)
+    return combine_cli_data(denom_data, flu_data, mixed_data, flu_like_data, covid_like_data)
+
+
+def combine_cli_data(denom_data, flu_data, mixed_data, flu_like_data, covid_like_data):
+    """Combine loaded denominator and covid-like data.
 
+    Args:
+        denom_data: denominator data, as returned by `load_chng_data`
+        flu_data: flu data, as returned by `load_chng_data`
+        mixed_data: mixed data, as returned by `load_chng_data`
+        flu_like_data: flu-like data, as returned by `load_chng_data`
+        covid_like_data: covid-like data, as returned by `load_chng_data`
+
+    Returns:
+        combined multiindexed dataframe, index 0 is geo_base, index 1 is date
+    """
     # merge data
     data = denom_data.merge(flu_data, how="outer", left_index=True, right_index=True)
     data = data.merge(mixed_data, how="outer", left_index=True, right_index=True)
@@ -153,3 +231,66 @@ def load_cli_data(denom_filepath, flu_filepath, mixed_filepath, flu_like_filepat
     data = data[["num", "den"]]
 
     return data
+
+
+class CHCRunData:
+    """Input data of a run, parsing each file once and combining them once per numerator type.
+
+    A run produces the sensors of several geographies and weekday settings from the same
+    files; every updater of a numerator type is handed the same combined dataframe, which it
+    must not modify.
+    """
+
+    # columns, column types and counts column of each input file
+    FILE_COLS = {
+        "denom": (Config.DENOM_COLS, Config.DENOM_DTYPES, Config.DENOM_COL),
+        "covid": (Config.COVID_COLS, Config.COVID_DTYPES, Config.COVID_COL),
+        "flu": (Config.FLU_COLS, Config.FLU_DTYPES, Config.FLU_COL),
+        "mixed": (Config.MIXED_COLS, Config.MIXED_DTYPES, Config.MIXED_COL),
+        "flu_like": (Config.FLU_LIKE_COLS, Config.FLU_LIKE_DTYPES, Config.FLU_LIKE_COL),
+        "covid_like": (Config.COVID_LIKE_COLS, Config.COVID_LIKE_DTYPES, Config.COVID_LIKE_COL),
+    }
+
+    def __init__(self, file_dict, dropdate, base_geo, logger=None):
+        """Set up the data of a run; files are only parsed when first needed.
+
+        Args:
+            file_dict: dictionary of the path of each input file, keyed as FILE_COLS
+            dropdate: data drop date (datetime object)
+            base_geo: base geographic unit before aggregation ('fips')
+            logger: optional logger to report the memory used by the raw data
+        """
+        self.file_dict = file_dict
+        self.dropdate = dropdate
+        self.base_geo = base_geo
+        self.logger = logger
+        self._counts = {}
+        self._combined = {}
+
+    def counts(self, name):
+        """Return the data of one input file, as returned by `load_chng_data`."""
+        if name not in self._counts:
+            col_names, col_types, counts_col = self.FILE_COLS[name]
+            self._counts[name] = load_chng_data(self.file_dict[name], self.dropdate,
+                                                self.base_geo, col_names, col_types,
+                                                counts_col, self.logger)
+        return self._counts[name]
+
+    def combined(self, numtype):
+        """Return the numerator and denominator of a numerator type, one of ["covid", "cli"].
+
+        Returns:
+            combined multiindexed dataframe, index 0 is geo_base, index 1 is date; the same
+            dataframe is returned on every call
+        """
+        if numtype not in self._combined:
+            if numtype == "covid":
+                data = combine_covid_data(self.counts("denom"), self.counts("covid"))
+            elif numtype == "cli":
+                data = combine_cli_data(self.counts("denom"), self.counts("flu"),
+                                        self.counts("mixed"), self.counts("flu_like"),
+                                        self.counts("covid_like"))
+            else:
+                raise ValueError(f"Invalid numerator type {numtype}; should be covid or cli.")
+            self._combined[numtype] = data
+        return self._combined[numtype]
@@ -15,7 +15,7 @@ from delphi_utils import get_structured_logger
 
 # first party
 from .download_ftp_files import download_covid, download_cli
-from .load_data import load_combined_data, load_cli_data
+from .load_data import CHCRunData
 from .update_sensor import CHCSensorUpdator
 
 
@@ -107,6 +107,8 @@ def run_module(params: Dict[str, Dict[str, Any]]):
             - "types": list of str, sensor types to generate.
             - "wip_signal": list of str or bool, to be passed to delphi_utils.add_prefix.
             - "ftp_conn": dict, connection information for source FTP.
+            - "weekday_cache_dir" (optional): str, directory in which to keep the weekday
+                effects of the last run, from which the next run starts fitting them.
     """
     start_time = time.time()
 
@@ -155,6 +157,9 @@ def run_module(params: Dict[str, Dict[str, Any]]):
         types = params["indicator"]["types"],
         se = params["indicator"]["se"])
 
+    # each input file is parsed once, and combined once per type, for all geos and weekdays
+    run_data = CHCRunData(file_dict, dropdate_dt, "fips", logger)
+
     ## start generating
     for geo in params["indicator"]["geos"]:
         for numtype in params["indicator"]["types"]:
@@ -172,16 +177,11 @@ def run_module(params: Dict[str, Dict[str, Any]]):
                     weekday,
                     numtype,
                     params["indicator"]["se"],
-                    params["indicator"]["wip_signal"]
+                    params["indicator"]["wip_signal"],
+                    params["indicator"].get("weekday_cache_dir")
                 )
-                if numtype == "covid":
-                    data = load_combined_data(file_dict["denom"],
-                             file_dict["covid"],dropdate_dt,"fips")
-                elif numtype == "cli":
-                    data = load_cli_data(file_dict["denom"],file_dict["flu"],file_dict["mixed"],
-                             file_dict["flu_like"],file_dict["covid_like"],dropdate_dt,"fips")
                 su_inst.update_sensor(
-                    data,
+                    run_data.combined(numtype),
                     params["common"]["export_dir"]
                 )
             logger.info("finished processing", geo = geo)
@@ -7,11 +7,13 @@ Created: 2020-10-14
 # standard packages
 import logging
 from multiprocessing import Pool, cpu_count
+from os.path import join
 
 # third party
 import numpy as np
 import pandas as pd
-from delphi_utils import GeoMapper, add_prefix, create_export_csv
+from delphi_utils import (GeoMapper, LogListener, add_prefix, create_export_csv,
+                          init_worker_logging)
 
 # first party
 from .config import Config
@@ -86,7 +88,8 @@ class CHCSensorUpdator:  # pylint: disable=too-many-instance-attributes
                  weekday,
                  numtype,
                  se,
-                 wip_signal):
+                 wip_signal,
+                 weekday_cache_dir=None):
         """Init Sensor Updator.
 
         Args:
@@ -99,6 +102,8 @@ class CHCSensorUpdator:  # pylint: disable=too-many-instance-attributes
             numtype: type of count data used, one of ["covid", "cli"]
             se: boolean to write out standard errors, if true, use an obfuscated name
             wip_signal: Prefix for WIP signals
+            weekday_cache_dir: directory in which to keep the weekday effects of the last run,
+                from which the next run starts fitting them; None to not keep them
         """
         self.startdate, self.enddate, self.dropdate = [
             pd.to_datetime(t) for t in (startdate, enddate, dropdate)]
@@ -109,6 +114,7 @@ class CHCSensorUpdator:  # pylint: disable=too-many-instance-attributes
         assert self.enddate <= self.dropdate, "end date > drop date"
         self.geo, self.parallel, self.weekday, self.numtype, self.se = geo.lower(), parallel, \
                                                                        weekday, numtype, se
+        self.weekday_cache_dir = weekday_cache_dir
 
         # output file naming
         if self.numtype == "covid":
@@ -181,7 +187,8 @@ class CHCSensorUpdator:  # pylint: disable=too-many-instance-attributes
         """Generate sensor values, and write to csv format.
 
         Args:
-            data: pd.DataFrame with columns num and den
+            data: pd.DataFrame with columns num and den, indexed by fips and date; it is not
+                modified, so that it can be shared by the updaters of a run
             output_path: output path for the csv results
         """
         self.shift_dates()
@@ -189,35 +196,43 @@ class CHCSensorUpdator:  # pylint: disable=too-many-instance-attributes
             (self.burn_in_dates <= self.enddate)
 
         # load data
-        data.reset_index(inplace=True)
-        data_frame = self.geo_reindex(data)
-        # handle if we need to adjust by weekday
-        wd_params = Weekday.get_params(data_frame) if self.weekday else None
+        data_frame = self.geo_reindex(data.reset_index())
+        # handle if we need to adjust by weekday, for all locations at once
+        if self.weekday:
+            wd_params = Weekday.get_params(
+                data_frame,
+                join(self.weekday_cache_dir, f"weekday_params_{self.numtype}.npz")
+                if self.weekday_cache_dir else None
+            )
+            data_frame = Weekday.calc_adjustment(wd_params, data_frame)
         # run sensor fitting code (maybe in parallel)
         if not self.parallel:
             dfs = []
             for geo_id, sub_data in data_frame.groupby(level=0):
                 sub_data.reset_index(level=0,inplace=True)
-                if self.weekday:
-                    sub_data = Weekday.calc_adjustment(wd_params, sub_data)
                 res = CHCSensor.fit(sub_data, self.burnindate, geo_id)
                 res = pd.DataFrame(res).loc[final_sensor_idxs]
                 dfs.append(res)
         else:
             n_cpu = min(10, cpu_count())
             logging.debug("starting pool with {0} workers".format(n_cpu))
-            with Pool(n_cpu) as pool:
+            # workers log through the parent, instead of all writing to stderr
+            with LogListener() as listener, \
+                    Pool(n_cpu, initializer=init_worker_logging,
+                         initargs=(listener.queue,)) as pool:
                 pool_results = []
                 for geo_id, sub_data in data_frame.groupby(level=0,as_index=False):
                     sub_data.reset_index(level=0, inplace=True)
-                    if self.weekday:
-                        sub_data = Weekday.calc_adjustment(wd_params, sub_data)
                     pool_results.append(
                         pool.apply_async(
                             CHCSensor.fit, args=(sub_data, self.burnindate, geo_id,),
                         )
                     )
                 pool_results = [proc.get() for proc in pool_results]
+                # let the workers exit after sending their log events, rather than be
+                # terminated while writing to the queue, which would block the listener
+                pool.close()
+                pool.join()
                 dfs = []
                 for res in pool_results:
                     res = pd.DataFrame(res).loc[final_sensor_idxs]
@@ -8,6 +8,8 @@ Created: 2020-05-06
 import cvxpy as cp
 import numpy as np
 from cvxpy.error import SolverError
+from delphi_utils.weekday import (fit_weekday_params, load_weekday_params, save_weekday_params,
+                                  weekday_factors)
 
 # first party
 from .config import Config
@@ -17,7 +19,7 @@ class Weekday:
     """Class to handle weekday effects."""
 
     @staticmethod
-    def get_params(data):
+    def get_params(data, cache_file=None):
         r"""Correct a signal estimated as numerator/denominator for weekday effects.
 
         The ordinary estimate would be numerator_t/denominator_t for each time point
@@ -52,8 +54,13 @@ class Weekday:
         ll = (numerator * (X*b + log(denominator)) - sum(exp(X*b) + log(denominator)))
                 / num_days
 
+        The problem is solved by `delphi_utils.weekday.fit_weekday_params`, a dedicated
+        interior-point solver, starting from the parameters of the previous run if cache_file
+        exists; if it cannot fit the data, the problem is solved with cvxpy.
+
         Return a matrix of parameters: the entire vector of betas, for each time
-        series column in the data.
+        series column in the data. If cache_file is given, the parameters are also saved to it
+        for the next run.
         """
         tmp = data.reset_index()
         denoms = tmp.groupby(Config.DATE_COL).sum()["den"]
@@ -69,9 +76,22 @@ class Weekday:
         X[:, 6:] = np.eye(X.shape[0])
 
         npnums, npdenoms = np.array(nums), np.array(denoms)
-        params = np.zeros((n_nums, X.shape[1]))
+        init = load_weekday_params(cache_file, nums.index) if cache_file is not None else None
 
         # fit model
+        try:
+            params = fit_weekday_params(npnums, npdenoms, nums.index.dayofweek,
+                                        init=init[0] if init is not None else None)
+        except (RuntimeError, ValueError):
+            params = Weekday._solve_cvxpy(X, npnums, npdenoms)
+
+        if cache_file is not None:
+            save_weekday_params(cache_file, nums.index, params.reshape(n_nums, -1))
+        return params
+
+    @staticmethod
+    def _solve_cvxpy(X, npnums, npdenoms):  # pylint: disable=invalid-name
+        """Solve the problem of `get_params` with cvxpy."""
         b = cp.Variable((X.shape[1]))
         lmbda = cp.Parameter(nonneg=True)
         lmbda.value = 10  # Hard-coded for now, seems robust to changes
@@ -88,13 +108,11 @@ class Weekday:
             # thrown; Rescale the objective function
             prob = cp.Problem(cp.Minimize((-ll + lmbda * penalty) / 1e5))
             _ = prob.solve()
-        params = b.value
-
-        return params
+        return b.value
 
     @staticmethod
-    def calc_adjustment(params, sub_data):
-        """Apply the weekday adjustment to a specific time series.
+    def calc_adjustment(params, data):
+        """Apply the weekday adjustment to the time series of any number of locations.
 
         Extracts the weekday fixed effects from the parameters and uses these to
         adjust the time series.
@@ -111,15 +129,10 @@ class Weekday:
         this case, we only divide the numerator, leaving the denominator unchanged
         -- this has the same effect.
 
+        data is indexed by date, or by location and date as returned by `geo_reindex`. The
+        correction depends only on the date, so the factors exp(alpha_wd) are looked up once per
+        day of week and divided out of every row at once. data is modified in place and returned.
         """
-        tmp = sub_data.reset_index()
-
-        wd_correction = np.zeros((len(tmp["num"])))
-        for wd in range(7):
-            mask = tmp[Config.DATE_COL].dt.dayofweek == wd
-            wd_correction[mask] = tmp.loc[mask, "num"] / (
-                np.exp(params[wd]) if wd < 6 else np.exp(-np.sum(params[:6]))
-            )
-        tmp.loc[:, "num"] = wd_correction
-
-        return tmp.set_index(Config.DATE_COL)
+        dayofweek = data.index.get_level_values(Config.DATE_COL).dayofweek
+        data["num"] = data["num"].to_numpy(dtype=float) / weekday_factors(params)[dayofweek]
+        return data
@@ -1,72 +1,169 @@
 # standard
+import os
+import threading
+
 import pytest
-import mock
-from datetime import datetime as dt
-from datetime import timedelta
+import paramiko
 
 # first party
 from delphi_changehc.download_ftp_files import *
 
-class TestDownloadFTPFiles:
 
-    class MockSFTP:
+class LocalSFTP:
+    """Stands in for an SFTP session serving the files of a local directory."""
+
+    class RemoteFile:
 
-        # Mocks an SFTP connection
-        def __init__(self, attrs):
-            self.attrs = attrs
-            self.num_gets = 0
+        def __init__(self, filepath, fail_after=None):
+            self.file = open(filepath, "rb")
+            self.fail_after = fail_after
 
-        # Attrs are modified time and filename
-        def listdir_attr(self):
-            return self.attrs
+        def __enter__(self):
+            return self
 
-        # Don't download anything, just note that method was called
-        def get(self, infile, outfile, callback=None):
-            self.num_gets += 1
+        def __exit__(self, *args):
+            self.file.close()
+
+        def seek(self, offset):
+            self.file.seek(offset)
+
+        def prefetch(self, file_size=None):
             return
 
+        def read(self, size):
+            # simulate a connection dropping after some bytes
+            if self.fail_after is not None and self.file.tell() + size > self.fail_after:
+                raise paramiko.SSHException("connection lost")
+            return self.file.read(size)
+
+    def __init__(self, root, server):
+        self.root = root
+        self.server = server
+
+    def listdir_attr(self):
+        return [paramiko.SFTPAttributes.from_stat(os.stat(os.path.join(self.root, name)), name)
+                for name in sorted(os.listdir(self.root))]
+
+    def open(self, filename, mode="r"):
+        with self.server.lock:
+            self.server.opened.append(filename)
+            self.server.threads.add(threading.get_ident())
+        return self.RemoteFile(os.path.join(self.root, filename), self.server.fail_after)
+
+    def close(self):
+        with self.server.lock:
+            self.server.closed += 1
+
+
+class LocalSFTPServer:
+    """Opens stand-in SFTP sessions of a local directory, recording the files they download."""
 
-    class FileAttr:
+    def __init__(self, root):
+        self.root = root
+        self.lock = threading.Lock()
+        self.opened = []
+        self.threads = set()
+        self.closed = 0
+        self.fail_after = None
 
-        def __init__(self, time, name):
-            self.st_mtime = time
-            self.filename = name
+    def open_sftp(self):
+        return LocalSFTP(self.root, self)
 
 
-    @mock.patch("os.path")
-    def test_get_files(self, mock_path):
+def write_remote(root, filename, contents, mtime=1600000000):
+    filepath = os.path.join(root, filename)
+    with open(filepath, "wb") as f:
+        f.write(contents)
+    os.utime(filepath, (mtime, mtime))
+
+
+class TestDownloadFTPFiles:
+
+    @pytest.fixture
+    def server(self, tmp_path):
+        (tmp_path / "remote").mkdir()
+        (tmp_path / "local").mkdir()
+        return LocalSFTPServer(str(tmp_path / "remote"))
+
+    def test_get_files(self, server, tmp_path):
+        out_path = str(tmp_path / "local")
 
         # When one new file is present, one file is downloaded
-        one_new = self.MockSFTP([
-            self.FileAttr(dt.timestamp(dt.now()-timedelta(minutes=1)), "00001122_foo")
-        ])
-        get_files_from_dir(one_new, "00001122", "")
-        assert one_new.num_gets == 1
+        write_remote(server.root, "00001122_foo", b"foo")
+        get_files_from_dir(server.open_sftp(), "00001122", out_path)
+        assert server.opened == ["00001122_foo"]
+        with open(os.path.join(out_path, "00001122_foo"), "rb") as f:
+            assert f.read() == b"foo"
 
         # When one new file and one old file are present, one file is downloaded
-        one_new_one_old = self.MockSFTP([
-            self.FileAttr(dt.timestamp(dt.now()-timedelta(minutes=1)), "00005566_foo"),
-            self.FileAttr(dt.timestamp(dt.now()-timedelta(days=10)), "00001122_foo")
-        ])
-        get_files_from_dir(one_new_one_old, "00005566", "")
-        assert one_new_one_old.num_gets == 1
+        write_remote(server.root, "00005566_foo", b"bar")
+        get_files_from_dir(server.open_sftp(), "00005566", out_path)
+        assert server.opened == ["00001122_foo", "00005566_foo"]
+
+        # When the file already exists with the remote size and time, no files are downloaded
+        get_files_from_dir(server.open_sftp(), "00001122", out_path)
+        assert len(server.opened) == 2
+        # but a revised file is downloaded again
+        write_remote(server.root, "00001122_foo", b"foo2", mtime=1600000100)
+        get_files_from_dir(server.open_sftp(), "00001122", out_path)
+        assert len(server.opened) == 3
+        with open(os.path.join(out_path, "00001122_foo"), "rb") as f:
+            assert f.read() == b"foo2"
+        assert os.stat(os.path.join(out_path, "00001122_foo")).st_mtime == 1600000100
 
         # When seven new files are present, AssertionError
-        new_file1 = self.FileAttr(dt.timestamp(dt.now()), "00001122_foo1")
-        new_file2 = self.FileAttr(dt.timestamp(dt.now()), "00001122_foo2")
-        new_file3 = self.FileAttr(dt.timestamp(dt.now()), "00001122_foo3")
-        new_file4 = self.FileAttr(dt.timestamp(dt.now()), "00001122_foo4")
-        new_file5 = self.FileAttr(dt.timestamp(dt.now()), "00001122_foo5")
-        new_file6 = self.FileAttr(dt.timestamp(dt.now()), "00001122_foo6")
-        new_file7 = self.FileAttr(dt.timestamp(dt.now()), "00001122_foo7")
-        seven_new = self.MockSFTP([new_file1, new_file2, new_file3, new_file4,
-                                    new_file5, new_file6, new_file7])
+        for i in range(1, 8):
+            write_remote(server.root, f"00007788_foo{i}", b"foo")
         with pytest.raises(AssertionError):
-            get_files_from_dir(seven_new, "00001122", "")
-
-        # When the file already exists, no files are downloaded
-        mock_path.exists.return_value = True
-        one_exists = self.MockSFTP([new_file1])
-        get_files_from_dir(one_new, "00001122", "")
-        assert one_exists.num_gets == 0
-        
+            get_files_from_dir(server.open_sftp(), "00007788", out_path)
+
+    def test_parallel(self, server, tmp_path):
+        out_path = str(tmp_path / "local")
+        for i in range(6):
+            write_remote(server.root, f"00001122_foo{i}", os.urandom(100000 + i))
+        get_files_from_dir(server.open_sftp(), "00001122", out_path,
+                           open_channel=server.open_sftp, n_channels=3)
+        assert sorted(server.opened) == [f"00001122_foo{i}" for i in range(6)]
+        assert len(server.threads) <= 3
+        assert server.closed == 3
+        for i in range(6):
+            with open(os.path.join(server.root, f"00001122_foo{i}"), "rb") as remote, \
+                    open(os.path.join(out_path, f"00001122_foo{i}"), "rb") as local:
+                assert local.read() == remote.read()
+
+    def test_resume(self, server, tmp_path):
+        out_path = str(tmp_path / "local")
+        contents = os.urandom(5000)
+        write_remote(server.root, "00001122_foo", contents)
+        fileattr = server.open_sftp().listdir_attr()[0]
+
+        # an interrupted download leaves a partial file
+        server.fail_after = 3000
+        with pytest.raises(paramiko.SSHException):
+            download_file(server.open_sftp(), fileattr, out_path, block_bytes=1000)
+        assert not os.path.exists(os.path.join(out_path, "00001122_foo"))
+        part = partial_path(fileattr, out_path)
+        assert os.path.getsize(part) == 3000
+
+        # which is resumed from its end
+        server.fail_after = None
+        with open(part, "r+b") as f:
+            f.write(b"x" * 3000)
+        download_file(server.open_sftp(), fileattr, out_path, block_bytes=1000)
+        with open(os.path.join(out_path, "00001122_foo"), "rb") as f:
+            resumed = f.read()
+        assert resumed == b"x" * 3000 + contents[3000:]
+        assert not os.path.exists(part)
+
+        # partial files of a previous version of the file are not resumed
+        server.fail_after = 3000
+        write_remote(server.root, "00001122_bar", contents)
+        old_attr = server.open_sftp().listdir_attr()[0]
+        with pytest.raises(paramiko.SSHException):
+            download_file(server.open_sftp(), old_attr, out_path, block_bytes=1000)
+        server.fail_after = None
+        write_remote(server.root, "00001122_bar", contents[::-1], mtime=1600000100)
+        get_files_from_dir(server.open_sftp(), "00001122_bar", out_path)
+        with open(os.path.join(out_path, "00001122_bar"), "rb") as f:
+            assert f.read() == contents[::-1]
+        assert sorted(os.listdir(out_path)) == ["00001122_bar", "00001122_foo"]
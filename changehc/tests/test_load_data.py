@@ -99,3 +99,45 @@ class TestLoadData:
 
         assert self.combined_data["num"].sum() == sum_fips_num
         assert self.combined_data["den"].sum() == sum_fips_den
+
+    def test_run_data(self):
+        run_data = CHCRunData({"denom": DENOM_FILEPATH, "covid": COVID_FILEPATH},
+                              DROP_DATE, "fips")
+        combined = run_data.combined("covid")
+        pd.testing.assert_frame_equal(combined, self.combined_data)
+        # each file is parsed, and the counts combined, once per run
+        assert run_data.combined("covid") is combined
+        assert run_data.counts("denom") is run_data.counts("denom")
+        with pytest.raises(ValueError):
+            run_data.combined("flu")
+
+    def test_chunks(self, monkeypatch):
+        monkeypatch.setattr(Config, "LOAD_CHUNK_ROWS", 100)
+        chunked = load_chng_data(DENOM_FILEPATH, DROP_DATE, "fips",
+                                 Config.DENOM_COLS, Config.DENOM_DTYPES, Config.DENOM_COL)
+        pd.testing.assert_frame_equal(chunked, self.denom_data)
+
+    def test_count_rows(self, tmp_path):
+        filepath = str(tmp_path / "counts.dat")
+        with open(filepath, "w") as f:
+            f.write("0,2020-05-01,01001,3 or less\n"
+                    "1,2020-05-01,01001,10\n"
+                    "2,2020-05-02,01001,5\n"
+                    "3,2020-06-01,01001,7\n"
+                    "4,2020-05-01,02013,3 or less\n"
+                    "5,2020-05-03,,4\n")
+        data = load_chng_data(filepath, DROP_DATE, "fips",
+                              Config.DENOM_COLS, Config.DENOM_DTYPES, Config.DENOM_COL)
+        expected = pd.DataFrame(
+            {"Denominator": [11, 5, 1]},
+            index=pd.MultiIndex.from_tuples(
+                [("01001", pd.Timestamp("2020-05-01")), ("01001", pd.Timestamp("2020-05-02")),
+                 ("02013", pd.Timestamp("2020-05-01"))], names=["fips", "date"]),
+            dtype="int32")
+        pd.testing.assert_frame_equal(data, expected)
+
+        with open(filepath, "a") as f:
+            f.write("6,2020-05-04,01001,\n")
+        with pytest.raises(ValueError):
+            load_chng_data(filepath, DROP_DATE, "fips",
+                           Config.DENOM_COLS, Config.DENOM_DTYPES, Config.DENOM_COL)
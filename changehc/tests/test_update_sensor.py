@@ -92,6 +92,17 @@ class TestCHCSensorUpdator:
     def test_update_sensor(self):
         """Tests that the sensors are properly updated."""
         outputs = {}
+        # As of 3/3/21 (40c258a), this set of data has county outputting data, state and hhs not
+        # outputting data, and nation outputting data, which is undesirable. Ideal behaviour
+        # should be all output or a subregion only outputting if its parent has output,
+        # which is what is being tested here.
+        small_test_data = pd.DataFrame({
+            "num": [0, 100, 200, 300, 400, 500, 600, 100, 200, 300, 400, 500, 600] * 2,
+            "fips": ["01001"] * 13 + ["42003"] * 13,
+            "den": [30, 50, 50, 10, 1, 5, 5, 50, 50, 50, 0, 0, 0] * 2,
+            "date": list(pd.date_range("20200301", "20200313")) * 2
+        }).set_index(["fips", "date"])
+        original_data = small_test_data.copy()
         for geo in ["county", "state", "hhs", "nation"]:
             td = TemporaryDirectory()
             su_inst = CHCSensorUpdator(
@@ -105,17 +116,9 @@ class TestCHCSensorUpdator:
                 self.se,
                 ""
             )
-            # As of 3/3/21 (40c258a), this set of data has county outputting data, state and hhs not
-            # outputting data, and nation outputting data, which is undesirable. Ideal behaviour
-            # should be all output or a subregion only outputting if its parent has output,
-            # which is what is being tested here.
-            small_test_data = pd.DataFrame({
-                "num": [0, 100, 200, 300, 400, 500, 600, 100, 200, 300, 400, 500, 600] * 2,
-                "fips": ["01001"] * 13 + ["42003"] * 13,
-                "den": [30, 50, 50, 10, 1, 5, 5, 50, 50, 50, 0, 0, 0] * 2,
-                "date": list(pd.date_range("20200301", "20200313")) * 2
-            }).set_index(["fips", "date"])
+            # the data is shared by the updaters of all geos, as in a run
             su_inst.update_sensor(small_test_data,  td.name)
+            pd.testing.assert_frame_equal(small_test_data, original_data)
             for f in os.listdir(td.name):
                 outputs[f] = pd.read_csv(os.path.join(td.name, f))
 
@@ -34,13 +34,22 @@ class Config:
     CLAIMS_DATE_COL = "ServiceDate"
     CLAIMS_RENAME_COLS = {"Pat HRR ID": "hrr", "ServiceDate": "date",
                           "PatCountyFIPS": "fips", "PatAgeGroup": "age_group"}
+    # codes are read as categories, so that no column of strings is built for the whole file
     CLAIMS_DTYPES = {
         "ServiceDate": str,
-        "PatCountyFIPS": str,
+        "PatCountyFIPS": "category",
         "Denominator": float,
         "Covid_like": float,
-        "PatAgeGroup": str,
-        "Pat HRR ID": str,
+        "PatAgeGroup": "category",
+        "Pat HRR ID": "category",
+    }
+    # memory-lean dtypes of the renamed columns, see delphi_utils.dtypes
+    CLAIMS_DTYPE_POLICY = {
+        "fips": "category",
+        "hrr": "category",
+        "age_group": "category",
+        "Denominator": "count",
+        "Covid_like": "count",
     }
 
     FIPS_COL = "fips"
@@ -8,12 +8,13 @@ Created: 2020-09-27
 
 # third party
 import pandas as pd
+from delphi_utils import apply_dtype_policy
 
 # first party
 from .config import Config
 
 
-def load_claims_data(claims_filepath, dropdate, base_geo):
+def load_claims_data(claims_filepath, dropdate, base_geo, logger=None):
     """
     Load in and set up claims data.
 
@@ -21,6 +22,7 @@ def load_claims_data(claims_filepath, dropdate, base_geo):
         claims_filepath: path to the aggregated claims data
         dropdate: data drop date (datetime object)
         base_geo: base geographic unit before aggregation (either 'fips' or 'hrr')
+        logger: optional logger to report the memory used by the raw data
 
     Returns:
         cleaned claims dataframe
@@ -36,6 +38,7 @@ def load_claims_data(claims_filepath, dropdate, base_geo):
 
     # standardize naming
     claims_data.rename(columns=Config.CLAIMS_RENAME_COLS, inplace=True)
+    claims_data = apply_dtype_policy(claims_data, Config.CLAIMS_DTYPE_POLICY, logger)
 
     # restrict to start and end date
     claims_data = claims_data[
@@ -47,14 +50,19 @@ def load_claims_data(claims_filepath, dropdate, base_geo):
         (claims_data[Config.CLAIMS_COUNT_COLS] >= 0).all().all()
     ), "Claims counts must be nonnegative"
 
-    # aggregate age groups (so data is unique by date and base geography)
-    claims_data = claims_data.groupby([base_geo, "date"]).sum()
+    # aggregate age groups (so data is unique by date and base geography); sums of the lean
+    # counts are exact, and are kept as floats as the counts were read
+    claims_data = claims_data.groupby(
+        [base_geo, Config.DATE_COL], observed=True)[Config.CLAIMS_COUNT_COLS].sum().astype(float)
     claims_data.dropna(inplace=True)  # drop rows with any missing entries
+    # the aggregated data is small, so keep plain geo codes for the geo mapping
+    claims_data.index = claims_data.index.set_levels(
+        claims_data.index.levels[0].astype(str), level=0)
 
     return claims_data
 
 
-def load_data(input_filepath, dropdate, base_geo):
+def load_data(input_filepath, dropdate, base_geo, logger=None):
     """
     Load in claims data, and combine them.
 
@@ -62,6 +70,7 @@ def load_data(input_filepath, dropdate, base_geo):
         input_filepath: path to the aggregated data
         dropdate: data drop date (datetime object)
         base_geo: base geographic unit before aggregation (either 'fips' or 'hrr')
+        logger: optional logger to report the memory used by the raw data
 
     Returns:
         combined multiindexed dataframe, index 0 is geo_base, index 1 is date
@@ -69,7 +78,7 @@ def load_data(input_filepath, dropdate, base_geo):
     assert base_geo in ["fips", "hrr"], "base unit must be either 'fips' or 'hrr'"
 
     # load data stream
-    data = load_claims_data(input_filepath, dropdate, base_geo)
+    data = load_claims_data(input_filepath, dropdate, base_geo, logger)
 
     # rename numerator and denominator
     data.fillna(0, inplace=True)
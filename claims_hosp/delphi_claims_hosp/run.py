@@ -47,6 +47,8 @@ def run_module(params):
             - "weekday": list of bool, which weekday adjustments to perform. For each value in the
                 list, signals will be generated with weekday adjustments (True) or without
                 adjustments (False).
+            - "weekday_cache_dir" (optional): str, directory in which to keep the weekday
+                effects of the last run, from which the next run starts fitting them.
     """
     start_time = time.time()
     logger = get_structured_logger(
@@ -111,7 +113,8 @@ def run_module(params):
                 params["indicator"]["parallel"],
                 weekday,
                 params["indicator"]["write_se"],
-                signal_name
+                signal_name,
+                params["indicator"].get("weekday_cache_dir")
             )
             updater.update_indicator(params["indicator"]["input_file"],
                                      params["common"]["export_dir"])
@@ -9,11 +9,12 @@ Created: 2020-09-27
 # standard packages
 import logging
 from multiprocessing import Pool, cpu_count
+from os.path import join
 
 # third party
 import numpy as np
 import pandas as pd
-from delphi_utils import GeoMapper
+from delphi_utils import GeoMapper, LogListener, init_worker_logging
 
 # first party
 from .config import Config, GeoConstants
@@ -29,7 +30,7 @@ class ClaimsHospIndicatorUpdater:
     # all variables are used
 
     def __init__(self, startdate, enddate, dropdate, geo, parallel, weekday,
-                 write_se, signal_name):
+                 write_se, signal_name, weekday_cache_dir=None):
         """
         Initialize updater for the claims-based hospitalization indicator.
 
@@ -42,6 +43,8 @@ class ClaimsHospIndicatorUpdater:
             weekday: boolean to adjust for weekday effects
             write_se: boolean to write out standard errors, if true, use an obfuscated name
             signal_name: string signal name
+            weekday_cache_dir: directory in which to keep the weekday effects of the last run,
+                from which the next run starts fitting them; None to not keep them
 
         """
         self.startdate, self.enddate, self.dropdate = [pd.to_datetime(t) for t in
@@ -49,6 +52,7 @@ class ClaimsHospIndicatorUpdater:
 
         self.geo, self.parallel, self.weekday, self.write_se, self.signal_name = \
             geo.lower(), parallel, weekday, write_se, signal_name
+        self.weekday_cache_dir = weekday_cache_dir
 
         # init in shift_dates, declared here for pylint
         self.burnindate, self.fit_dates, self.burn_in_dates, self.output_dates = \
@@ -151,8 +155,14 @@ class ClaimsHospIndicatorUpdater:
         data = load_data(input_filepath, self.dropdate, base_geo)
         data_frame = self.geo_reindex(data)
 
-        # handle if we need to adjust by weekday
-        wd_params = Weekday.get_params(data_frame) if self.weekday else None
+        # handle if we need to adjust by weekday, for all locations at once
+        if self.weekday:
+            wd_params = Weekday.get_params(
+                data_frame,
+                join(self.weekday_cache_dir, "weekday_params.npz")
+                if self.weekday_cache_dir else None
+            )
+            data_frame = Weekday.calc_adjustment(wd_params, data_frame)
 
         # run fitting code (maybe in parallel)
         rates = {}
@@ -161,8 +171,6 @@ class ClaimsHospIndicatorUpdater:
         if not self.parallel:
             for geo_id, sub_data in data_frame.groupby(level=0):
                 sub_data.reset_index(level=0, inplace=True)
-                if self.weekday:
-                    sub_data = Weekday.calc_adjustment(wd_params, sub_data)
                 res = ClaimsHospIndicator.fit(sub_data, self.burnindate, geo_id)
                 res = pd.DataFrame(res)
                 rates[geo_id] = np.array(res.loc[final_output_inds, "rate"])
@@ -171,12 +179,13 @@ class ClaimsHospIndicatorUpdater:
         else:
             n_cpu = min(Config.MAX_CPU_POOL, cpu_count())
             logging.debug("starting pool with %d workers", n_cpu)
-            with Pool(n_cpu) as pool:
+            # workers log through the parent, instead of all writing to stderr
+            with LogListener() as listener, \
+                    Pool(n_cpu, initializer=init_worker_logging,
+                         initargs=(listener.queue,)) as pool:
                 pool_results = []
                 for geo_id, sub_data in data_frame.groupby(level=0, as_index=False):
                     sub_data.reset_index(level=0, inplace=True)
-                    if self.weekday:
-                        sub_data = Weekday.calc_adjustment(wd_params, sub_data)
                     pool_results.append(
                         pool.apply_async(
                             ClaimsHospIndicator.fit,
@@ -184,6 +193,10 @@ class ClaimsHospIndicatorUpdater:
                         )
                     )
                 pool_results = [proc.get() for proc in pool_results]
+                # let the workers exit after sending their log events, rather than be
+                # terminated while writing to the queue, which would block the listener
+                pool.close()
+                pool.join()
                 for res in pool_results:
                     geo_id = res["geo_id"]
                     res = pd.DataFrame(res)
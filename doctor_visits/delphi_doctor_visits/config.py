@@ -26,11 +26,16 @@ class Config:
     HRR_COLS = ["Pat HRR Name", "Pat HRR ID"]
     ID_COLS = [DATE_COL] + [GEO_COL] + [AGE_COL] + HRR_COLS
     FILT_COLS = ID_COLS + COUNT_COLS
-    DTYPES = {"ServiceDate": str, "PatCountyFIPS": str,
+    # codes are read as categories, so that no column of strings is built for the whole drop
+    DTYPES = {"ServiceDate": str, "PatCountyFIPS": "category",
               "Denominator": int, "Flu1": int,
               "Covid_like": int, "Flu_like": int,
-              "Mixed": int, "PatAgeGroup": str,
-              "Pat HRR Name": str, "Pat HRR ID": float}
+              "Mixed": int, "PatAgeGroup": "category",
+              "Pat HRR Name": "category", "Pat HRR ID": float}
+    CATEGORY_COLS = [col for col, dtype in DTYPES.items() if dtype == "category"]
+    # memory-lean dtypes of the columns kept after reading, see delphi_utils.dtypes
+    DTYPE_POLICY = {GEO_COL: "category", AGE_COL: "category",
+                    **{col: "count" for col in COUNT_COLS}}
 
     SMOOTHER_BANDWIDTH = 100  # bandwidth for the linear left Gaussian filter
     MAX_BACKFILL_WINDOW = 7  # maximum number of days used to average a backfill correction
@@ -38,3 +43,5 @@ class Config:
     RECENT_LENGTH = 7  # number of days to sum over for sparsity threshold
     MIN_RECENT_VISITS = 100  # min numbers of visits needed to include estimate
     MIN_RECENT_OBS = 3  # minimum days needed to produce an estimate for latest time
+    MAX_LOCATIONS_PER_FIT = 500  # number of locations fit at once, to bound memory use
+    DROP_CACHE_BLOCK_BYTES = 2 ** 22  # size of the blocks of a drop compared to the cached drop
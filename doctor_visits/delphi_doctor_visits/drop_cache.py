@@ -0,0 +1,235 @@
+"""Parse doctor-visits drops, keeping their prepared counts in a columnar cache.
+
+Every drop holds the whole history of the counts, and most of it is the same as in the previous
+drop.  `load_prepared_data` keeps the deduplicated, age-aggregated county/day counts of the last
+drop in an npz file, with a digest of each block of the drop's decompressed text and the range of
+service dates in the block.  A new drop is compared to the cache block by block: the dates that
+only appear in the leading unchanged blocks are taken from the cache, and only the blocks holding
+the other dates are parsed.  Drops that are sorted by service date, revising the most recent days
+and adding a new one, are thus read in seconds.
+"""
+import gzip
+import hashlib
+from io import BytesIO
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+from delphi_utils import apply_dtype_policy
+
+from .config import Config
+
+CACHE_VERSION = 1
+# length of the SHA-1 digests of the blocks
+DIGEST_BYTES = hashlib.sha1().digest_size
+# service dates of blocks with rows missing a date, so that such rows are always compared
+EARLIEST_DATE = np.datetime64("0001-01-01")
+LATEST_DATE = np.datetime64("9999-12-31")
+
+
+def parse_rows(source):
+    """Read the rows of a doctor-visits drop from a file path or a buffer holding CSV text."""
+    # as of 2020-05-11, input file expected to have 10 columns
+    # id cols: ServiceDate, PatCountyFIPS, PatAgeGroup, Pat HRR ID/Pat HRR Name
+    # value cols: Denominator, Covid_like, Flu_like, Flu1, Mixed
+    return pd.read_csv(
+        source,
+        usecols=Config.FILT_COLS,
+        dtype=Config.DTYPES,
+        parse_dates=[Config.DATE_COL],
+    )
+
+
+def aggregate_rows(data):
+    """Check the rows of a drop and aggregate them to daily county counts.
+
+    Args:
+      data: rows as returned by `parse_rows`
+
+    Returns:
+      dataframe with columns ServiceDate, PatCountyFIPS and the count columns, sorted by date
+      and county
+    """
+    assert (
+            np.sum(data.duplicated(subset=Config.ID_COLS)) == 0
+    ), "Duplicated data! Check the input file"
+
+    # drop HRR columns - unused for now since we assign HRRs by FIPS
+    data = data.drop(columns=Config.HRR_COLS)
+    data.dropna(inplace=True)  # drop rows with any missing entries
+    data = apply_dtype_policy(data, Config.DTYPE_POLICY)
+
+    # aggregate age groups (so data is unique by service date and FIPS)
+    data = data.groupby(
+        [Config.DATE_COL, Config.GEO_COL], observed=True).sum(numeric_only=True).reset_index()
+    # the aggregated data is small, so keep plain geo codes for the geo mapping
+    data[Config.GEO_COL] = data[Config.GEO_COL].astype(str)
+    # observed groups come in the order of the drop, so sort them for merging with the cache
+    data.sort_values([Config.DATE_COL, Config.GEO_COL], ignore_index=True, inplace=True)
+    assert np.sum(data.duplicated()) == 0, "Duplicates after age group aggregation"
+    assert (data[Config.COUNT_COLS] >= 0).all().all(), "Counts must be nonnegative"
+    return data
+
+
+def _open_drop(filepath):
+    """Open a drop for reading its decompressed bytes."""
+    if str(filepath).endswith(".gz"):
+        return gzip.open(filepath, "rb")
+    return open(filepath, "rb")
+
+
+def _read_blocks(stream, block_bytes):
+    """Yield the text after the header in blocks of whole lines, of about block_bytes each.
+
+    The blocks only depend on the text up to their end, so two drops starting with the same text
+    are cut the same way up to where they differ.
+    """
+    rest = b""
+    while True:
+        chunk = stream.read(block_bytes)
+        if not chunk:
+            break
+        chunk = rest + chunk
+        cut = chunk.rfind(b"\n") + 1
+        if cut == 0:
+            rest = chunk
+            continue
+        yield chunk[:cut]
+        rest = chunk[cut:]
+    if rest:
+        yield rest
+
+
+def _date_range(dates):
+    """Return the first and last service dates of some rows; missing dates count as earliest."""
+    values = dates.to_numpy(dtype="datetime64[D]")
+    present = values[~np.isnat(values)]
+    first = present.min() if len(present) > 0 else LATEST_DATE
+    last = present.max() if len(present) > 0 else EARLIEST_DATE
+    if len(present) < len(values):
+        first = EARLIEST_DATE
+    return first, last
+
+
+def _concat_rows(parsed, header):
+    """Concatenate the rows parsed from blocks, in the order of the blocks."""
+    if not parsed:
+        return parse_rows(BytesIO(header))
+    blocks = [parsed[i] for i in sorted(parsed)]
+    # code columns stay categorical only if all blocks share their categories
+    for col in Config.CATEGORY_COLS:
+        categories = union_categoricals([block[col] for block in blocks]).categories
+        for block in blocks:
+            block[col] = block[col].cat.set_categories(categories)
+    return pd.concat(blocks, ignore_index=True)
+
+
+def _load_cache(cache_file):
+    """Return the arrays of the cache file as a dict, or None if it does not exist."""
+    if not os.path.exists(cache_file):
+        return None
+    with np.load(cache_file) as cached:
+        if int(cached["version"]) != CACHE_VERSION:
+            return None
+        return {key: cached[key] for key in cached.files}
+
+
+def _save_cache(cache_file, header, digests, first_dates, last_dates, data):
+    """Write the block digests and prepared counts of a drop, replacing the file atomically."""
+    directory = os.path.dirname(cache_file)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # write to a temporary file first so that an interrupted run leaves the old file intact
+    tmp_file = f"{cache_file}.tmp.npz"
+    np.savez(
+        tmp_file,
+        version=CACHE_VERSION,
+        header=np.frombuffer(header, dtype=np.uint8),
+        digests=np.stack(digests) if digests else np.zeros((0, DIGEST_BYTES), dtype=np.uint8),
+        first_dates=np.array(first_dates, dtype="datetime64[D]"),
+        last_dates=np.array(last_dates, dtype="datetime64[D]"),
+        dates=data[Config.DATE_COL].to_numpy(dtype="datetime64[D]"),
+        geos=data[Config.GEO_COL].to_numpy(dtype=str),
+        counts=data[Config.COUNT_COLS].to_numpy(dtype=np.int64),
+    )
+    os.replace(tmp_file, cache_file)
+
+
+def load_prepared_data(filepath, cache_dir, block_bytes=Config.DROP_CACHE_BLOCK_BYTES):
+    """Load the daily county counts of a drop, reusing those of the previous drop where unchanged.
+
+    Args:
+      filepath: path to the aggregated doctor-visits data
+      cache_dir: directory of the cache, which is created or updated for this drop
+      block_bytes: approximate size of the blocks of text compared to the previous drop
+
+    Returns:
+      dataframe as returned by `aggregate_rows` for all rows of the drop
+    """
+    cache_file = os.path.join(cache_dir, "prepared_drop.npz")
+    cached = _load_cache(cache_file)
+
+    # compare the drop to the cached one, parsing the blocks after the first that differs
+    digests, first_dates, last_dates = [], [], []
+    parsed = {}
+    with _open_drop(filepath) as stream:
+        header = stream.readline()
+        n_same = 0
+        same = cached is not None and cached["header"].tobytes() == header
+        for block in _read_blocks(stream, block_bytes):
+            digest = hashlib.sha1(block).digest()
+            if same and n_same < len(cached["digests"]) and \
+                    digest == cached["digests"][n_same].tobytes():
+                first_dates.append(cached["first_dates"][n_same])
+                last_dates.append(cached["last_dates"][n_same])
+                n_same += 1
+            else:
+                same = False
+                rows = parse_rows(BytesIO(header + block))
+                first, last = _date_range(rows[Config.DATE_COL])
+                first_dates.append(first)
+                last_dates.append(last)
+                parsed[len(digests)] = rows
+            digests.append(np.frombuffer(digest, dtype=np.uint8))
+
+    if n_same == 0:
+        data = aggregate_rows(_concat_rows(parsed, header))
+    else:
+        # dates of changed blocks, in this drop or in the previous one
+        changed_first = min(first_dates[n_same:] + list(cached["first_dates"][n_same:]),
+                            default=LATEST_DATE)
+        changed_last = max(last_dates[n_same:] + list(cached["last_dates"][n_same:]),
+                           default=EARLIEST_DATE)
+        # unchanged blocks sharing these dates are parsed again
+        shared = [i for i in range(n_same)
+                  if first_dates[i] <= changed_last and last_dates[i] >= changed_first]
+        if shared:
+            with _open_drop(filepath) as stream:
+                stream.readline()
+                for i, block in enumerate(_read_blocks(stream, block_bytes)):
+                    if i in shared:
+                        parsed[i] = parse_rows(BytesIO(header + block))
+                    if i >= shared[-1]:
+                        break
+
+        cached_dates = cached["dates"]
+        kept = (cached_dates < changed_first) | (cached_dates > changed_last)
+        cached_data = pd.DataFrame({
+            Config.DATE_COL: pd.to_datetime(cached_dates[kept]),
+            Config.GEO_COL: cached["geos"][kept].astype(object),
+            **dict(zip(Config.COUNT_COLS, cached["counts"][kept].T)),
+        })
+        rows = _concat_rows(parsed, header)
+        row_dates = rows[Config.DATE_COL].to_numpy(dtype="datetime64[D]")
+        rows = rows[np.isnat(row_dates) |
+                    ((row_dates >= changed_first) & (row_dates <= changed_last))]
+        data = pd.concat([cached_data, aggregate_rows(rows)], ignore_index=True)
+        data = data.sort_values([Config.DATE_COL, Config.GEO_COL], ignore_index=True)
+        data = apply_dtype_policy(data, {col: "count" for col in Config.COUNT_COLS})
+        logging.info("reused the counts of %s of %s blocks of the cached drop, parsed %s",
+                     n_same - len(shared), len(digests), len(parsed))
+
+    _save_cache(cache_file, header, digests, first_dates, last_dates, data)
+    return data
@@ -8,10 +8,13 @@ when the module is run with `python -m delphi_doctor_visits`.
 # standard packages
 import logging
 from datetime import datetime, timedelta
+from os.path import join
 from pathlib import Path
 
 # first party
-from .update_sensor import update_sensor, write_to_csv
+from .geo_maps import GeoMaps
+from .update_sensor import compute_sensor, load_data, write_to_csv
+from .weekday import Weekday
 
 
 def run_module(params):
@@ -36,6 +39,11 @@ def run_module(params):
             - "se": bool, whether to write out standard errors
             - "obfuscated_prefix": str, prefix for signal name if write_se is True.
             - "parallel": bool, whether to update sensor in parallel.
+            - "weekday_cache_dir" (optional): str, directory in which to keep the weekday
+                effects of the last run, from which the next run starts fitting them.
+            - "drop_cache_dir" (optional): str, directory in which to keep the prepared counts
+                of the last drop, so that the next run only parses the part of its drop that
+                changed.
     """
     logging.basicConfig(level=logging.DEBUG)
 
@@ -78,6 +86,18 @@ def run_module(params):
     logging.info("write se:\t\t%s", se)
     logging.info("obfuscated prefix:\t%s", prefix)
 
+    ## load and prepare the drop once for all geographies and weekday settings
+    data = load_data(params["indicator"]["input_file"], dropdate,
+                     params["indicator"].get("drop_cache_dir"))
+    logging.info("loaded %s rows of county data", len(data))
+    # the weekday effects do not depend on the geography
+    weekday_cache_dir = params["indicator"].get("weekday_cache_dir")
+    weekday_params = Weekday.get_params(
+        data,
+        join(weekday_cache_dir, "weekday_params.npz") if weekday_cache_dir else None
+    ) if any(params["indicator"]["weekday"]) else None
+    geo_map = GeoMaps()
+
     ## start generating
     for geo in geos:
         for weekday in params["indicator"]["weekday"]:
@@ -85,15 +105,16 @@ def run_module(params):
                 logging.info("starting %s, weekday adj", geo)
             else:
                 logging.info("starting %s, no adj", geo)
-            sensor = update_sensor(
-                filepath=params["indicator"]["input_file"],
+            sensor = compute_sensor(
+                data=data,
                 startdate=startdate,
                 enddate=enddate,
                 dropdate=dropdate,
                 geo=geo,
                 parallel=params["indicator"]["parallel"],
-                weekday=weekday,
-                se=params["indicator"]["se"]
+                weekday_params=weekday_params if weekday else None,
+                se=params["indicator"]["se"],
+                geo_map=geo_map
             )
             # write out results
             out_name = "smoothed_adj_cli" if weekday else "smoothed_cli"
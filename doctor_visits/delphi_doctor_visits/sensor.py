@@ -11,6 +11,7 @@ import logging
 
 # third party
 import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
 import pandas as pd
 from sklearn.preprocessing import MinMaxScaler
 
@@ -105,54 +106,83 @@ class DoctorVisitsSensor:
 
         Returns: dataframes of adjusted covid counts, adjusted visit counts, inclusion array
         """
-        revden = den[::-1].values
-        revnum = num[::-1].values
-        new_num = np.full_like(num, np.nan, dtype=float)
-        new_den = np.full_like(den, np.nan, dtype=float)
-        include = np.full_like(den, True, dtype=bool)
-        n, p = num.shape
-
-        for i in range(n):
-            visit_cumsum = revden[i:].cumsum()
-
-            # calculate backfill window
-            closest_fill_day = np.where(visit_cumsum >= min_visits_to_fill)[0]
-            if len(closest_fill_day) > 0:
-                closest_fill_day = min(k, closest_fill_day[0])
-            else:
-                closest_fill_day = k
-
-            if closest_fill_day == 0:
-                new_den[i] = revden[i]
+        new_num, new_den, include = DoctorVisitsSensor.backfill_panel(
+            num.to_numpy(dtype=float).T[None],
+            den.to_numpy(dtype=float)[None],
+            k, min_visits_to_fill, min_visits_to_include, min_recent_obs_to_include
+        )
 
-                for j in range(p):
-                    new_num[i, j] = revnum[i, j]
-            else:
-                den_bin = revden[i: (i + closest_fill_day + 1)]
-                new_den[i] = den_bin.sum()
+        # reset date index and format
+        new_num = pd.DataFrame(new_num[0].T, columns=num.columns)
+        new_num.set_index(num.index, inplace=True)
+        new_den = pd.Series(new_den[0])
+        new_den.index = den.index
 
-                for j in range(p):
-                    num_bin = revnum[i: (i + closest_fill_day + 1), j]
-                    new_num[i, j] = num_bin.sum()
+        return new_num, new_den, include[0]
 
-            # if we do not observe at least min_visits_to_include in the denominator or
-            # if we observe 0 counts for min_recent_obs window, don't show.
-            if (new_den[i] < min_visits_to_include) or (
-                    revden[i:][:min_recent_obs_to_include].sum() == 0
-            ):
-                include[i] = False
+    @staticmethod
+    def backfill_panel(
+            num,
+            den,
+            k=Config.MAX_BACKFILL_WINDOW,
+            min_visits_to_fill=Config.MIN_CUM_VISITS,
+            min_visits_to_include=Config.MIN_RECENT_VISITS,
+            min_recent_obs_to_include=Config.MIN_RECENT_OBS,
+    ):
+        """Adjust the counts of many locations for retroactively added observations.
 
-        new_num = new_num[::-1]
-        new_den = new_den[::-1]
-        include = include[::-1]
+        Same as `backfill`, for all locations and days at once: the length of the bin of
+        every day is found from the running sums of the visits over the next k days (in
+        reversed time), and the bins of each length are summed as sliding windows. The sums
+        are taken over contiguous windows, so they equal those of `backfill` exactly.
 
-        # reset date index and format
-        new_num = pd.DataFrame(new_num, columns=num.columns)
-        new_num.set_index(num.index, inplace=True)
-        new_den = pd.Series(new_den)
-        new_den.index = den.index
+        Args:
+            num: array of counts of shape (n_locations, n_count_cols, n_dates)
+            den: array of total visits of shape (n_locations, n_dates)
+            k: maximum number of days used to average a backfill correction
+            min_visits_to_fill: minimum number of total visits needed in order to sum a bin
+            min_visits_to_include: minimum number of total visits needed to include a date
+            min_recent_obs_to_include: day window where we need to observe at least 1 count
+                                                                 (inclusive)
 
-        return new_num, new_den, include
+        Returns: arrays of adjusted counts, adjusted visits, and inclusion, shaped as the inputs
+        """
+        revnum = np.ascontiguousarray(num[..., ::-1], dtype=float)
+        revden = np.ascontiguousarray(den[..., ::-1], dtype=float)
+        n = revden.shape[-1]
+
+        # closest_fill_day: first day (counting from 0) at which the cumulative visits reach
+        # min_visits_to_fill, capped at k
+        closest_fill_day = np.full(revden.shape, k)
+        visit_cumsum = np.zeros(revden.shape)
+        for j in range(min(k, n)):
+            visit_cumsum[..., :n - j] += revden[..., j:]
+            reached = (visit_cumsum >= min_visits_to_fill) & (closest_fill_day == k)
+            reached[..., n - j:] = False
+            closest_fill_day[reached] = j
+
+        # bins of length closest_fill_day + 1, truncated at the last day
+        bin_len = np.minimum(closest_fill_day + 1, n - np.arange(n))
+        new_num = np.full(revnum.shape, np.nan)
+        new_den = np.full(revden.shape, np.nan)
+        for length in range(1, min(k + 1, n) + 1):
+            starts = n - length + 1
+            is_len = bin_len[..., :starts] == length
+            den_sums = sliding_window_view(revden, length, axis=-1).sum(axis=-1)
+            new_den[..., :starts] = np.where(is_len, den_sums, new_den[..., :starts])
+            num_sums = sliding_window_view(revnum, length, axis=-1).sum(axis=-1)
+            new_num[..., :starts] = np.where(
+                is_len[..., None, :], num_sums, new_num[..., :starts])
+
+        # if we do not observe at least min_visits_to_include in the denominator or
+        # if we observe 0 counts for min_recent_obs window, don't show.
+        recent_window = min(min_recent_obs_to_include, n)
+        padded = np.concatenate([revden, np.zeros(revden.shape[:-1] + (recent_window - 1,))],
+                                axis=-1)
+        recent_obs = sliding_window_view(padded, recent_window, axis=-1).sum(axis=-1)
+        include = ~((new_den < min_visits_to_include) | (recent_obs == 0))
+
+        return new_num[..., ::-1], new_den[..., ::-1], include[..., ::-1]
 
     @staticmethod
     def fit(y_data,
@@ -183,69 +213,113 @@ class DoctorVisitsSensor:
         """
         y_data.set_index("ServiceDate", inplace=True)
         y_data = DoctorVisitsSensor.fill_dates(y_data, fit_dates)
-        sensor_idxs = np.where(y_data.index >= burn_in_dates[0])[0]
-        n_dates = y_data.shape[0]
+        return DoctorVisitsSensor.fit_panel(
+            y_data[Config.COUNT_COLS].to_numpy(dtype=float)[None],
+            y_data.index,
+            burn_in_dates,
+            final_sensor_idxs,
+            [geo_id],
+            recent_min_visits,
+            min_recent_obs,
+            jeffreys
+        )
 
-        # combine Flu_like and Mixed columns
-        y_data["Flu_like_Mixed"] = y_data["Flu_like"] + y_data["Mixed"]
-        NEW_CLI_COLS = list(set(Config.CLI_COLS) - {"Flu_like", "Mixed"}) + [
-            "Flu_like_Mixed"]
+    @staticmethod
+    def fit_panel(counts,
+                  fit_dates,
+                  burn_in_dates,
+                  final_sensor_idxs,
+                  geo_ids,
+                  recent_min_visits,
+                  min_recent_obs,
+                  jeffreys):
+        """Fit the sensors of many locations at once.
+
+        Same as `fit` for every location, on a dense location x date panel of counts: the
+        backfill, rates, smoothing and standard errors are computed for all locations in one
+        pass rather than one location at a time.
+
+        Args:
+            counts: array of shape (n_locations, len(fit_dates), len(Config.COUNT_COLS)) with
+                the counts of every location and date, in the order of Config.COUNT_COLS
+            fit_dates: consecutive sorted datetime for which to use as training
+            burn_in_dates: list of sorted datetime for which to produce sensor values
+            final_sensor_idxs: list of positions in `fit_dates` that correspond to sensors
+            geo_ids: unique identifiers of the locations, one per row of counts
+            recent_min_visits: location is sparse if it has fewer than min_recent_visits over
+                                                <RECENT_LENGTH> days
+            min_recent_obs: location is sparse also if it has 0 observations in the
+                                            last min_recent_obs days
+            jeffreys: boolean whether to use Jeffreys estimate for binomial proportion
+
+        Returns: dataframe with the date, geo_id, val and se of every included sensor value,
+            sorted by location in the order of geo_ids, then date
+        """
+        sensor_idxs = np.where(pd.DatetimeIndex(fit_dates) >= burn_in_dates[0])[0]
+        col = {name: i for i, name in enumerate(Config.COUNT_COLS)}
+
+        # combine Flu_like and Mixed columns; NEW_CLI_COLS are the first two count columns
+        NEW_CLI_COLS = ["Covid_like", "Flu_like_Mixed"]
+        total_counts = np.stack([
+            counts[..., col["Covid_like"]],
+            counts[..., col["Flu_like"]] + counts[..., col["Mixed"]],
+            counts[..., col[Config.FLU1_COL[0]]]
+        ], axis=1)
 
         # small backfill correction
-        total_visits = y_data["Denominator"]
-        total_counts = y_data[NEW_CLI_COLS + Config.FLU1_COL]
-        total_counts, total_visits, include = DoctorVisitsSensor.backfill(
+        total_counts, total_visits, include = DoctorVisitsSensor.backfill_panel(
             total_counts,
-            total_visits,
+            counts[..., col["Denominator"]],
             min_visits_to_include=recent_min_visits,
             min_recent_obs_to_include=min_recent_obs
         )
 
         # jeffreys inflation
-        if jeffreys:
-            total_counts[NEW_CLI_COLS] = total_counts[NEW_CLI_COLS] + 0.5
-            total_rates = total_counts.div(total_visits + 1, axis=0)
-        else:
-            total_rates = total_counts.div(total_visits, axis=0)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            if jeffreys:
+                total_counts[:, :len(NEW_CLI_COLS)] = total_counts[:, :len(NEW_CLI_COLS)] + 0.5
+                total_rates = total_counts / (total_visits + 1)[:, None]
+            else:
+                total_rates = total_counts / total_visits[:, None]
+        total_rates[np.isnan(total_rates)] = 0
 
-        total_rates.fillna(0, inplace=True)
-        flu1 = total_rates[Config.FLU1_COL]
-        new_rates = []
-        for code in NEW_CLI_COLS:
-            code_vals = total_rates[code]
+        # one column per location
+        flu1 = total_rates[:, -1].T
+        new_rates = np.zeros(total_visits.shape)
+        for i, code in enumerate(NEW_CLI_COLS):
+            code_vals = total_rates[:, i]
 
             # if all rates are zero, don't bother
-            if code_vals.sum() == 0:
-                if jeffreys:
-                    logging.error("p is 0 even though we used Jefferys estimate")
-                new_rates.append(np.zeros((n_dates,)))
-                continue
+            all_zero = code_vals.sum(axis=1) == 0
+            if jeffreys and all_zero.any():
+                logging.error("p is 0 even though we used Jefferys estimate")
 
             # include adjustment for flu like codes
             base = flu1 if code in ["Flu_like_Mixed"] else None
-            fitted_codes = DoctorVisitsSensor.transform(
-                code_vals.values.reshape(-1, 1), base=base
-            )
-            new_rates.append(fitted_codes.flatten())
-
-        new_rates = np.array(new_rates).sum(axis=0)
+            fitted_codes = DoctorVisitsSensor.transform(code_vals.T, base=base).T
+            fitted_codes[all_zero] = 0
+            new_rates += fitted_codes
 
         # cut off at sensor indexes
-        new_rates = new_rates[sensor_idxs]
-        include = include[sensor_idxs]
-        den = total_visits[sensor_idxs].values
+        new_rates = new_rates[:, sensor_idxs]
+        include = include[:, sensor_idxs]
+        den = total_visits[:, sensor_idxs]
 
         # calculate standard error
         se = np.full_like(new_rates, np.nan)
         se[include] = np.sqrt(
             np.divide((new_rates[include] * (1 - new_rates[include])), den[include]))
 
-        logging.debug(f"{geo_id}: {new_rates[-1]:.3f},[{se[-1]:.3f}]")
+        if logging.getLogger().isEnabledFor(logging.DEBUG):
+            for geo_id, rate, std_err in zip(geo_ids, new_rates[:, -1], se[:, -1]):
+                logging.debug(f"{geo_id}: {rate:.3f},[{std_err:.3f}]")
 
-        included_indices = [x for x in final_sensor_idxs if include[x]]
+        final_sensor_idxs = np.asarray(final_sensor_idxs, dtype=int)
+        geo_rows, idx_cols = np.nonzero(include[:, final_sensor_idxs])
+        included_indices = final_sensor_idxs[idx_cols]
 
-        df = pd.DataFrame(data = {"date": burn_in_dates[included_indices],
-                                  "geo_id": geo_id,
-                                  "val": new_rates[included_indices],
-                                  "se": se[included_indices]})
+        df = pd.DataFrame(data = {"date": pd.DatetimeIndex(burn_in_dates)[included_indices],
+                                  "geo_id": np.asarray(geo_ids, dtype=object)[geo_rows],
+                                  "val": new_rates[geo_rows, included_indices],
+                                  "se": se[geo_rows, included_indices]})
         return df
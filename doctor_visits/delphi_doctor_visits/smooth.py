@@ -7,6 +7,8 @@ Author: Maria Jahja
 Created: 2020-04-16
 
 """
+from functools import lru_cache
+
 import numpy as np
 
 
@@ -66,25 +68,42 @@ def left_gauss(y, h=100):
     return t
 
 
-def left_gauss_linear(s, h=250):
-    """Smooth the y-values using a local linear left Gaussian filter.
+@lru_cache(maxsize=8)
+def left_gauss_linear_matrix(n, h=250):
+    """Compute the linear operator of the local linear left Gaussian filter.
+
+    The filter fits a weighted line through the values up to each time, so the smoothed
+    value at time idx is x_idx^T (X^T W X)^{-1} X^T W s, which is linear in the signal s and
+    depends only on n and h. Row idx of the returned matrix holds these coefficients.
 
     Args:
-        y: one dimensional signal to smooth.
+        n: length of the signals to smooth.
         h: smoothing bandwidth (in terms of variance)
 
-    Returns: a smoothed 1D signal.
+    Returns: a read-only (n, n) array, whose first row is nan (a line cannot be fit through a
+        single point).
     """
-    n = len(s)
-    t = np.zeros_like(s)
     X = np.vstack([np.ones(n), np.arange(n)]).T
+    mat = np.zeros((n, n))
     for idx in range(n):
         wts = np.exp(-((np.arange(idx + 1) - idx) ** 2) / h)
         XwX = np.dot(X[: (idx + 1), :].T * wts, X[: (idx + 1), :])
-        Xwy = np.dot(X[: (idx + 1), :].T * wts, s[: (idx + 1)].reshape(-1, 1))
         try:
-            beta = np.linalg.solve(XwX, Xwy)
-            t[idx] = np.dot(X[: (idx + 1), :], beta)[-1]
+            # XwX is symmetric, so x^T XwX^{-1} is the solution of XwX b = x
+            mat[idx, : (idx + 1)] = np.linalg.solve(XwX, X[idx]) @ (X[: (idx + 1), :].T * wts)
         except np.linalg.LinAlgError:
-            t[idx] = np.nan
-    return t
+            mat[idx] = np.nan
+    mat.setflags(write=False)
+    return mat
+
+
+def left_gauss_linear(s, h=250):
+    """Smooth the y-values using a local linear left Gaussian filter.
+
+    Args:
+        y: signal to smooth, either one dimensional or with one signal per column.
+        h: smoothing bandwidth (in terms of variance)
+
+    Returns: the smoothed signal(s), of the same shape.
+    """
+    return left_gauss_linear_matrix(len(s), h) @ s
@@ -11,24 +11,95 @@ Modified:
 # standard packages
 import logging
 from datetime import timedelta
-from multiprocessing import Pool, cpu_count
+from multiprocessing import Pool, RawArray, cpu_count
 
 # third party
 import numpy as np
 import pandas as pd
+from delphi_utils import LogListener, init_worker_logging
 
 # first party
 from .config import Config
+from .drop_cache import aggregate_rows, load_prepared_data, parse_rows
 from .geo_maps import GeoMaps
 from .sensor import DoctorVisitsSensor
 from .weekday import Weekday
 
 
+# Counts of all locations and fitting settings shared with the pool workers of _fit_in_pool,
+# set once per worker by _init_pool_worker.
+_POOL_STATE = {}
+
+
+def _init_pool_worker(counts, shape, geo_ids, fit_args, log_queue):
+    """Attach a pool worker to the shared counts of the locations to fit, logging to log_queue."""
+    init_worker_logging(log_queue)
+    _POOL_STATE["counts"] = np.frombuffer(counts).reshape(shape)
+    _POOL_STATE["geo_ids"] = geo_ids
+    _POOL_STATE["fit_args"] = fit_args
+
+
+def _fit_shared_locations(start, stop):
+    """Fit the locations in rows start to stop of the shared counts.
+
+    Returns: arrays of the dates, location ids, values and standard errors of the sensors
+    """
+    fit_dates, burn_in_dates, final_sensor_idxs, jeffreys = _POOL_STATE["fit_args"]
+    res = DoctorVisitsSensor.fit_panel(
+        _POOL_STATE["counts"][start:stop],
+        fit_dates,
+        burn_in_dates,
+        final_sensor_idxs,
+        _POOL_STATE["geo_ids"][start:stop],
+        Config.MIN_RECENT_VISITS,
+        Config.MIN_RECENT_OBS,
+        jeffreys
+    )
+    return tuple(res[c].to_numpy() for c in res.columns)
+
+
+def _fit_in_pool(counts, unique_geo_ids, fit_dates, burn_in_dates, final_sensor_idxs,
+                 jeffreys):
+    """Fit the locations in chunks in a pool of workers sharing the counts of all locations.
+
+    A task is just the range of rows of its locations in the shared panel of counts, and
+    returns just the arrays of their sensor values.
+
+    Returns: list of sensor dataframes, one per chunk of locations
+    """
+    shared = RawArray("d", counts.size)
+    np.frombuffer(shared).reshape(counts.shape)[:] = counts
+    fit_args = (fit_dates, burn_in_dates, final_sensor_idxs, jeffreys)
+
+    n_cpu = min(10, cpu_count())
+    chunk_size = min(Config.MAX_LOCATIONS_PER_FIT, -(-len(unique_geo_ids) // n_cpu))
+    starts = list(range(0, len(unique_geo_ids), chunk_size))
+    stops = starts[1:] + [len(unique_geo_ids)]
+    logging.debug(f"starting pool with {n_cpu} workers")
+    # workers log through the parent, instead of all writing to stderr
+    with LogListener() as listener, \
+            Pool(n_cpu, initializer=_init_pool_worker,
+                 initargs=(shared, counts.shape, unique_geo_ids, fit_args,
+                           listener.queue)) as pool:
+        results = pool.starmap(_fit_shared_locations, zip(starts, stops))
+        # let the workers exit after sending their log events, rather than be terminated
+        # while writing to the queue, which would block the listener from stopping
+        pool.close()
+        pool.join()
+
+    return [pd.DataFrame(data=dict(zip(["date", "geo_id", "val", "se"], res)))
+            for res in results]
+
+
 def write_to_csv(output_df: pd.DataFrame, geo_level, se, out_name, output_path="."):
     """Write sensor values to csv.
 
+    All rows are checked before any file is written, then the file of each date is written
+    from columns formatted once for all dates.
+
     Args:
-      output_dict: dictionary containing sensor rates, se, unique dates, and unique geo_id
+      output_df: dataframe of the sensors, with columns date, geo_id, val and se
+      geo_level: geographic resolution of the sensors
       se: boolean to write out standard errors, if true, use an obfuscated name
       out_name: name of the output file
       output_path: outfile path to write the csv (default is current directory)
@@ -36,35 +107,62 @@ def write_to_csv(output_df: pd.DataFrame, geo_level, se, out_name, output_path="
     if se:
         logging.info(f"========= WARNING: WRITING SEs TO {out_name} =========")
 
-    out_n = 0
-    for d in set(output_df["date"]):
+    geo_ids = output_df["geo_id"].to_numpy()
+    sensors = 100 * output_df["val"].to_numpy(dtype=float) # report percentages
+    se_vals = 100 * output_df["se"].to_numpy(dtype=float)
+    assert not np.isnan(sensors).any(), "sensor value is nan, check pipeline"
+    high = np.flatnonzero(sensors >= 90)
+    assert len(high) == 0, f"strangely high percentage {geo_ids[high[0]], sensors[high[0]]}"
+    high = np.flatnonzero(se_vals >= 5)
+    assert len(high) == 0, f"standard error suspiciously high! investigate {geo_ids[high[0]]}"
+    if se:
+        assert ((sensors > 0) & (se_vals > 0)).all(), "p=0, std_err=0 invalid"
+
+    # rows without the date, as they are written
+    lines = np.array(["%s,%f," % (geo_id, sensor)
+                      for geo_id, sensor in zip(geo_ids.tolist(), sensors.tolist())], dtype=object)
+    if se:
+        lines += np.array(["%s,NA,NA\n" % se_val for se_val in se_vals.tolist()], dtype=object)
+    else:
+        # for privacy reasons we will not report the standard error
+        lines += "NA,NA,NA\n"
+
+    for d, rows in output_df.groupby("date", sort=False).indices.items():
         filename = "%s/%s_%s_%s.csv" % (output_path,
                                         (d + Config.DAY_SHIFT).strftime("%Y%m%d"),
                                         geo_level,
                                         out_name)
-        single_date_df = output_df[output_df["date"] == d]
         with open(filename, "w") as outfile:
             outfile.write("geo_id,val,se,direction,sample_size\n")
+            outfile.write("".join(lines[rows]))
+    logging.debug(f"wrote {len(output_df)} rows for {geo_level}")
+
+
+def load_data(filepath, dropdate, cache_dir=None):
+    """Load the doctor-visits drop and aggregate it to daily county counts.
+
+    The result holds every date from the first data date to before the drop date, and is
+    shared by the sensors of all geographic resolutions and weekday settings of a run.
+
+    Args:
+      filepath: path to the aggregated doctor-visits data
+      dropdate: data drop date (YYYY-mm-dd)
+      cache_dir: directory in which to keep the prepared counts of the drop, so that the next
+        drop only parses what changed (see `load_prepared_data`); by default the whole drop is
+        parsed
 
-            for line in single_date_df.itertuples():
-                geo_id = line.geo_id
-                sensor = 100 * line.val # report percentages
-                se_val = 100 * line.se
-                assert not np.isnan(sensor), "sensor value is nan, check pipeline"
-                assert sensor < 90, f"strangely high percentage {geo_id, sensor}"
-                if not np.isnan(se_val):
-                    assert se_val < 5, f"standard error suspiciously high! investigate {geo_id}"
-
-                if se:
-                    assert sensor > 0 and se_val > 0, "p=0, std_err=0 invalid"
-                    outfile.write(
-                        "%s,%f,%s,%s,%s\n" % (geo_id, sensor, se_val, "NA", "NA"))
-                else:
-                    # for privacy reasons we will not report the standard error
-                    outfile.write(
-                        "%s,%f,%s,%s,%s\n" % (geo_id, sensor, "NA", "NA", "NA"))
-                out_n += 1
-    logging.debug(f"wrote {out_n} rows for {geo_level}")
+    Returns:
+      dataframe with columns ServiceDate, PatCountyFIPS and the count columns
+    """
+    if cache_dir is None:
+        data = aggregate_rows(parse_rows(filepath))
+    else:
+        data = load_prepared_data(filepath, cache_dir)
+
+    # restrict to the training dates
+    dropdate = pd.to_datetime(dropdate)
+    return data[(data[Config.DATE_COL] >= Config.FIRST_DATA_DATE) & \
+                (data[Config.DATE_COL] < dropdate)]
 
 
 def update_sensor(
@@ -83,28 +181,31 @@ def update_sensor(
       weekday: boolean to adjust for weekday effects
       se: boolean to write out standard errors, if true, use an obfuscated name
     """
-    # as of 2020-05-11, input file expected to have 10 columns
-    # id cols: ServiceDate, PatCountyFIPS, PatAgeGroup, Pat HRR ID/Pat HRR Name
-    # value cols: Denominator, Covid_like, Flu_like, Flu1, Mixed
-    data = pd.read_csv(
-        filepath,
-        usecols=Config.FILT_COLS,
-        dtype=Config.DTYPES,
-        parse_dates=[Config.DATE_COL],
-    )
-    assert (
-            np.sum(data.duplicated(subset=Config.ID_COLS)) == 0
-    ), "Duplicated data! Check the input file"
+    data = load_data(filepath, dropdate)
 
-    # drop HRR columns - unused for now since we assign HRRs by FIPS
-    data.drop(columns=Config.HRR_COLS, inplace=True)
-    data.dropna(inplace=True)  # drop rows with any missing entries
+    # handle if we need to adjust by weekday
+    params = Weekday.get_params(data) if weekday else None
 
-    # aggregate age groups (so data is unique by service date and FIPS)
-    data = data.groupby([Config.DATE_COL, Config.GEO_COL]).sum().reset_index()
-    assert np.sum(data.duplicated()) == 0, "Duplicates after age group aggregation"
-    assert (data[Config.COUNT_COLS] >= 0).all().all(), "Counts must be nonnegative"
+    return compute_sensor(data, startdate, enddate, dropdate, geo, parallel, params, se)
 
+
+def compute_sensor(
+        data, startdate, enddate, dropdate, geo, parallel,
+        weekday_params, se, geo_map=None
+):
+    """Generate sensor values from data loaded with `load_data`.
+
+    Args:
+      data: daily county counts, as returned by `load_data`; not modified
+      startdate: first sensor date (YYYY-mm-dd)
+      enddate: last sensor date (YYYY-mm-dd)
+      dropdate: data drop date (YYYY-mm-dd)
+      geo: geographic resolution, one of ["county", "state", "msa", "hrr", "nation", "hhs"]
+      parallel: boolean to run the sensor update in parallel
+      weekday_params: weekday effects from `Weekday.get_params(data)` to adjust for, or None
+      se: boolean to write out standard errors, if true, use an obfuscated name
+      geo_map: GeoMaps instance to reuse across calls; a new one by default
+    """
     ## collect dates
     # restrict to training start and end date
     drange = lambda s, e: np.array([s + timedelta(days=x) for x in range((e - s).days)])
@@ -115,8 +216,6 @@ def update_sensor(
     assert startdate > Config.FIRST_DATA_DATE, "Start date <= first day of data"
     assert startdate < enddate, "Start date >= end date"
     assert enddate <= dropdate, "End date > drop date"
-    data = data[(data[Config.DATE_COL] >= Config.FIRST_DATA_DATE) & \
-                (data[Config.DATE_COL] < dropdate)]
     fit_dates = drange(Config.FIRST_DATA_DATE, dropdate)
     burn_in_dates = drange(burnindate, dropdate)
     sensor_dates = drange(startdate, enddate)
@@ -124,32 +223,40 @@ def update_sensor(
     final_sensor_idxs = np.where(
         (burn_in_dates >= startdate) & (burn_in_dates <= enddate))[0][:len(sensor_dates)]
 
-    # handle if we need to adjust by weekday
-    params = Weekday.get_params(data) if weekday else None
-
     # handle explicitly if we need to use Jeffreys estimate for binomial proportions
     jeffreys = bool(se)
 
     # get right geography
-    geo_map = GeoMaps()
+    if geo_map is None:
+        geo_map = GeoMaps()
     mapping_func = geo_map.geo_func[geo.lower()]
     data_groups, _ = mapping_func(data)
     unique_geo_ids = list(data_groups.groups.keys())
 
+    # the adjustment is by date, so it can be applied to all locations at once
+    data = data_groups.obj.copy()
+    if weekday_params is not None:
+        data = Weekday.calc_adjustment(weekday_params, data)
+
+    # dense location x date x count panel, with 0 counts on missing dates (as in `fill_dates`)
+    geo_idx = data_groups.ngroup().to_numpy()
+    date_idx = ((data[Config.DATE_COL] - fit_dates[0]) // timedelta(days=1)).to_numpy()
+    keep = (geo_idx >= 0) & (date_idx >= 0) & (date_idx < len(fit_dates))
+    counts = np.zeros((len(unique_geo_ids), len(fit_dates), len(Config.COUNT_COLS)))
+    counts[geo_idx[keep], date_idx[keep]] = \
+        data[Config.COUNT_COLS].to_numpy(dtype=float)[keep]
+
     # run sensor fitting code (maybe in parallel)
     out = []
     if not parallel:
-        for geo_id in unique_geo_ids:
-            sub_data = data_groups.get_group(geo_id).copy()
-            if weekday:
-                sub_data = Weekday.calc_adjustment(params, sub_data)
-
-            res = DoctorVisitsSensor.fit(
-                sub_data,
+        for start in range(0, len(unique_geo_ids), Config.MAX_LOCATIONS_PER_FIT):
+            stop = start + Config.MAX_LOCATIONS_PER_FIT
+            res = DoctorVisitsSensor.fit_panel(
+                counts[start:stop],
                 fit_dates,
                 burn_in_dates,
                 final_sensor_idxs,
-                geo_id,
+                unique_geo_ids[start:stop],
                 Config.MIN_RECENT_VISITS,
                 Config.MIN_RECENT_OBS,
                 jeffreys
@@ -157,31 +264,7 @@ def update_sensor(
             out.append(res)
 
     else:
-        n_cpu = min(10, cpu_count())
-        logging.debug(f"starting pool with {n_cpu} workers")
-
-        with Pool(n_cpu) as pool:
-            pool_results = []
-            for geo_id in unique_geo_ids:
-                sub_data = data_groups.get_group(geo_id).copy()
-                if weekday:
-                    sub_data = Weekday.calc_adjustment(params, sub_data)
-
-                pool_results.append(
-                    pool.apply_async(
-                        DoctorVisitsSensor.fit,
-                        args=(
-                            sub_data,
-                            fit_dates,
-                            burn_in_dates,
-                            final_sensor_idxs,
-                            geo_id,
-                            Config.MIN_RECENT_VISITS,
-                            Config.MIN_RECENT_OBS,
-                            jeffreys,
-                        ),
-                    )
-                )
-            out = [proc.get() for proc in pool_results]
-
-    return pd.concat(out)
+        out = _fit_in_pool(counts, unique_geo_ids, fit_dates, burn_in_dates,
+                           final_sensor_idxs, jeffreys)
+
+    return pd.concat(out, ignore_index=True)
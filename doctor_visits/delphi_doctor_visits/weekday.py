@@ -7,6 +7,8 @@ Created: 2020-05-06
 # third party
 import cvxpy as cp
 import numpy as np
+from delphi_utils.weekday import (fit_weekday_params, load_weekday_params, save_weekday_params,
+                                  weekday_factors)
 
 # first party
 from .config import Config
@@ -16,7 +18,7 @@ class Weekday:
     """Class to handle weekday effects."""
 
     @staticmethod
-    def get_params(data):
+    def get_params(data, cache_file=None):
         r"""Correct a signal estimated as numerator/denominator for weekday effects.
 
         The ordinary estimate would be numerator_t/denominator_t for each time point
@@ -51,8 +53,13 @@ class Weekday:
         ll = (numerator * (X*b + log(denominator)) - sum(exp(X*b) + log(denominator)))
                 / num_days
 
+        The problem is solved by `delphi_utils.weekday.fit_weekday_params`, a dedicated
+        interior-point solver, starting from the parameters of the previous run if cache_file
+        exists. Columns it cannot fit are solved with cvxpy.
+
         Return a matrix of parameters: the entire vector of betas, for each time
-        series column in the data.
+        series column in the data. If cache_file is given, the parameters are also saved to it
+        for the next run.
         """
         denoms = data.groupby(Config.DATE_COL).sum()["Denominator"]
         nums = data.groupby(Config.DATE_COL).sum()[Config.CLI_COLS + Config.FLU1_COL]
@@ -67,36 +74,49 @@ class Weekday:
 
         npnums, npdenoms = np.array(nums), np.array(denoms)
         params = np.zeros((nums.shape[1], X.shape[1]))
+        init = load_weekday_params(cache_file, nums.index) if cache_file is not None else None
 
         # Loop over the available numerator columns and smooth each separately.
         for i in range(nums.shape[1]):
-            b = cp.Variable((X.shape[1]))
-
-            lmbda = cp.Parameter(nonneg=True)
-            lmbda.value = 10  # Hard-coded for now, seems robust to changes
-
-            ll = (
-                cp.matmul(npnums[:, i], cp.matmul(X, b) + np.log(npdenoms))
-                - cp.sum(cp.exp(cp.matmul(X, b) + np.log(npdenoms)))
-            ) / X.shape[0]
-            penalty = (
-                lmbda * cp.norm(cp.diff(b[6:], 3), 1) / (X.shape[0] - 2)
-            )  # L-1 Norm of third differences, rewards smoothness
             try:
-                prob = cp.Problem(cp.Minimize(-ll + lmbda * penalty))
-                _ = prob.solve()
-            except:
-                # If the magnitude of the objective function is too large, an error is
-                # thrown; Rescale the objective function
-                prob = cp.Problem(cp.Minimize((-ll + lmbda * penalty) / 1e5))
-                _ = prob.solve()
-            params[i, :] = b.value
-
+                params[i, :] = fit_weekday_params(
+                    npnums[:, i], npdenoms, nums.index.dayofweek,
+                    init=init[i] if init is not None else None)
+            except (RuntimeError, ValueError):
+                params[i, :] = Weekday._solve_cvxpy(X, npnums[:, i], npdenoms)
+
+        if cache_file is not None:
+            save_weekday_params(cache_file, nums.index, params)
         return params
 
     @staticmethod
-    def calc_adjustment(params, sub_data):
-        """Apply the weekday adjustment to a specific time series.
+    def _solve_cvxpy(X, npnums, npdenoms):
+        """Solve the problem of `get_params` for one numerator column with cvxpy."""
+        b = cp.Variable((X.shape[1]))
+
+        lmbda = cp.Parameter(nonneg=True)
+        lmbda.value = 10  # Hard-coded for now, seems robust to changes
+
+        ll = (
+            cp.matmul(npnums, cp.matmul(X, b) + np.log(npdenoms))
+            - cp.sum(cp.exp(cp.matmul(X, b) + np.log(npdenoms)))
+        ) / X.shape[0]
+        penalty = (
+            lmbda * cp.norm(cp.diff(b[6:], 3), 1) / (X.shape[0] - 2)
+        )  # L-1 Norm of third differences, rewards smoothness
+        try:
+            prob = cp.Problem(cp.Minimize(-ll + lmbda * penalty))
+            _ = prob.solve()
+        except:
+            # If the magnitude of the objective function is too large, an error is
+            # thrown; Rescale the objective function
+            prob = cp.Problem(cp.Minimize((-ll + lmbda * penalty) / 1e5))
+            _ = prob.solve()
+        return b.value
+
+    @staticmethod
+    def calc_adjustment(params, data):
+        """Apply the weekday adjustment to the time series of any number of locations.
 
         Extracts the weekday fixed effects from the parameters and uses these to
         adjust the time series.
@@ -113,15 +133,12 @@ class Weekday:
         this case, we only divide the numerator, leaving the denominator unchanged
         -- this has the same effect.
 
+        The correction depends only on the date, so the factors exp(alpha_wd) are looked up
+        once per day of week and divided out of every row of data, whatever its location.
+        data is modified in place and returned.
         """
-        for i, c in enumerate(Config.CLI_COLS + Config.FLU1_COL):
-            wd_correction = np.zeros((len(sub_data[c])))
-
-            for wd in range(7):
-                mask = sub_data[Config.DATE_COL].dt.dayofweek == wd
-                wd_correction[mask] = sub_data.loc[mask, c] / (
-                    np.exp(params[i, wd]) if wd < 6 else np.exp(-np.sum(params[i, :6]))
-                )
-            sub_data.loc[:, c] = wd_correction
-
-        return sub_data
+        cols = Config.CLI_COLS + Config.FLU1_COL
+        factors = weekday_factors(params)
+        dayofweek = data[Config.DATE_COL].dt.dayofweek.to_numpy()
+        data[cols] = data[cols].to_numpy(dtype=float) / factors[:, dayofweek].T
+        return data
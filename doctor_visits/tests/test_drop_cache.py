@@ -0,0 +1,70 @@
+"""Tests for drop_cache.py."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from delphi_doctor_visits.drop_cache import aggregate_rows, load_prepared_data, parse_rows
+
+DROP = "./test_data/SYNEDI_AGG_OUTPATIENT_07022020_1455CDT.csv.gz"
+
+
+class TestDropCache:
+    def test_load_prepared_data(self, tmp_path):
+        cache_dir = str(tmp_path / "cache")
+        expected = aggregate_rows(parse_rows(DROP))
+        for _ in range(2):
+            actual = load_prepared_data(DROP, cache_dir, block_bytes=2 ** 16)
+            pd.testing.assert_frame_equal(actual, expected)
+
+    def test_changed_drop(self, tmp_path):
+        cache_dir = str(tmp_path / "cache")
+        rows = pd.read_csv(DROP, dtype=str)
+        load_prepared_data(DROP, cache_dir, block_bytes=2 ** 16)
+
+        # revise the last day and add a new one
+        last = rows["ServiceDate"] == rows["ServiceDate"].max()
+        revised = rows.copy()
+        revised.loc[last, "Covid_like"] = (revised.loc[last, "Covid_like"].astype(int) + 1) \
+            .astype(str)
+        new_day = rows[last].assign(ServiceDate="2020-02-08")
+        changed_drop = str(tmp_path / "changed.csv.gz")
+        pd.concat([revised, new_day]).to_csv(changed_drop, index=False)
+        actual = load_prepared_data(changed_drop, cache_dir, block_bytes=2 ** 16)
+        pd.testing.assert_frame_equal(actual, aggregate_rows(parse_rows(changed_drop)))
+        assert actual["ServiceDate"].max() == pd.Timestamp("2020-02-08")
+
+        # drops in another order, or without the cached dates, are parsed again
+        shuffled_drop = str(tmp_path / "shuffled.csv")
+        rows.sample(frac=1, random_state=0).to_csv(shuffled_drop, index=False)
+        actual = load_prepared_data(shuffled_drop, cache_dir, block_bytes=2 ** 16)
+        pd.testing.assert_frame_equal(actual, aggregate_rows(parse_rows(DROP)))
+        first_days = str(tmp_path / "first_days.csv")
+        rows[rows["ServiceDate"] < "2020-02-03"].to_csv(first_days, index=False)
+        actual = load_prepared_data(first_days, cache_dir, block_bytes=2 ** 16)
+        pd.testing.assert_frame_equal(actual, aggregate_rows(parse_rows(first_days)))
+
+    def test_duplicates(self, tmp_path):
+        cache_dir = str(tmp_path / "cache")
+        rows = pd.read_csv(DROP, dtype=str)
+        load_prepared_data(DROP, cache_dir, block_bytes=2 ** 16)
+
+        # a duplicate of an unchanged row in the new part of the drop is still found
+        duplicated_drop = str(tmp_path / "duplicated.csv")
+        pd.concat([rows, rows.iloc[[0]]]).to_csv(duplicated_drop, index=False)
+        with pytest.raises(AssertionError, match="Duplicated data"):
+            load_prepared_data(duplicated_drop, cache_dir, block_bytes=2 ** 16)
+        assert np.array_equal(load_prepared_data(DROP, cache_dir)["Denominator"],
+                              aggregate_rows(parse_rows(DROP))["Denominator"])
+
+    def test_header_only(self, tmp_path):
+        cache_dir = str(tmp_path / "cache")
+        header_only = str(tmp_path / "header_only.csv")
+        pd.read_csv(DROP, dtype=str).iloc[:0].to_csv(header_only, index=False)
+        expected = aggregate_rows(parse_rows(header_only))
+        assert expected.empty
+        for _ in range(2):
+            pd.testing.assert_frame_equal(load_prepared_data(header_only, cache_dir), expected)
+        # a full drop after an empty one is parsed in full
+        pd.testing.assert_frame_equal(load_prepared_data(DROP, cache_dir),
+                                      aggregate_rows(parse_rows(DROP)))
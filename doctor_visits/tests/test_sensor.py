@@ -0,0 +1,66 @@
+"""Tests for sensor.py."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from delphi_doctor_visits.sensor import DoctorVisitsSensor
+
+
+def backfill_by_day(num, den, k, min_visits_to_fill, min_visits_to_include,
+                    min_recent_obs_to_include):
+    """Backfill the counts of one location one day at a time, as a reference for the panel.
+
+    Args:
+        num: array of counts of shape (n_dates, n_count_cols)
+        den: array of total visits of shape (n_dates,)
+    """
+    revden = den[::-1].astype(float)
+    revnum = num[::-1].astype(float)
+    new_num = np.full(num.shape, np.nan)
+    new_den = np.full(den.shape, np.nan)
+    include = np.full(den.shape, True)
+    for i in range(len(den)):
+        # the bin reaches back until min_visits_to_fill visits are summed, but at most k days
+        reached = np.flatnonzero(revden[i:].cumsum() >= min_visits_to_fill)
+        closest_fill_day = min(k, reached[0]) if len(reached) > 0 else k
+        new_den[i] = revden[i:i + closest_fill_day + 1].sum()
+        new_num[i] = revnum[i:i + closest_fill_day + 1].sum(axis=0)
+        if new_den[i] < min_visits_to_include or \
+                revden[i:i + min_recent_obs_to_include].sum() == 0:
+            include[i] = False
+    return new_num[::-1], new_den[::-1], include[::-1]
+
+
+class TestSensor:
+    def test_backfill(self):
+        num = pd.DataFrame({"a": [1.0, 2.0, 3.0, 4.0, 5.0]})
+        den = pd.Series([100.0, 200.0, 300.0, 0.0, 600.0])
+        new_num, new_den, include = DoctorVisitsSensor.backfill(
+            num, den, k=2, min_visits_to_fill=500, min_visits_to_include=400,
+            min_recent_obs_to_include=1)
+
+        # bins reach back until 500 visits are summed, but at most k days
+        assert list(new_den) == [100.0, 300.0, 500.0, 500.0, 600.0]
+        assert list(new_num["a"]) == [1.0, 3.0, 5.0, 9.0, 5.0]
+        assert list(include) == [False, False, True, False, True]
+
+    @pytest.mark.parametrize("n_days,k,min_recent_obs", [
+        (30, 7, 3),  # defaults of the pipeline
+        (5, 7, 3),  # fewer days than the backfill window
+        (30, 0, 3),  # no backfill
+        (4, 7, 10),  # recent window longer than the data
+        (1, 7, 3),
+    ])
+    def test_backfill_panel(self, n_days, k, min_recent_obs):
+        rng = np.random.default_rng(0)
+        den = rng.poisson(150, (4, n_days)) * (rng.random((4, n_days)) > 0.2)
+        num = rng.binomial(den[:, None], 0.1, (4, 3, n_days)).astype(float)
+        new_num, new_den, include = DoctorVisitsSensor.backfill_panel(
+            num, den, k, 500, 400, min_recent_obs)
+        for i in range(4):
+            loc_num, loc_den, loc_include = backfill_by_day(
+                num[i].T, den[i], k, 500, 400, min_recent_obs)
+            assert np.array_equal(new_num[i], loc_num.T)
+            assert np.array_equal(new_den[i], loc_den)
+            assert np.array_equal(include[i], loc_include)
@@ -1,8 +1,11 @@
 """Tests for update_sensor.py."""
 
+import numpy as np
 import pandas as pd
+import pytest
 
-from delphi_doctor_visits.update_sensor import update_sensor
+from delphi_doctor_visits.update_sensor import (compute_sensor, load_data, update_sensor,
+                                                write_to_csv)
 
 class TestUpdateSensor:
     def test_update_sensor(self):
@@ -19,3 +22,69 @@ class TestUpdateSensor:
 
         comparison = pd.read_csv("./comparison/update_sensor/all.csv", parse_dates=["date"])
         pd.testing.assert_frame_equal(actual.reset_index(drop=True), comparison)
+
+    def test_load_data(self):
+        data = load_data(
+            filepath="./test_data/SYNEDI_AGG_OUTPATIENT_07022020_1455CDT.csv.gz",
+            dropdate="2020-02-06"
+        )
+        assert list(data.columns[:2]) == ["ServiceDate", "PatCountyFIPS"]
+        assert not data.duplicated(["ServiceDate", "PatCountyFIPS"]).any()
+        assert data["ServiceDate"].max() < pd.Timestamp("2020-02-06")
+
+        actual = compute_sensor(
+            data=data,
+            startdate="2020-02-04",
+            enddate="2020-02-05",
+            dropdate="2020-02-06",
+            geo="state",
+            parallel=False,
+            weekday_params=None,
+            se=False
+        )
+        comparison = pd.read_csv("./comparison/update_sensor/all.csv", parse_dates=["date"])
+        pd.testing.assert_frame_equal(actual.reset_index(drop=True), comparison)
+
+    def test_update_sensor_parallel(self):
+        actual = update_sensor(
+            filepath="./test_data/SYNEDI_AGG_OUTPATIENT_07022020_1455CDT.csv.gz",
+            startdate="2020-02-04",
+            enddate="2020-02-05",
+            dropdate="2020-02-06",
+            geo="state",
+            parallel=True,
+            weekday=False,
+            se=False
+        )
+
+        comparison = pd.read_csv("./comparison/update_sensor/all.csv", parse_dates=["date"])
+        pd.testing.assert_frame_equal(actual.reset_index(drop=True), comparison)
+
+    def test_write_to_csv(self, tmp_path):
+        output_df = pd.DataFrame({
+            "date": pd.to_datetime(["2020-05-01", "2020-05-02", "2020-05-01"]),
+            "geo_id": ["ak", "ak", "al"],
+            "val": [0.1, 0.2, 0.0125],
+            "se": [0.01, np.nan, 0.001],
+        })
+        write_to_csv(output_df, "state", False, "smoothed_cli", str(tmp_path))
+        with open(tmp_path / "20200502_state_smoothed_cli.csv") as f:
+            assert f.read() == ("geo_id,val,se,direction,sample_size\n"
+                                "ak,10.000000,NA,NA,NA\n"
+                                "al,1.250000,NA,NA,NA\n")
+
+        output_df["se"] = output_df["se"].fillna(0.02)
+        write_to_csv(output_df, "state", True, "smoothed_cli", str(tmp_path))
+        with open(tmp_path / "20200502_state_smoothed_cli.csv") as f:
+            assert f.read() == ("geo_id,val,se,direction,sample_size\n"
+                                "ak,10.000000,1.0,NA,NA\n"
+                                "al,1.250000,0.1,NA,NA\n")
+        with open(tmp_path / "20200503_state_smoothed_cli.csv") as f:
+            assert f.read() == ("geo_id,val,se,direction,sample_size\n"
+                                "ak,20.000000,2.0,NA,NA\n")
+
+        # no file is written if any row is invalid
+        output_df.loc[2, "val"] = 0.95
+        with pytest.raises(AssertionError, match="strangely high percentage"):
+            write_to_csv(output_df, "state", False, "other", str(tmp_path))
+        assert not list(tmp_path.glob("*_other.csv"))
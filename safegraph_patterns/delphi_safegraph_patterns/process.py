@@ -1,6 +1,7 @@
 # -*- coding: utf-8 -*-
 """Process and export Safegraph patterns signal."""
 import glob
+import logging
 from itertools import product
 
 import numpy as np
@@ -162,7 +163,7 @@ def process(fname, sensors, metrics, geo_resolutions,
                          usecols=used_cols,
                          parse_dates=["date_range_start", "date_range_end"])
         dfs = construct_signals(df, metric_names, naics_codes, brand_df)
-        print("Finished pulling data from " + fname)
+        logging.info("Finished pulling data from %s", fname)
     else:
         files = glob.glob(f'{fname}/**/*.csv.gz', recursive=True)
         dfs_dict = {"bars_visit": [], "restaurants_visit": []}
@@ -178,7 +179,7 @@ def process(fname, sensors, metrics, geo_resolutions,
             ).groupby(["timestamp", "zip"]).sum().reset_index()
         dfs["restaurants_visit"] = pd.concat(dfs_dict["restaurants_visit"]
             ).groupby(["timestamp", "zip"]).sum().reset_index()
-        print("Finished pulling data from " + fname)
+        logging.info("Finished pulling data from %s", fname)
     for geo_res, sensor in product(geo_resolutions, sensors):
         for metric, wip in zip(metric_names, wips):
             df_export = aggregate(dfs[metric], metric, geo_res)
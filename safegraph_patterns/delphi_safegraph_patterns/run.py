@@ -12,7 +12,7 @@ from functools import partial
 from os.path import join
 
 import pandas as pd
-from delphi_utils import get_structured_logger
+from delphi_utils import LogListener, get_structured_logger, init_worker_logging
 
 from .process import process
 
@@ -103,8 +103,15 @@ def run_module(params):
                                export_dir=export_dir,
                                )
 
-        with mp.Pool(n_core) as pool:
+        # workers log through the parent, instead of all writing to stderr
+        with LogListener() as listener, \
+                mp.Pool(n_core, initializer=init_worker_logging,
+                        initargs=(listener.queue,)) as pool:
             pool.map(process_file, files)
+            # let the workers exit after sending their log events, rather than be terminated
+            # while writing to the queue, which would block the listener from stopping
+            pool.close()
+            pool.join()
 
     elapsed_time_in_seconds = round(time.time() - start_time, 2)
     logger.info("Completed indicator run",
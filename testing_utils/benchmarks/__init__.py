@@ -0,0 +1,7 @@
+"""End-to-end benchmarks of indicator pipelines on synthetic data.
+
+`generators` writes scalable synthetic input for each indicator's raw data schema, and `runner`
+times each indicator's `run_module` on it at several sizes, recording wall time, CPU time, and
+peak memory.  Results are written as JSON tagged with the commit, so that runs on different
+commits can be compared to catch performance regressions; see `python -m benchmarks --help`.
+"""
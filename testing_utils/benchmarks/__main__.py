@@ -0,0 +1,74 @@
+"""Run or compare benchmarks from the command line.
+
+From the `testing_utils` directory:
+
+    python -m benchmarks run --indicators changehc doctor_visits --sizes small medium
+    python -m benchmarks compare results/<old commit>.json results/<new commit>.json
+"""
+import argparse as ap
+import json
+import os
+from os.path import dirname, join
+import sys
+
+from .generators import INDICATORS, SIZES
+from .runner import compare, run_benchmarks
+
+
+def main():
+    """Run the command given on the command line."""
+    parser = ap.ArgumentParser(prog="python -m benchmarks")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = subparsers.add_parser("run", help="Benchmark indicator pipelines.")
+    run_parser.add_argument("--indicators", nargs="+", choices=sorted(INDICATORS),
+                            default=sorted(INDICATORS))
+    run_parser.add_argument("--sizes", nargs="+", choices=list(SIZES), default=["small"])
+    run_parser.add_argument("--repeat", type=int, default=1,
+                            help="Number of runs of every indicator and size.")
+    run_parser.add_argument("--seed", type=int, default=0, help="Seed of the synthetic data.")
+    run_parser.add_argument("--keep-dirs", action="store_true",
+                            help="Keep the directories with generated input and output.")
+    run_parser.add_argument("--output", default=None,
+                            help="File to which to write the results; defaults to "
+                                 "results/<commit>.json in the benchmarks directory.")
+
+    compare_parser = subparsers.add_parser(
+        "compare", help="Compare two result files; exit with an error on regressions.")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=0.1,
+                                help="Relative increase in wall time or peak memory counted as "
+                                     "a regression.")
+    args = parser.parse_args()
+
+    if args.command == "run":
+        results = run_benchmarks(args.indicators, args.sizes, args.repeat, args.seed,
+                                 args.keep_dirs)
+        output = args.output or join(dirname(__file__), "results",
+                                     f"{(results['commit'] or 'unknown')[:10]}.json")
+        os.makedirs(dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Wrote {output}")
+        sys.exit(int(any(r["status"] != "success" for r in results["results"])))
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    rows = compare(baseline, current, args.threshold)
+    for row in rows:
+        if row["status"] == "success":
+            print(f"{row['indicator']:<20} {row['size']:<8} "
+                  f"wall x{row['wall_time_ratio']:.2f}  cpu x{row['cpu_time_ratio']:.2f}  "
+                  f"peak rss x{row['peak_rss_ratio']:.2f}"
+                  f"{'  REGRESSION' if row['regression'] else ''}")
+        else:
+            print(f"{row['indicator']:<20} {row['size']:<8} {row['status']}"
+                  f"{'  REGRESSION' if row['regression'] else ''}")
+    sys.exit(int(any(row["regression"] for row in rows)))
+
+
+if __name__ == "__main__":
+    main()
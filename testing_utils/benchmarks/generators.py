@@ -0,0 +1,385 @@
+"""Synthetic raw input data for benchmarking indicator pipelines.
+
+Each generator writes files following the raw input schema of one indicator into `work_dir` and
+returns the `params` with which that indicator's `run_module` reads them.  Geographic codes are
+drawn from the GeoMapper crosswalks, so that rows survive geographic aggregation, and all values
+are drawn from the given random generator, so that a fixed seed yields identical data on every
+commit.
+
+Sizes are given as a number of geographic units (counties or ZIP codes) and a number of days of
+history.  Like the real data, the history of the claims-based sources starts on the first date
+their pipelines fit to, and is dropped the day after it ends; the history of the other sources
+ends the day before `DROP_DATE`.
+"""
+from datetime import datetime, timedelta
+from os import makedirs
+from os.path import join
+from typing import Any, Callable, Dict, List, NamedTuple
+
+import numpy as np
+import pandas as pd
+
+from delphi_utils import GeoMapper
+
+# Date on which synthetic data is dropped; also the date assumed by quidel_covidtest in test mode.
+DROP_DATE = datetime(2020, 8, 17)
+
+# First date of the claims-based sources (changehc, claims_hosp, doctor_visits), from which their
+# pipelines fit models.
+FIRST_DATA_DATE = datetime(2020, 1, 1)
+
+# Relative visit volume by day of the week, starting on Monday, so that weekday adjustments have
+# an effect to fit.
+WEEKDAY_FACTORS = np.array([1.2, 1.1, 1.0, 1.0, 1.0, 0.7, 0.6])
+
+AGE_GROUPS = ["0-4", "5-17", "18-49", "50-64", "65+"]
+
+
+class Size(NamedTuple):
+    """Size of a synthetic dataset."""
+
+    n_geos: int
+    n_days: int
+
+
+SIZES = {
+    "small": Size(n_geos=100, n_days=60),
+    "medium": Size(n_geos=1000, n_days=120),
+    "large": Size(n_geos=3000, n_days=240),
+}
+
+
+def _dates(n_days: int, drop_date: datetime = DROP_DATE) -> pd.DatetimeIndex:
+    """Return the `n_days` days up to the day before `drop_date`."""
+    return pd.date_range(end=drop_date - timedelta(days=1), periods=n_days)
+
+
+def _claims_drop_date(size: Size) -> datetime:
+    """Return the drop date of claims-based data with `size.n_days` days of history."""
+    return FIRST_DATA_DATE + timedelta(days=size.n_days)
+
+
+def _backfill_days(size: Size) -> int:
+    """Return the number of days for which to produce claims-based estimates."""
+    return min(size.n_days // 2, 60)
+
+
+def _us_dates(dates: pd.Series) -> pd.Series:
+    """Format dates as M/D/YY, like the Quidel and JHU sources."""
+    return dates.dt.month.astype(str) + "/" + dates.dt.day.astype(str) + "/" + \
+        dates.dt.strftime("%y")
+
+
+def _sample_geos(geo_type: str, n_geos: int, rng: np.random.Generator) -> List[str]:
+    """Draw up to `n_geos` distinct codes of `geo_type` known to GeoMapper."""
+    values = sorted(GeoMapper().get_geo_values(geo_type))
+    return sorted(rng.choice(values, size=min(n_geos, len(values)), replace=False))
+
+
+def _panel(geos: List[str], dates: pd.DatetimeIndex, mean: float,
+           rng: np.random.Generator, groups: int = 1) -> pd.DataFrame:
+    """Build a long geo x date (x group) frame with the expected count of every row.
+
+    Expected counts vary by geo (log-normally around `mean`) and by day of the week, and are split
+    evenly across `groups` rows per geo and date.
+    """
+    geo_scale = rng.lognormal(0, 1, len(geos))
+    panel = pd.DataFrame({
+        "geo": np.repeat(geos, len(dates) * groups),
+        "date": np.tile(np.repeat(dates, groups), len(geos)),
+        "group": np.tile(np.arange(groups), len(geos) * len(dates)),
+    })
+    panel["expected"] = mean / groups * np.repeat(geo_scale, len(dates) * groups) * \
+        WEEKDAY_FACTORS[panel["date"].dt.dayofweek.to_numpy()]
+    return panel
+
+
+def changehc(work_dir: str, size: Size, rng: np.random.Generator) -> Dict[str, Any]:
+    """Write CHC denominator, covid, and CLI count files for `size` counties."""
+    drop_date = _claims_drop_date(size)
+    panel = _panel(_sample_geos("fips", size.n_geos, rng), _dates(size.n_days, drop_date), 200,
+                   rng)
+    input_files = {}
+    for name, file_name, rate in [("denom", "Denom", 1.0), ("covid", "Covid", 0.05),
+                                  ("flu", "Flu", 0.01), ("mixed", "Mixed", 0.02),
+                                  ("flu_like", "Flu_Like", 0.03),
+                                  ("covid_like", "Covid_Like", 0.04)]:
+        counts = rng.poisson(panel["expected"] * rate)
+        data = pd.DataFrame({
+            "date": panel["date"].dt.strftime("%Y-%m-%d"),
+            "fips": panel["geo"],
+            # Counts between 1 and 3 are censored by the source.
+            "count": np.where(counts <= 3, "3 or less", counts.astype(str)),
+        })[counts > 0]
+        input_files[name] = join(work_dir,
+                                 f"{drop_date:%Y%m%d}_Counts_Products_{file_name}.dat.gz")
+        data.to_csv(input_files[name], header=False, index=False)
+    return {
+        "indicator": {
+            "input_cache_dir": work_dir,
+            "input_files": input_files,
+            "start_date": None,
+            "end_date": None,
+            "drop_date": f"{drop_date:%Y-%m-%d}",
+            "n_backfill_days": _backfill_days(size),
+            "n_waiting_days": 3,
+            "se": False,
+            "parallel": False,
+            "geos": ["state", "msa", "hrr", "county", "nation", "hhs"],
+            "weekday": [True, False],
+            "types": ["covid", "cli"],
+            "wip_signal": "",
+            "ftp_conn": {"host": "", "user": "", "pass": "", "port": 0}
+        }
+    }
+
+
+def claims_hosp(work_dir: str, size: Size, rng: np.random.Generator) -> Dict[str, Any]:
+    """Write an aggregated inpatient claims file for `size` counties and all age groups."""
+    counties = _sample_geos("fips", size.n_geos, rng)
+    hrrs = dict(zip(counties, rng.choice(sorted(GeoMapper().get_geo_values("hrr")),
+                                         size=len(counties))))
+    drop_date = _claims_drop_date(size)
+    panel = _panel(counties, _dates(size.n_days, drop_date), 300, rng, groups=len(AGE_GROUPS))
+    data = pd.DataFrame({
+        "ServiceDate": panel["date"].dt.strftime("%Y-%m-%d"),
+        "PatCountyFIPS": panel["geo"],
+        "PatAgeGroup": np.take(AGE_GROUPS, panel["group"]),
+        "Pat HRR ID": panel["geo"].map(hrrs),
+        "Denominator": rng.poisson(panel["expected"]).astype(float),
+        "Covid_like": rng.poisson(panel["expected"] * 0.05).astype(float),
+    })
+    input_file = join(work_dir, f"EDI_AGG_INPATIENT_{drop_date:%d%m%Y}_1451CDT.csv.gz")
+    data.to_csv(input_file, index=False)
+    return {
+        "indicator": {
+            "input_file": input_file,
+            "start_date": None,
+            "end_date": None,
+            "drop_date": f"{drop_date:%Y-%m-%d}",
+            "n_backfill_days": _backfill_days(size),
+            "n_waiting_days": 3,
+            "write_se": False,
+            "obfuscated_prefix": "foo_obfuscated",
+            "parallel": False,
+            "geos": ["state", "msa", "hrr", "county"],
+            "weekday": [True, False]
+        }
+    }
+
+
+def doctor_visits(work_dir: str, size: Size, rng: np.random.Generator) -> Dict[str, Any]:
+    """Write an aggregated outpatient visits drop for `size` counties and all age groups."""
+    counties = _sample_geos("fips", size.n_geos, rng)
+    hrrs = dict(zip(counties, rng.choice(sorted(GeoMapper().get_geo_values("hrr")),
+                                         size=len(counties))))
+    drop_date = _claims_drop_date(size)
+    panel = _panel(counties, _dates(size.n_days, drop_date), 1000, rng, groups=len(AGE_GROUPS))
+    data = pd.DataFrame({
+        "Covid_like": rng.poisson(panel["expected"] * 0.02),
+        "Flu_like": rng.poisson(panel["expected"] * 0.03),
+        "Mixed": rng.poisson(panel["expected"] * 0.02),
+        "Flu1": rng.poisson(panel["expected"] * 0.01),
+        "Denominator": rng.poisson(panel["expected"]),
+        "ServiceDate": panel["date"].dt.strftime("%Y-%m-%d"),
+        "PatCountyFIPS": panel["geo"],
+        "Pat HRR Name": "HRR " + panel["geo"].map(hrrs),
+        "Pat HRR ID": panel["geo"].map(hrrs).astype(float),
+        "PatAgeGroup": np.take(AGE_GROUPS, panel["group"]),
+    })
+    input_file = join(work_dir, f"SYNEDI_AGG_OUTPATIENT_{drop_date:%d%m%Y}_1455CDT.csv.gz")
+    data.to_csv(input_file, index=False)
+    return {
+        "indicator": {
+            "input_file": input_file,
+            "drop_date": f"{drop_date:%Y-%m-%d}",
+            "n_backfill_days": _backfill_days(size),
+            "n_waiting_days": 3,
+            "weekday": [True, False],
+            "se": False,
+            "obfuscated_prefix": "wip_XXXXX",
+            "parallel": False
+        }
+    }
+
+
+def quidel_covidtest(work_dir: str, size: Size, rng: np.random.Generator) -> Dict[str, Any]:
+    """Write one row per antigen test, taken in `size` ZIP codes, as a test-mode input file."""
+    panel = _panel(_sample_geos("zip", size.n_geos, rng), _dates(size.n_days), 3, rng)
+    tests = panel.loc[np.repeat(panel.index, rng.poisson(panel["expected"]))]
+    n_tests = len(tests)
+    storage_dates = tests["date"] + pd.to_timedelta(rng.integers(0, 4, n_tests), "D")
+    result = np.where(rng.random(n_tests) < 0.1, "positive", "negative")
+    data = pd.DataFrame({
+        # A few devices per ZIP code.
+        "SofiaSerNum": tests["geo"].astype(int) * 10 + rng.integers(0, 3, n_tests),
+        "TestDate": _us_dates(tests["date"]),
+        "Facility": "",
+        "City": "",
+        "State": "",
+        "Zip": tests["geo"].astype(int),
+        "PatientAge": "",
+        "Result1": result,
+        "Result2": "",
+        "OverallResult": result,
+        "County": "",
+        "FacilityType": "",
+        "Assay": "",
+        "SCO1": "",
+        "SCO2": "",
+        "CLN": "",
+        "CSN": "",
+        "InstrType": "",
+        "StorageDate": _us_dates(storage_dates),
+        "ResultId": "",
+        "SarsTestNumber": "",
+    })
+    # The indicator reads its test-mode input from a fixed path relative to the working directory.
+    makedirs(join(work_dir, "test_data"), exist_ok=True)
+    makedirs(join(work_dir, "cache"), exist_ok=True)
+    data.to_csv(join(work_dir, "test_data", "test_data.csv"), index=False)
+    return {
+        "indicator": {
+            "static_file_dir": work_dir,
+            "input_cache_dir": join(work_dir, "cache"),
+            "export_start_date": "2020-05-26",
+            "export_end_date": "",
+            "pull_start_date": "2020-05-26",
+            "pull_end_date": "",
+            "export_day_range": 40,
+            "aws_credentials": {"aws_access_key_id": "", "aws_secret_access_key": ""},
+            "bucket_name": "",
+            "wip_signal": [""],
+            "test_mode": True
+        }
+    }
+
+
+def safegraph_patterns(work_dir: str, size: Size, rng: np.random.Generator) -> Dict[str, Any]:
+    """Write weekly patterns files for bars and restaurants in `size` ZIP codes."""
+    n_brands = 50
+    brands = pd.DataFrame({
+        "safegraph_brand_id": [f"SG_BRAND_{i:032x}" for i in range(n_brands)],
+        "naics_code": np.where(np.arange(n_brands) % 5 == 0, 722410, 722511),
+    })
+    makedirs(join(work_dir, "static", "brand_info"), exist_ok=True)
+    for version in ["202004", "202006", "20210408"]:
+        brands.to_csv(join(work_dir, "static", "brand_info", f"brand_info_{version}.csv"),
+                      index=False)
+
+    zips = _sample_geos("zip", size.n_geos, rng)
+    n_places = 5 * len(zips)
+    places = pd.DataFrame({
+        "postal_code": np.repeat(np.array(zips).astype(int), 5),
+        "safegraph_brand_ids": rng.choice(brands["safegraph_brand_id"], size=n_places),
+        "scale": rng.lognormal(3, 1, n_places),
+    })
+    main_dir = join(work_dir, "raw", "weekly-patterns", "v2", "main-file")
+    makedirs(main_dir, exist_ok=True)
+    week_starts = pd.date_range(end=DROP_DATE - timedelta(days=7),
+                                periods=max(1, size.n_days // 7), freq="W-MON")
+    for start in week_starts:
+        visits = rng.poisson(places["scale"].to_numpy()[:, None] * WEEKDAY_FACTORS)
+        data = places[["postal_code", "safegraph_brand_ids"]].assign(
+            visits_by_day=["[" + ",".join(map(str, row)) + "]" for row in visits],
+            date_range_start=f"{start:%Y-%m-%d}T00:00:00-04:00",
+            date_range_end=f"{start + timedelta(days=7):%Y-%m-%d}T00:00:00-04:00")
+        data.to_csv(join(main_dir, f"{start:%Y-%m-%d}-weekly-patterns.csv.gz"), index=False)
+    return {
+        "indicator": {
+            "static_file_dir": join(work_dir, "static"),
+            "raw_data_dir": join(work_dir, "raw"),
+            "n_core": 2,
+            "aws_access_key_id": "",
+            "aws_secret_access_key": "",
+            "aws_default_region": "",
+            "aws_endpoint": "",
+            "sync": False
+        }
+    }
+
+
+def _cumulative_counts(n_geos: int, n_days: int, mean: float,
+                       rng: np.random.Generator) -> np.ndarray:
+    """Draw an n_geos x n_days array of nondecreasing cumulative counts."""
+    daily = rng.poisson(mean * rng.lognormal(0, 1, (n_geos, 1)) * WEEKDAY_FACTORS[
+        np.arange(n_days) % 7])
+    return daily.cumsum(axis=1)
+
+
+def jhu(work_dir: str, size: Size, rng: np.random.Generator) -> Dict[str, Any]:
+    """Write JHU wide time series files of confirmed cases and deaths for `size` counties."""
+    counties = _sample_geos("fips", size.n_geos, rng)
+    dates = _us_dates(pd.Series(_dates(size.n_days)))
+    for metric, mean in [("confirmed", 20), ("deaths", 1)]:
+        ids = pd.DataFrame({
+            "UID": [int("840" + fips) for fips in counties],
+            "iso2": "US",
+            "iso3": "USA",
+            "code3": 840,
+            "FIPS": [float(fips) for fips in counties],
+            "Admin2": "",
+            "Province_State": "",
+            "Country_Region": "US",
+            "Lat": 0.0,
+            "Long_": 0.0,
+            "Combined_Key": "",
+        })
+        counts = pd.DataFrame(_cumulative_counts(len(counties), size.n_days, mean, rng),
+                              columns=dates)
+        pd.concat([ids, counts], axis=1).to_csv(
+            join(work_dir, f"time_series_covid19_{metric}_US.csv"), index=False)
+    return {
+        "indicator": {
+            "base_url": join(work_dir, "time_series_covid19_{metric}_US.csv"),
+            "export_start_date": "2020-02-20",
+            "static_file_dir": work_dir
+        }
+    }
+
+
+def usafacts(work_dir: str, size: Size, rng: np.random.Generator) -> Dict[str, Any]:
+    """Write USAFacts wide files of confirmed cases and deaths for `size` counties."""
+    counties = _sample_geos("fips", size.n_geos, rng)
+    dates = _dates(size.n_days).strftime("%Y-%m-%d")
+    for metric, mean in [("confirmed", 20), ("deaths", 1)]:
+        ids = pd.DataFrame({
+            "countyFIPS": [int(fips) for fips in counties],
+            "County Name": "",
+            "State": "",
+            "StateFIPS": [int(fips[:2]) for fips in counties],
+        })
+        counts = pd.DataFrame(_cumulative_counts(len(counties), size.n_days, mean, rng),
+                              columns=dates)
+        pd.concat([ids, counts], axis=1).to_csv(
+            join(work_dir, f"covid_{metric}_usafacts.csv"), index=False)
+    return {
+        "indicator": {
+            "base_url": join(work_dir, "covid_{metric}_usafacts.csv"),
+            "export_start_date": "2020-02-20"
+        }
+    }
+
+
+class Indicator(NamedTuple):
+    """An indicator that can be benchmarked."""
+
+    # Name of the indicator's package, which exports `run.run_module(params)`
+    package: str
+    # Directory of the indicator in the repository, relative to its root
+    source_dir: str
+    # Function writing synthetic input into a directory and returning the indicator params
+    generate: Callable[[str, Size, np.random.Generator], Dict[str, Any]]
+
+
+INDICATORS = {
+    "changehc": Indicator("delphi_changehc", "changehc", changehc),
+    "claims_hosp": Indicator("delphi_claims_hosp", "claims_hosp", claims_hosp),
+    "doctor_visits": Indicator("delphi_doctor_visits", "doctor_visits", doctor_visits),
+    "quidel_covidtest": Indicator("delphi_quidel_covidtest", "quidel_covidtest",
+                                  quidel_covidtest),
+    "safegraph_patterns": Indicator("delphi_safegraph_patterns", "safegraph_patterns",
+                                    safegraph_patterns),
+    "jhu": Indicator("delphi_jhu", "jhu", jhu),
+    "usafacts": Indicator("delphi_usafacts", "usafacts", usafacts),
+}
@@ -0,0 +1,49 @@
+"""Run one indicator pipeline and write its resource use to a JSON file.
+
+Run by `runner.run_benchmark` in a fresh interpreter, as
+
+    python -m benchmarks.measure <package> <params file> <result file>
+
+so that the measurements include nothing but importing and running the pipeline.  Wall time and
+CPU time cover `run_module` only.
+"""
+import importlib
+import json
+import os
+import resource
+import sys
+import time
+
+
+def _peak_rss_bytes():
+    # ru_maxrss is in kilobytes on Linux but in bytes on macOS.
+    scale = 1 if sys.platform == "darwin" else 1024
+    return scale * max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                       resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+
+def _cpu_time():
+    times = os.times()
+    return times.user + times.system + times.children_user + times.children_system
+
+
+def main():
+    """Run the pipeline named on the command line."""
+    package, params_file, result_file = sys.argv[1:]
+    with open(params_file) as f:
+        params = json.load(f)
+    run_module = importlib.import_module(f"{package}.run").run_module
+    wall_start = time.perf_counter()
+    cpu_start = _cpu_time()
+    run_module(params)
+    result = {
+        "wall_time_seconds": time.perf_counter() - wall_start,
+        "cpu_time_seconds": _cpu_time() - cpu_start,
+        "peak_rss_bytes": _peak_rss_bytes(),
+    }
+    with open(result_file, "w") as f:
+        json.dump(result, f)
+
+
+if __name__ == "__main__":
+    main()
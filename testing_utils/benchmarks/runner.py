@@ -0,0 +1,187 @@
+"""Time indicator pipelines on synthetic data and compare the results across commits.
+
+Every run generates its input in a fresh temporary directory and calls the indicator's
+`run_module` in a new interpreter (see `measure`), which imports the indicator and `delphi_utils`
+from this checkout rather than from the installed packages.  Wall time and CPU time cover
+`run_module` only; peak memory is the peak resident set size of the interpreter or of its largest
+finished child (e.g. multiprocessing workers).
+"""
+from datetime import datetime
+import json
+import os
+from os.path import abspath, dirname, join
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .generators import INDICATORS, SIZES
+
+TESTING_UTILS_DIR = abspath(join(dirname(__file__), ".."))
+REPO_ROOT = dirname(TESTING_UTILS_DIR)
+
+
+def _directory_size(directory: str) -> Tuple[int, int]:
+    """Return the number of files in `directory` (recursively) and their total size."""
+    sizes = [os.path.getsize(join(root, name))
+             for root, _, names in os.walk(directory) for name in names]
+    return len(sizes), sum(sizes)
+
+
+def run_benchmark(indicator: str, size: str, seed: int = 0,
+                  keep_dir: bool = False) -> Dict[str, Any]:
+    """Generate synthetic input for one indicator and time a run of its pipeline.
+
+    Parameters
+    ----------
+    indicator: str
+        key of the indicator in `INDICATORS`
+    size: str
+        key of the data size in `SIZES`
+    seed: int
+        seed of the random data
+    keep_dir: bool
+        keep the directory with the generated input and output instead of deleting it
+
+    Returns
+    -------
+    Dict with the measurements of the run, whether it succeeded, and the size of its input and
+    output.
+    """
+    spec = INDICATORS[indicator]
+    result = {"indicator": indicator, "size": size, **SIZES[size]._asdict(), "seed": seed}
+    work_dir = tempfile.mkdtemp(prefix=f"benchmark_{indicator}_{size}_")
+    try:
+        params = spec.generate(work_dir, SIZES[size], np.random.default_rng(seed))
+        export_dir = join(work_dir, "receiving")
+        os.makedirs(export_dir)
+        params["common"] = {
+            "export_dir": export_dir,
+            "log_filename": join(work_dir, "benchmark.log"),
+            "log_exceptions": False
+        }
+        result["input_files"], result["input_bytes"] = _directory_size(work_dir)
+
+        params_file = join(work_dir, "params.json")
+        result_file = join(work_dir, "result.json")
+        with open(params_file, "w") as f:
+            json.dump(params, f)
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join([
+            join(REPO_ROOT, spec.source_dir), join(REPO_ROOT, "_delphi_utils_python"),
+            TESTING_UTILS_DIR]))
+        process = subprocess.run(
+            [sys.executable, "-m", "benchmarks.measure", spec.package, params_file, result_file],
+            cwd=work_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+            check=False)
+        if process.returncode == 0:
+            with open(result_file) as f:
+                result.update(json.load(f))
+            result["status"] = "success"
+        else:
+            result["status"] = "failed"
+            # The last line of a traceback names the exception.
+            result["error"] = (process.stderr.strip().splitlines() or [""])[-1]
+        result["output_files"], result["output_bytes"] = _directory_size(export_dir)
+    finally:
+        if keep_dir:
+            result["work_dir"] = work_dir
+        else:
+            shutil.rmtree(work_dir, ignore_errors=True)
+    return result
+
+
+def _git(*args: str) -> Optional[str]:
+    try:
+        return subprocess.run(["git", *args], cwd=REPO_ROOT, capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmarks(indicators: List[str], sizes: List[str], repeat: int = 1, seed: int = 0,
+                   keep_dirs: bool = False) -> Dict[str, Any]:
+    """Benchmark every combination of indicator and size.
+
+    Parameters
+    ----------
+    indicators: List[str]
+        keys of the indicators in `INDICATORS`
+    sizes: List[str]
+        keys of the data sizes in `SIZES`
+    repeat: int
+        number of runs of every combination; the fastest time and largest memory use are reported
+    seed: int
+        seed of the random data
+    keep_dirs: bool
+        keep the directories with the generated input and output
+
+    Returns
+    -------
+    Dict describing the commit and machine, with one result per combination.
+    """
+    results = []
+    for indicator in indicators:
+        for size in sizes:
+            runs = [run_benchmark(indicator, size, seed, keep_dirs) for _ in range(repeat)]
+            result = runs[0]
+            if all(run["status"] == "success" for run in runs):
+                result["wall_time_seconds"] = min(run["wall_time_seconds"] for run in runs)
+                result["cpu_time_seconds"] = min(run["cpu_time_seconds"] for run in runs)
+                result["peak_rss_bytes"] = max(run["peak_rss_bytes"] for run in runs)
+            else:
+                result = next(run for run in runs if run["status"] != "success")
+            result["repeat"] = repeat
+            print(json.dumps(result), flush=True)
+            results.append(result)
+    return {
+        "commit": _git("rev-parse", "HEAD"),
+        "dirty": bool(_git("status", "--porcelain", "--untracked-files=no")),
+        "created": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "results": results
+    }
+
+
+def compare(baseline: Dict[str, Any], current: Dict[str, Any],
+            threshold: float = 0.1) -> List[Dict[str, Any]]:
+    """Compare the results of two benchmark runs.
+
+    Parameters
+    ----------
+    baseline: Dict[str, Any]
+        results of the earlier run, as returned by `run_benchmarks`
+    current: Dict[str, Any]
+        results of the later run
+    threshold: float
+        relative increase in wall time or peak memory beyond which a result is a regression
+
+    Returns
+    -------
+    One row per indicator and size present in both runs with the same data, with the ratios of the
+    current to the baseline measurements and whether they exceed the threshold.
+    """
+    baseline_results = {(r["indicator"], r["size"]): r for r in baseline["results"]}
+    rows = []
+    for result in current["results"]:
+        before = baseline_results.get((result["indicator"], result["size"]))
+        if before is None or any(before[key] != result[key]
+                                 for key in ["n_geos", "n_days", "seed"]):
+            continue
+        row = {"indicator": result["indicator"], "size": result["size"]}
+        if result["status"] != "success" or before["status"] != "success":
+            row.update(status=f"{before['status']} -> {result['status']}",
+                       regression=result["status"] != "success")
+        else:
+            for key in ["wall_time_seconds", "cpu_time_seconds", "peak_rss_bytes"]:
+                row[key.rsplit("_", 1)[0] + "_ratio"] = result[key] / before[key]
+            row["status"] = "success"
+            row["regression"] = row["wall_time_ratio"] > 1 + threshold or \
+                row["peak_rss_ratio"] > 1 + threshold
+        rows.append(row)
+    return rows
@@ -0,0 +1,122 @@
+"""Benchmark the weekday effect solver of `delphi_utils.weekday` against cvxpy.
+
+From the `testing_utils` directory:
+
+    python -m benchmarks.weekday --days 365 730 1500 --scales 1e3 1e5 --repeat 3
+
+For every length and scale of synthetic counts, the model of the indicators' `Weekday.get_params`
+is solved with cvxpy, with `fit_weekday_params` from scratch, and with `fit_weekday_params` warm
+started from the parameters of the previous day's run (one day less of data, with the last week
+revised), as a run with a `weekday_cache_dir` would.  The fastest of `--repeat` runs is reported,
+with the objective of the dedicated solver relative to that of cvxpy (negative when it finds a
+better optimum) and the largest difference in the weekday effects.
+"""
+import argparse as ap
+from functools import partial
+from os.path import join
+import sys
+import time
+import warnings
+
+import numpy as np
+import pandas as pd
+
+from .runner import REPO_ROOT
+
+sys.path.insert(0, join(REPO_ROOT, "_delphi_utils_python"))
+# pylint: disable=wrong-import-position,wrong-import-order
+from delphi_utils.weekday import fit_weekday_params, weekday_design, weekday_objective
+
+
+def synthetic_counts(n_days, scale, rng):
+    """Return numerators, denominators and dates of a count signal with weekday effects."""
+    dates = pd.date_range("2020-02-01", periods=n_days)
+    days = np.arange(n_days)
+    effects = np.array([0.1, 0.05, 0, 0, -0.05, -0.2, 0.1])
+    denoms = rng.poisson(scale * (1 + 0.3 * np.sin(days / 50))) + 1.0
+    rates = 0.05 * np.exp(0.5 * np.sin(days / 30) + effects[dates.weekday])
+    return rng.poisson(denoms * rates).astype(float), denoms, dates
+
+
+def fit_cvxpy(nums, denoms, dayofweek, lam=10):
+    """Solve the weekday model as `Weekday.get_params` does with cvxpy."""
+    import cvxpy as cp  # pylint: disable=import-outside-toplevel
+    n_days = len(nums)
+    X = np.hstack([weekday_design(dayofweek), np.eye(n_days)])  # pylint: disable=invalid-name
+    b = cp.Variable(X.shape[1])
+    ll = (cp.matmul(nums, cp.matmul(X, b) + np.log(denoms))
+          - cp.sum(cp.exp(cp.matmul(X, b) + np.log(denoms)))) / n_days
+    penalty = lam * cp.norm(cp.diff(b[6:], 3), 1) / (n_days - 2)
+    cp.Problem(cp.Minimize(-ll + lam * penalty)).solve()
+    return b.value
+
+
+def _fastest(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        times.append(time.perf_counter() - start)
+    return result, min(times)
+
+
+def compare(nums, denoms, dayofweek, init, repeat=1):
+    """Time the solvers on one series; return the timings and the differences from cvxpy."""
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        reference, cvxpy_time = _fastest(partial(fit_cvxpy, nums, denoms, dayofweek), repeat)
+    fit = partial(fit_weekday_params, nums, denoms, dayofweek)
+    cold, cold_time = _fastest(fit, repeat)
+    warm, warm_time = _fastest(partial(fit, init=init), repeat)
+
+    expected = weekday_objective(reference, nums, denoms, dayofweek)
+    return {
+        "cvxpy_seconds": cvxpy_time,
+        "cold_seconds": cold_time,
+        "warm_seconds": warm_time,
+        "relative_objective": max(weekday_objective(params, nums, denoms, dayofweek) - expected
+                                  for params in [cold, warm]) / abs(expected),
+        "max_effect_difference": max(np.abs(params[:6] - reference[:6]).max()
+                                     for params in [cold, warm])
+    }
+
+
+def benchmark(days, scales, repeat=1, seed=0):
+    """Time the solvers on synthetic counts of every length and scale; return one row each."""
+    rng = np.random.default_rng(seed)
+    rows = []
+    for n_days in days:
+        for scale in scales:
+            nums, denoms, dates = synthetic_counts(n_days + 1, scale, rng)
+            dayofweek = np.asarray(dates.weekday)
+            # yesterday's run had one day less, and the last week has been revised since
+            previous = fit_weekday_params(nums[:-1], denoms[:-1], dayofweek[:-1])
+            nums[-7:] = np.round(nums[-7:] * 1.02)
+            rows.append({
+                "days": n_days + 1,
+                "scale": scale,
+                **compare(nums, denoms, dayofweek, np.append(previous, previous[-1]), repeat)
+            })
+    return rows
+
+
+def main():
+    """Run the benchmark given on the command line and print a table of the results."""
+    parser = ap.ArgumentParser(prog="python -m benchmarks.weekday")
+    parser.add_argument("--days", nargs="+", type=int, default=[365, 730, 1500])
+    parser.add_argument("--scales", nargs="+", type=float, default=[1e3, 1e5],
+                        help="Typical daily denominators.")
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    print(f"{'days':>6} {'scale':>8} {'cvxpy s':>8} {'cold s':>8} {'warm s':>8} "
+          f"{'rel obj':>9} {'max d effect':>12}")
+    for row in benchmark(args.days, args.scales, args.repeat, args.seed):
+        print(f"{row['days']:>6} {row['scale']:>8.0e} {row['cvxpy_seconds']:>8.3f} "
+              f"{row['cold_seconds']:>8.3f} {row['warm_seconds']:>8.3f} "
+              f"{row['relative_objective']:>9.1e} {row['max_effect_difference']:>12.1e}")
+
+
+if __name__ == "__main__":
+    main()